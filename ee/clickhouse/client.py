@@ -2,8 +2,11 @@ import asyncio
 import hashlib
 import json
 import re
+import threading
+from contextlib import contextmanager
 from time import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Generator, Optional
+from uuid import uuid4
 
 import sqlparse
 from aioch import Client
@@ -16,6 +19,8 @@ from django.core.cache import cache
 from django.utils.timezone import now
 from sentry_sdk.api import capture_exception
 
+from ee.clickhouse.query_cache import cached_execute
+from ee.clickhouse.result_cache_codecs import ResultCodec, get_result_codec
 from posthog import redis
 from posthog.constants import RDBMS
 from posthog.exceptions import EstimatedQueryExecutionTimeTooLong
@@ -39,6 +44,9 @@ from posthog.utils import get_safe_cache
 CACHE_TTL = 60  # seconds
 
 _request_information: Optional[Dict] = None
+# Prefix of ClickHouse query ids set by `query_id_prefix`, so that all queries of a calculation can be killed at once,
+# and request information set by `tag_queries`, which takes precedence over `_request_information` in that thread
+_query_context = threading.local()
 
 if PRIMARY_DB != RDBMS.CLICKHOUSE:
     ch_client = None  # type: Client
@@ -46,10 +54,12 @@ if PRIMARY_DB != RDBMS.CLICKHOUSE:
     def async_execute(query, args=None, settings=None, with_column_types=False):
         return
 
-    def sync_execute(query, args=None, settings=None, with_column_types=False):
+    def sync_execute(query, args=None, settings=None, with_column_types=False, use_query_cache=False):
         return
 
-    def cache_sync_execute(query, args=None, redis_client=None, ttl=None, settings=None, with_column_types=False):
+    def cache_sync_execute(
+        query, args=None, redis_client=None, ttl=None, settings=None, with_column_types=False, codec=None
+    ):
         return
 
 
@@ -112,19 +122,39 @@ else:
         def async_execute(query, args=None, settings=None, with_column_types=False):
             return sync_execute(query, args, settings=settings, with_column_types=with_column_types)
 
-    def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL, settings=None, with_column_types=False):
+    def cache_sync_execute(
+        query, args=None, redis_client=None, ttl=CACHE_TTL, settings=None, with_column_types=False, codec=None
+    ):
         if not redis_client:
             redis_client = redis.get_client()
-        key = _key_hash(query, args)
-        if redis_client.exists(key):
-            result = _deserialize(redis_client.get(key))
-            return result
-        else:
-            result = sync_execute(query, args, settings=settings, with_column_types=with_column_types)
-            redis_client.set(key, _serialize(result), ex=ttl)
-            return result
-
-    def sync_execute(query, args=None, settings=None, with_column_types=False):
+        codec = codec or get_result_codec()
+        key = _key_hash(query, args, with_column_types, codec)
+        cached = redis_client.get(key)
+        if cached is not None:
+            try:
+                return codec.decode(cached)
+            except Exception as err:
+                capture_exception(err)
+
+        result = sync_execute(query, args, settings=settings, with_column_types=with_column_types)
+        encoded = codec.encode(result)
+        if len(encoded) <= app_settings.CLICKHOUSE_RESULT_CACHE_MAX_BYTES:
+            redis_client.set(key, encoded, ex=ttl)
+        return result
+
+    def sync_execute(query, args=None, settings=None, with_column_types=False, use_query_cache=False):
+        if use_query_cache:
+            _, tags = _annotate_tagged_query(query, args)
+            return cached_execute(
+                query,
+                args,
+                with_column_types,
+                lambda query, args, with_column_types=False: sync_execute(
+                    query, args, settings=settings, with_column_types=with_column_types
+                ),
+                tags=tags,
+            )
+
         with ch_pool.get_client() as client:
             start_time = time()
             tags = {}
@@ -133,7 +163,9 @@ else:
                 print(format_sql(query, args))
             try:
                 sql, tags = _annotate_tagged_query(query, args)
-                result = client.execute(sql, args, settings=settings, with_column_types=with_column_types)
+                result = client.execute(
+                    sql, args, settings=settings, with_column_types=with_column_types, query_id=_query_id()
+                )
             except Exception as err:
                 tags["failed"] = True
                 tags["reason"] = type(err).__name__
@@ -143,34 +175,75 @@ else:
                 timing("clickhouse_sync_execution_time", execution_time * 1000.0, tags=tags)
                 if app_settings.SHELL_PLUS_PRINT_SQL:
                     print("Execution time: %.6fs" % (execution_time,))
-                if _request_information is not None and _request_information.get("save", False):
+                request_information = _get_request_information()
+                if request_information is not None and request_information.get("save", False):
                     save_query(query, args, execution_time)
         return result
 
 
-def _deserialize(result_bytes: bytes) -> List[Tuple]:
-    results = []
-    for x in json.loads(result_bytes):
-        results.append(tuple(x))
-    return results
+@contextmanager
+def query_id_prefix(prefix: str) -> Generator[None, None, None]:
+    """Give every query run in this thread within the block a ClickHouse query id starting with `prefix`."""
+    _query_context.prefix = prefix
+    try:
+        yield
+    finally:
+        _query_context.prefix = None
+
+
+def get_query_tags() -> Dict[str, Any]:
+    """Get what queries run in this thread are tagged with, to tag queries run elsewhere with it (see `tag_queries`)."""
+    return {
+        "request_information": _get_request_information(),
+        "query_id_prefix": getattr(_query_context, "prefix", None),
+    }
+
+
+@contextmanager
+def tag_queries(tags: Dict[str, Any]) -> Generator[None, None, None]:
+    """Tag queries run in this thread within the block like those of the thread `tags` were taken from."""
+    # Only this thread's tags change, `_request_information` is shared by all threads of the process
+    previous = dict(_query_context.__dict__)
+    _query_context.request_information = tags["request_information"]
+    _query_context.prefix = tags["query_id_prefix"]
+    try:
+        yield
+    finally:
+        _query_context.__dict__.clear()
+        _query_context.__dict__.update(previous)
+
+
+def _get_request_information() -> Optional[Dict]:
+    return getattr(_query_context, "request_information", _request_information)
+
+
+def kill_queries(prefix: str) -> None:
+    """Cancel all running ClickHouse queries started within `query_id_prefix(prefix)`."""
+    sync_execute("KILL QUERY WHERE query_id LIKE %(pattern)s ASYNC", {"pattern": f"{prefix}-%"})
 
 
-def _serialize(result: Any) -> bytes:
-    return json.dumps(result).encode("utf-8")
+def _query_id() -> Optional[str]:
+    prefix = getattr(_query_context, "prefix", None)
+    return f"{prefix}-{uuid4()}" if prefix else None
 
 
-def _key_hash(query: str, args: Any) -> bytes:
-    key = hashlib.md5(query.encode("utf-8") + json.dumps(args).encode("utf-8")).digest()
-    return key
+def _key_hash(query: str, args: Any, with_column_types: bool = False, codec: Optional[ResultCodec] = None) -> str:
+    # The codec is part of the key so that switching codecs never decodes a value stored in another format
+    codec_name = (codec or get_result_codec()).name
+    key = hashlib.sha256(
+        query.encode("utf-8") + json.dumps(args, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"clickhouse_query_cache:{codec_name}:{int(with_column_types)}:{key}"
 
 
 def _annotate_tagged_query(query, args):
-    tags = {"kind": (_request_information or {}).get("kind"), "id": (_request_information or {}).get("id")}
+    request_information = _get_request_information()
+    tags = {"kind": (request_information or {}).get("kind"), "id": (request_information or {}).get("id")}
     if isinstance(args, dict) and "team_id" in args:
         tags["team_id"] = args["team_id"]
     # Annotate the query with information on the request/task
-    if _request_information is not None:
-        query = f"/* {_request_information['kind']}:{_request_information['id'].replace('/', '_')} */ {query}"
+    if request_information is not None:
+        query = f"/* {request_information['kind']}:{request_information['id'].replace('/', '_')} */ {query}"
 
     return query, tags
 
@@ -211,11 +284,12 @@ def save_query(sql: str, params: Dict, execution_time: float) -> None:
     """
     Save query for debugging purposes
     """
-    if _request_information is None:
+    request_information = _get_request_information()
+    if request_information is None:
         return
 
     try:
-        key = "save_query_{}".format(_request_information["user_id"])
+        key = "save_query_{}".format(request_information["user_id"])
         queries = json.loads(get_safe_cache(key) or "[]")
 
         queries.insert(
@@ -0,0 +1,169 @@
+"""
+Event properties materialized as columns of the events table.
+
+Extracting a property from the `properties` JSON string is the bulk of the cost of most queries. The properties that
+are queried the most get a `MATERIALIZED` column each, which ClickHouse fills in on insert, and query builders read
+those columns instead of parsing JSON (see `prop_filter_json_extract`). Columns are named `mat_<property>` and carry
+the original property name in their comment, which is how they're found again.
+"""
+import re
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from ee.clickhouse.client import sync_execute
+from posthog.helpers.cache import LRUTTLCache
+from posthog.models.property_definition import PropertyDefinition
+from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE
+
+COLUMN_COMMENT_PREFIX = "column_materializer::"
+
+TRIM_AND_EXTRACT_PROPERTY = "trim(BOTH '\"' FROM JSONExtractRaw(properties, %(property)s))"
+
+GET_MATERIALIZED_COLUMNS_SQL = """
+SELECT name, comment
+FROM system.columns
+WHERE database = %(database)s AND table = %(table)s AND comment LIKE %(comment_prefix)s
+"""
+
+# Properties by the total time spent on queries that extract them, as seen in the query log
+QUERIED_PROPERTIES_SQL = r"""
+SELECT
+    arrayJoin(extractAll(query, 'JSONExtractRaw\\((?:\\w+\\.)?properties, \'([^\']+)\'\\)')) AS property,
+    sum(query_duration_ms) AS cost
+FROM system.query_log
+WHERE type = 'QueryFinish'
+  AND is_initial_query
+  AND event_time > now() - INTERVAL %(days)s DAY
+  AND query LIKE 'SELECT%%'
+GROUP BY property
+HAVING cost >= %(min_cost)s
+ORDER BY cost DESC
+"""
+
+_materialized_columns_cache: LRUTTLCache[Dict[str, str]] = LRUTTLCache(max_size=10, ttl=5 * 60)
+
+
+def get_materialized_columns(table: str = "events") -> Dict[str, str]:
+    """Map of property name to the column it's materialized in."""
+    columns = _materialized_columns_cache.get(table)
+    if columns is None:
+        rows = sync_execute(
+            GET_MATERIALIZED_COLUMNS_SQL,
+            {"database": CLICKHOUSE_DATABASE, "table": table, "comment_prefix": f"{COLUMN_COMMENT_PREFIX}%"},
+        )
+        columns = {comment[len(COLUMN_COMMENT_PREFIX) :]: name for name, comment in rows or []}
+        _materialized_columns_cache.set(table, columns)
+    return columns
+
+
+def get_materialized_column(property: str, table: str = "events") -> Optional[str]:
+    # Columns listed in CLICKHOUSE_DENORMALIZED_PROPERTIES predate automatic materialization
+    if property.lower() in settings.CLICKHOUSE_DENORMALIZED_PROPERTIES:
+        return f"properties_{property.lower()}"
+    return get_materialized_columns(table).get(property)
+
+
+def materialize(property: str, table: str = "events") -> str:
+    existing_column = get_materialized_columns(table).get(property)
+    if existing_column is not None:
+        return existing_column
+
+    column = _column_name(property, taken=set(get_materialized_columns(table).values()))
+    sync_execute(
+        f"""
+        ALTER TABLE {table} ON CLUSTER {CLICKHOUSE_CLUSTER}
+        ADD COLUMN IF NOT EXISTS {column} VARCHAR MATERIALIZED {TRIM_AND_EXTRACT_PROPERTY}
+        """,
+        {"property": property},
+    )
+    sync_execute(
+        f"ALTER TABLE {table} ON CLUSTER {CLICKHOUSE_CLUSTER} COMMENT COLUMN {column} %(comment)s",
+        {"comment": f"{COLUMN_COMMENT_PREFIX}{property}"},
+    )
+    _materialized_columns_cache.delete(table)
+    return column
+
+
+def backfill_materialized_columns(properties: List[str], backfill_period_days: int, table: str = "events") -> None:
+    """
+    Write the values of materialized columns into the monthly partitions of the last `backfill_period_days` days,
+    which would otherwise compute them on every read. The columns stay `MATERIALIZED`, so they're still left out of
+    positional inserts and `SELECT *`.
+    """
+    columns = get_materialized_columns(table)
+    to_backfill = [columns[property] for property in properties if property in columns]
+    if not to_backfill:
+        return
+
+    month = (timezone.now() - timedelta(days=backfill_period_days)).date().replace(day=1)
+    partitions = []
+    while month <= timezone.now().date():
+        partitions.append(month.strftime("%Y%m"))
+        month = (month + timedelta(days=32)).replace(day=1)
+
+    for column in to_backfill:
+        for partition in partitions:
+            sync_execute(
+                f"ALTER TABLE {table} ON CLUSTER {CLICKHOUSE_CLUSTER} MATERIALIZE COLUMN {column} IN PARTITION {partition}"
+            )
+
+
+def get_materialization_candidates(limit: int) -> List[str]:
+    """
+    Properties worth materializing that aren't yet, most valuable first: first by time spent extracting them according
+    to the query log, then by how often they're used in insights.
+    """
+    candidates: List[str] = [
+        property
+        for property, _ in sync_execute(
+            QUERIED_PROPERTIES_SQL,
+            {
+                "days": settings.MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_DAYS,
+                "min_cost": settings.MATERIALIZE_COLUMNS_MIN_QUERY_TIME * 1000,
+            },
+        )
+    ]
+    candidates.extend(
+        PropertyDefinition.objects.filter(query_usage_30_day__gt=0)
+        .values("name")
+        .annotate(usage=Sum("query_usage_30_day"))
+        .order_by("-usage")
+        .values_list("name", flat=True)[: limit * 2]
+    )
+
+    result: List[str] = []
+    for property in candidates:
+        if property not in result and get_materialized_column(property) is None:
+            result.append(property)
+        if len(result) >= limit:
+            break
+    return result
+
+
+def materialize_properties_from_usage(backfill_period_days: Optional[int] = None) -> List[str]:
+    """Materialize the most valuable properties, up to `MATERIALIZE_COLUMNS_MAX` automatically materialized columns."""
+    available = settings.MATERIALIZE_COLUMNS_MAX - len(get_materialized_columns())
+    if available <= 0:
+        return []
+
+    properties = get_materialization_candidates(min(available, settings.MATERIALIZE_COLUMNS_PER_RUN))
+    for property in properties:
+        materialize(property)
+    backfill_materialized_columns(
+        properties,
+        backfill_period_days if backfill_period_days is not None else settings.MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS,
+    )
+    return properties
+
+
+def _column_name(property: str, taken: set) -> str:
+    base = "mat_" + re.sub(r"[^a-zA-Z0-9_]", "_", property)[:60]
+    column, suffix = base, 0
+    while column in taken:
+        suffix += 1
+        column = f"{base}_{suffix}"
+    return column
@@ -0,0 +1,13 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.session_recording_events import (
+    BACKFILL_SESSION_RECORDINGS_SQL,
+    SESSION_RECORDINGS_TABLE_MV_SQL,
+    SESSION_RECORDINGS_TABLE_SQL,
+)
+
+operations = [
+    migrations.RunSQL(SESSION_RECORDINGS_TABLE_SQL),
+    migrations.RunSQL(SESSION_RECORDINGS_TABLE_MV_SQL),
+    migrations.RunSQL(BACKFILL_SESSION_RECORDINGS_SQL),
+]
@@ -0,0 +1,13 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.person import (
+    BACKFILL_PERSON_DISTINCT_ID_MAPPING_SQL,
+    PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL,
+    PERSON_DISTINCT_ID_MAPPING_TABLE_SQL,
+)
+
+operations = [
+    migrations.RunSQL(PERSON_DISTINCT_ID_MAPPING_TABLE_SQL),
+    migrations.RunSQL(PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL),
+    migrations.RunSQL(BACKFILL_PERSON_DISTINCT_ID_MAPPING_SQL.format(where="")),
+]
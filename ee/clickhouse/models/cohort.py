@@ -1,21 +1,22 @@
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
-from dateutil import parser
 from django.conf import settings
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
+from ee.clickhouse.query_cache import invalidate_team_watermark
 from ee.clickhouse.sql.cohort import (
     CALCULATE_COHORT_PEOPLE_SQL,
     GET_DISTINCT_ID_BY_ENTITY_SQL,
     GET_PERSON_ID_BY_COHORT_ID,
     GET_PERSON_ID_BY_ENTITY_COUNT_SQL,
-    INSERT_PEOPLE_MATCHING_COHORT_ID_SQL,
-    REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL,
+    RECALCULATE_COHORT_BY_ID_SQL,
+    RECALCULATE_COHORT_MEMBER_SCOPE,
+    RECALCULATE_COHORT_PERSON_SCOPE,
 )
 from ee.clickhouse.sql.person import (
     GET_LATEST_PERSON_ID_SQL,
@@ -24,11 +25,9 @@ from ee.clickhouse.sql.person import (
     INSERT_PERSON_STATIC_COHORT,
     PERSON_STATIC_COHORT_TABLE,
 )
+from posthog.internal_metrics import timing
 from posthog.models import Action, Cohort, Filter, Team
 
-# temporary marker to denote when cohortpeople table started being populated
-TEMP_PRECALCULATED_MARKER = parser.parse("2021-06-07T15:00:00+00:00")
-
 
 def format_person_query(cohort: Cohort, index: int, **kwargs) -> Tuple[str, Dict[str, Any]]:
     filters = []
@@ -175,16 +174,15 @@ def parse_cohort_timestamps(start_time: Optional[str], end_time: Optional[str])
 
 
 def is_precalculated_query(cohort: Cohort) -> bool:
-
-    if (
-        cohort.last_calculation
-        and cohort.last_calculation > TEMP_PRECALCULATED_MARKER
-        and settings.USE_PRECALCULATED_CH_COHORT_PEOPLE
-        and not cohort.is_static  # static cohorts are handled within the regular cohort filter query path
-    ):
-        return True
-    else:
-        return False
+    # Static cohorts are handled within the regular cohort filter query path
+    # Members lag behind as much as the scheduler does (see `report_precalculation_staleness`), like in Postgres, but
+    # once the definition changed they're wrong rather than stale
+    return (
+        settings.USE_PRECALCULATED_CH_COHORT_PEOPLE
+        and not cohort.is_static
+        and cohort.precalculated_version == cohort.version
+        and cohort.precalculated_at is not None
+    )
 
 
 def format_filter_query(cohort: Cohort, index: int = 0) -> Tuple[str, Dict[str, Any]]:
@@ -221,10 +219,14 @@ def get_person_ids_by_cohort_id(team: Team, cohort_id: int):
     return [str(row[0]) for row in results]
 
 
-def insert_static_cohort(person_uuids: List[Optional[uuid.UUID]], cohort_id: int, team: Team):
+def insert_static_cohort(person_uuids: Iterable[Optional[uuid.UUID]], cohort_id: int, team: Team):
+    """
+    Add the persons to the static cohort, streaming them to ClickHouse in one insert. Rows get an id derived from the
+    cohort and person, so inserting the same persons again only adds rows that get merged away.
+    """
     persons = (
         {
-            "id": str(uuid.uuid4()),
+            "id": str(uuid.uuid5(uuid.NAMESPACE_OID, f"{cohort_id}:{person_uuid}")),
             "person_id": str(person_uuid),
             "cohort_id": cohort_id,
             "team_id": team.pk,
@@ -233,15 +235,56 @@ def insert_static_cohort(person_uuids: List[Optional[uuid.UUID]], cohort_id: int
         for person_uuid in person_uuids
     )
     sync_execute(INSERT_PERSON_STATIC_COHORT, persons)
+    invalidate_team_watermark(team.pk)
 
 
-def recalculate_cohortpeople(cohort: Cohort):
-    cohort_filter, cohort_params = format_person_query(cohort, 0, custom_match_field="id")
+def recalculate_cohortpeople(cohort: Cohort) -> None:
+    """
+    Bring the precalculated members of the cohort up to date, writing only the persons that joined or left it, and
+    stamp the cohort with the version and time its members were calculated for.
+    """
+    version = cohort.version
+    started_at = timezone.now()
+    since = _get_incremental_recalculation_start(cohort)
 
+    cohort_filter, cohort_params = format_person_query(cohort, 0, custom_match_field="id")
     cohort_filter = GET_PERSON_IDS_BY_FILTER.format(distinct_query="AND " + cohort_filter, query="")
+    params = {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id}
+    if since is not None:
+        params["since"] = since.strftime("%Y-%m-%d %H:%M:%S")
+
+    sync_execute(
+        RECALCULATE_COHORT_BY_ID_SQL.format(
+            cohort_filter=cohort_filter,
+            person_scope=RECALCULATE_COHORT_PERSON_SCOPE if since is not None else "",
+            member_scope=RECALCULATE_COHORT_MEMBER_SCOPE if since is not None else "",
+        ),
+        params,
+    )
 
-    insert_cohortpeople_sql = INSERT_PEOPLE_MATCHING_COHORT_ID_SQL.format(cohort_filter=cohort_filter)
-    sync_execute(insert_cohortpeople_sql, {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id})
+    Cohort.objects.filter(pk=cohort.pk).update(precalculated_version=version, precalculated_at=started_at)
+    cohort.precalculated_version, cohort.precalculated_at = version, started_at
+    invalidate_team_watermark(cohort.team_id)
+    timing(
+        "cohort_precalculation_time",
+        (timezone.now() - started_at).total_seconds() * 1000,
+        tags={"mode": "incremental" if since is not None else "full"},
+    )
 
-    remove_cohortpeople_sql = REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL.format(cohort_filter=cohort_filter)
-    sync_execute(remove_cohortpeople_sql, {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id})
+
+def _get_incremental_recalculation_start(cohort: Cohort) -> Optional[datetime]:
+    """
+    When only persons updated since some time need evaluating again, that time. That's the case for cohorts that only
+    match on person properties and whose members were calculated for the same definition, as nothing else can change
+    whether a person matches. Behavioral cohorts also depend on events and on time passing, so they're evaluated in full.
+    """
+    if cohort.precalculated_version != cohort.version or cohort.precalculated_at is None:
+        return None
+    for group in cohort.groups:
+        if group.get("action_id") or group.get("event_id"):
+            return None
+        properties = group.get("properties")
+        if isinstance(properties, list) and any(prop.get("type") == "cohort" for prop in properties):
+            return None
+    # Person updates can be ingested a while after they were made
+    return cohort.precalculated_at - timedelta(minutes=settings.COHORT_INCREMENTAL_LOOKBACK_MINUTES)
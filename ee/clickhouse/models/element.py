@@ -1,5 +1,6 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from posthog.models.element import Element
 
@@ -8,9 +9,12 @@ parse_attributes_regex = re.compile(r"(?P<attribute>(?P<key>.*?)\=\"(?P<value>.*
 # Below splits all elements by ;, while ignoring escaped quotes and semicolons within quotes
 split_chain_regex = re.compile(r'(?:[^\s;"]|"(?:\\.|[^"])*")+')
 
-# Below splits the tag/classes from attributes
+# Below finds where the tag/classes end and attributes start
 # Needs a regex because classes can have : too
-split_class_attributes = re.compile(r"(.*?)($|:([a-zA-Z\-\_0-9]*=.*))")
+attributes_start_regex = re.compile(r":[a-zA-Z\-\_0-9]*=")
+
+# Event lists repeat the same few chains over and over, so parsed chains are kept around
+ELEMENTS_CHAIN_CACHE_SIZE = 10_000
 
 
 def _escape(input: str) -> str:
@@ -41,34 +45,97 @@ def elements_to_string(elements: List[Element],) -> str:
     return ";".join(ret)
 
 
-def chain_to_elements(chain: str) -> List[Element]:
+class ParsedElement:
+    """An element parsed from an elements chain. Much cheaper to create than an `Element` model instance."""
+
+    __slots__ = ("text", "tag_name", "attr_class", "href", "attr_id", "nth_child", "nth_of_type", "attributes", "order")
+
+    def __init__(self, order: int):
+        self.text: Optional[str] = None
+        self.tag_name: Optional[str] = None
+        self.attr_class: Optional[List[str]] = None
+        self.href: Optional[str] = None
+        self.attr_id: Optional[str] = None
+        self.nth_child: Optional[int] = None
+        self.nth_of_type: Optional[int] = None
+        self.attributes: Dict[str, str] = {}
+        self.order = order
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same as `ElementSerializer(element).data` for the equivalent `Element`."""
+        return {
+            "text": self.text,
+            "tag_name": self.tag_name,
+            "attr_class": list(self.attr_class) if self.attr_class is not None else None,
+            "href": self.href,
+            "attr_id": self.attr_id,
+            "nth_child": self.nth_child,
+            "nth_of_type": self.nth_of_type,
+            "attributes": dict(self.attributes),
+            "order": self.order,
+        }
+
+    def to_model(self) -> Element:
+        return Element(
+            text=self.text,
+            tag_name=self.tag_name,
+            attr_class=list(self.attr_class) if self.attr_class is not None else None,
+            href=self.href,
+            attr_id=self.attr_id,
+            nth_child=self.nth_child,
+            nth_of_type=self.nth_of_type,
+            attributes=dict(self.attributes),
+            order=self.order,
+        )
+
+
+@lru_cache(maxsize=ELEMENTS_CHAIN_CACHE_SIZE)
+def parse_elements_chain(chain: str) -> Tuple[ParsedElement, ...]:
+    """
+    Parse an elements chain into its elements. Results are cached and shared between callers, so they must not be
+    modified: use `to_dict` or `to_model` to get copies.
+    """
     elements = []
-    for idx, el_string in enumerate(re.findall(split_chain_regex, chain)):
-        el_string_split = re.findall(split_class_attributes, el_string)[0]
-        attributes = re.finditer(parse_attributes_regex, el_string_split[2]) if len(el_string_split) > 2 else []
-
-        element = Element(order=idx)
-
-        if el_string_split[0]:
-            tag_and_class = el_string_split[0].split(".", 1)
-            element.tag_name = tag_and_class[0]
-            if len(tag_and_class) > 1:
-                element.attr_class = [cl for cl in tag_and_class[1].split(".") if cl != ""]
-
-        for ii in attributes:
-            item = ii.groupdict()
-            if item["key"] == "href":
-                element.href = item["value"]
-            elif item["key"] == "nth-child":
-                element.nth_child = int(item["value"])
-            elif item["key"] == "nth-of-type":
-                element.nth_of_type = int(item["value"])
-            elif item["key"] == "text":
-                element.text = item["value"]
-            elif item["key"] == "attr_id":
-                element.attr_id = item["value"]
-            elif item["key"]:
-                element.attributes[item["key"]] = item["value"]
+    for order, match in enumerate(split_chain_regex.finditer(chain)):
+        el_string = match.group(0)
+        element = ParsedElement(order=order)
+
+        attributes_start = attributes_start_regex.search(el_string)
+        if attributes_start is not None:
+            tag_and_class, attributes = el_string[: attributes_start.start()], el_string[attributes_start.start() + 1 :]
+        else:
+            tag_and_class, attributes = el_string, ""
+
+        if tag_and_class:
+            tag_name, separator, classes = tag_and_class.partition(".")
+            element.tag_name = tag_name
+            if separator:
+                element.attr_class = [cl for cl in classes.split(".") if cl != ""]
+
+        if attributes:
+            for attribute in parse_attributes_regex.finditer(attributes):
+                key, value = attribute.group("key"), attribute.group("value")
+                if key == "href":
+                    element.href = value
+                elif key == "nth-child":
+                    element.nth_child = int(value)
+                elif key == "nth-of-type":
+                    element.nth_of_type = int(value)
+                elif key == "text":
+                    element.text = value
+                elif key == "attr_id":
+                    element.attr_id = value
+                elif key:
+                    element.attributes[key] = value
 
         elements.append(element)
-    return elements
+    return tuple(elements)
+
+
+def chain_to_elements(chain: str) -> List[Element]:
+    return [element.to_model() for element in parse_elements_chain(chain)]
+
+
+def chain_to_element_dicts(chain: str) -> List[Dict[str, Any]]:
+    """Elements of the chain as serialized by `ElementSerializer`, without going through `Element` instances."""
+    return [element.to_dict() for element in parse_elements_chain(chain)]
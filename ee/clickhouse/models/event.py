@@ -12,7 +12,7 @@ from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
 from ee.clickhouse.client import sync_execute
-from ee.clickhouse.models.element import chain_to_elements, elements_to_string
+from ee.clickhouse.models.element import chain_to_element_dicts, elements_to_string
 from ee.clickhouse.sql.events import GET_EVENTS_BY_TEAM_SQL, GET_EVENTS_SQL, INSERT_EVENT_SQL
 from ee.idl.gen import events_pb2
 from ee.kafka_client.client import ClickhouseProducer
@@ -97,25 +97,6 @@ def get_events_by_team(team_id: Union[str, int]):
     return ClickhouseEventSerializer(events, many=True, context={"elements": None, "people": None}).data
 
 
-class ElementSerializer(serializers.ModelSerializer):
-    event = serializers.CharField()
-
-    class Meta:
-        model = Element
-        fields = [
-            "event",
-            "text",
-            "tag_name",
-            "attr_class",
-            "href",
-            "attr_id",
-            "nth_child",
-            "nth_of_type",
-            "attributes",
-            "order",
-        ]
-
-
 # reference raw sql for
 class ClickhouseEventSerializer(serializers.Serializer):
     id = serializers.SerializerMethodField()
@@ -157,17 +138,16 @@ class ClickhouseEventSerializer(serializers.Serializer):
 
         person = self.context["people"][event[5]]
         return {
-            "is_identified": person.is_identified,
-            "distinct_ids": [person.distinct_ids[0]],  # only send the first one to avoid a payload bloat
-            "properties": {
-                key: person.properties[key] for key in ["email", "name", "username"] if key in person.properties
-            },
+            "is_identified": person["is_identified"],
+            "distinct_ids": [person["distinct_id"]],  # only send the first one to avoid a payload bloat
+            "properties": person["properties"],
         }
 
     def get_elements(self, event):
         if not event[6]:
             return []
-        return ElementSerializer(chain_to_elements(event[6]), many=True).data
+        # Elements of events have always been serialized with an empty `event`
+        return [{"event": None, **element} for element in chain_to_element_dicts(event[6])]
 
     def get_elements_chain(self, event):
         return event[6]
@@ -187,8 +167,14 @@ def determine_event_conditions(
             params.update({"after": timestamp})
         elif k == "before":
             timestamp = isoparse(v).strftime("%Y-%m-%d %H:%M:%S.%f")
-            result += "AND timestamp < %(before)s"
-            params.update({"before": timestamp})
+            before_uuid = conditions.get("before_uuid")
+            if isinstance(before_uuid, str) and before_uuid:
+                # Keyset cursor: events at the same timestamp as the last event of the previous page aren't skipped
+                result += "AND (timestamp < %(before)s OR (timestamp = %(before)s AND uuid < toUUID(%(before_uuid)s)))"
+                params.update({"before": timestamp, "before_uuid": before_uuid})
+            else:
+                result += "AND timestamp < %(before)s"
+                params.update({"before": timestamp})
         elif k == "person_id":
             result += """AND distinct_id IN (%(distinct_ids)s)"""
             person = Person.objects.filter(pk=v, team_id=team.pk).first()
@@ -11,11 +11,15 @@ from rest_framework import serializers
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.sql.person import (
+    BACKFILL_PERSON_DISTINCT_ID_MAPPING_SQL,
     DELETE_PERSON_BY_ID,
     DELETE_PERSON_DISTINCT_ID_BY_PERSON_ID,
     DELETE_PERSON_EVENTS_BY_ID,
     INSERT_PERSON_DISTINCT_ID,
     INSERT_PERSON_SQL,
+    PERSON_DISTINCT_ID_MAPPING_CHECKSUM_SQL,
+    PERSON_DISTINCT_ID_MAPPING_TABLE,
+    PERSONS_DISTINCT_ID_TABLE,
 )
 from ee.kafka_client.client import ClickhouseProducer
 from ee.kafka_client.topics import KAFKA_PERSON, KAFKA_PERSON_UNIQUE_ID
@@ -82,6 +86,33 @@ def create_person_distinct_id(id: int, team_id: int, distinct_id: str, person_id
     p.produce(topic=KAFKA_PERSON_UNIQUE_ID, sql=INSERT_PERSON_DISTINCT_ID, data=data)
 
 
+def get_inconsistent_person_distinct_id_mapping_teams(team_ids: Optional[List[int]] = None) -> List[int]:
+    """Teams whose valid (person, distinct id) pairs in the mapping table differ from the ones in person_distinct_id."""
+    where, params = ("WHERE team_id IN %(team_ids)s", {"team_ids": team_ids}) if team_ids else ("", {})
+    expected, actual = (
+        {
+            team_id: (count, checksum)
+            for team_id, count, checksum in sync_execute(
+                PERSON_DISTINCT_ID_MAPPING_CHECKSUM_SQL.format(table_name=table_name, where=where), params
+            )
+        }
+        for table_name in (PERSONS_DISTINCT_ID_TABLE, PERSON_DISTINCT_ID_MAPPING_TABLE)
+    )
+    return sorted(
+        team_id for team_id in expected.keys() | actual.keys() if expected.get(team_id) != actual.get(team_id)
+    )
+
+
+def repair_person_distinct_id_mapping(team_ids: List[int]) -> None:
+    """
+    Insert the pairs of these teams into the mapping table again. This fixes pairs missing from the mapping, which is
+    the only way it can drift, as the mapping is only ever written from person_distinct_id rows.
+    """
+    sync_execute(
+        BACKFILL_PERSON_DISTINCT_ID_MAPPING_SQL.format(where="WHERE team_id IN %(team_ids)s"), {"team_ids": team_ids}
+    )
+
+
 def get_persons_by_distinct_ids(team_id: int, distinct_ids: List[str]) -> QuerySet:
     return Person.objects.filter(
         team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id__in=distinct_ids
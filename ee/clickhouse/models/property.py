@@ -1,10 +1,10 @@
 import re
 from typing import Any, Dict, List, Optional, Tuple
 
-from django.conf import settings
 from django.utils import timezone
 
 from ee.clickhouse.client import sync_execute
+from ee.clickhouse.materialized_columns import get_materialized_column
 from ee.clickhouse.models.cohort import format_filter_query
 from ee.clickhouse.models.util import is_json
 from ee.clickhouse.sql.events import SELECT_PROP_VALUES_SQL, SELECT_PROP_VALUES_SQL_WITH_FILTER
@@ -85,11 +85,14 @@ def prop_filter_json_extract(
     prop: Property, idx: int, prepend: str = "", prop_var: str = "properties", allow_denormalized_props: bool = False
 ) -> Tuple[str, Dict[str, Any]]:
     # Once all queries are migrated over we can get rid of allow_denormalized_props
-    is_denormalized = prop.key.lower() in settings.CLICKHOUSE_DENORMALIZED_PROPERTIES and allow_denormalized_props
+    materialized_column = (
+        get_materialized_column(prop.key) if allow_denormalized_props and prop.type != "person" else None
+    )
+    is_denormalized = materialized_column is not None
     json_extract = "trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s))".format(
         idx=idx, prepend=prepend, prop_var=prop_var
     )
-    denormalized = "properties_{}".format(prop.key.lower())
+    denormalized = materialized_column
     operator = prop.operator
     params: Dict[str, Any] = {}
 
@@ -137,8 +140,9 @@ def prop_filter_json_extract(
     elif operator == "is_set":
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         if is_denormalized:
+            # Materialized columns hold an empty string when the property isn't set, they're never null
             return (
-                "AND NOT isNull({left})".format(left=denormalized),
+                "AND {left} != ''".format(left=denormalized),
                 params,
             )
         return (
@@ -149,7 +153,7 @@ def prop_filter_json_extract(
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         if is_denormalized:
             return (
-                "AND isNull({left})".format(left=denormalized),
+                "AND {left} = ''".format(left=denormalized),
                 params,
             )
         return (
@@ -7,7 +7,13 @@ from django.utils import timezone
 from freezegun import freeze_time
 
 from ee.clickhouse.client import sync_execute
-from ee.clickhouse.models.cohort import format_filter_query, get_person_ids_by_cohort_id, recalculate_cohortpeople
+from ee.clickhouse.models.cohort import (
+    format_filter_query,
+    get_person_ids_by_cohort_id,
+    insert_static_cohort,
+    is_precalculated_query,
+    recalculate_cohortpeople,
+)
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.models.person import create_person, create_person_distinct_id
 from ee.clickhouse.models.property import parse_prop_clauses
@@ -286,7 +292,7 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         # test SQLi
         Person.objects.create(team_id=self.team.pk, distinct_ids=["'); truncate person_static_cohort; --"])
         cohort.insert_users_by_list(["'); truncate person_static_cohort; --", "123"])
-        results = sync_execute("select count(1) from person_static_cohort")[0][0]
+        results = sync_execute("select count(1) from person_static_cohort FINAL")[0][0]
         self.assertEqual(results, 3)
 
         #  If we accidentally call calculate_people it shouldn't erase people
@@ -299,6 +305,20 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         results = get_person_ids_by_cohort_id(self.team, cohort.id)
         self.assertEqual(len(results), 3)
 
+    def test_insert_static_cohort_twice(self):
+        p1 = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"])
+        p2 = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"])
+        cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
+
+        insert_static_cohort([p1.uuid, p2.uuid], cohort.pk, self.team)
+        insert_static_cohort([p1.uuid, p2.uuid], cohort.pk, self.team)
+
+        results = sync_execute(
+            "SELECT count(1) FROM person_static_cohort FINAL WHERE cohort_id = %(cohort_id)s", {"cohort_id": cohort.pk}
+        )[0][0]
+        self.assertEqual(results, 2)
+        self.assertEqual(len(get_person_ids_by_cohort_id(self.team, cohort.pk)), 2)
+
     def test_cohortpeople_basic(self):
         p1 = Person.objects.create(
             team_id=self.team.pk,
@@ -634,9 +654,9 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
                 FROM
                 (
                     SELECT person_id, distinct_id
-                    FROM person_distinct_id
+                    FROM person_distinct_id_mapping
                     WHERE team_id = %(team_id)s
-                    GROUP BY person_id, distinct_id, team_id
+                    GROUP BY person_id, distinct_id
                     HAVING max(is_deleted) = 0
                 )
                 where person_id IN
@@ -648,3 +668,60 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
                     reindent=True,
                 ),
             )
+
+    def test_cohort_version_bumped_when_groups_change(self):
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "something"}}])
+        self.assertEqual(cohort.version, 0)
+
+        cohort.name = "renamed"
+        cohort.save()
+        self.assertEqual(cohort.version, 0)
+
+        cohort.groups = [{"properties": {"$some_prop": "another"}}]
+        cohort.save()
+        self.assertEqual(Cohort.objects.get(pk=cohort.pk).version, 1)
+
+    def test_cohortpeople_incremental_recalculation(self):
+        p1 = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"$some_prop": "something"})
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["2"], properties={"$some_prop": "something"})
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["3"], properties={"$some_prop": "nothing"})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "something"}}])
+
+        cohort.calculate_people_ch()
+        self.assertEqual(cohort.precalculated_version, cohort.version)
+        self.assertIsNotNone(Cohort.objects.get(pk=cohort.pk).precalculated_at)
+        rows_written = sync_execute("SELECT count() FROM cohortpeople")[0][0]
+        self.assertEqual(rows_written, 2)
+
+        # Nothing changed, so nothing is written
+        cohort.calculate_people_ch()
+        self.assertEqual(sync_execute("SELECT count() FROM cohortpeople")[0][0], rows_written)
+
+        p1.properties = {"$some_prop": "changed"}
+        p1.save()
+        cohort.calculate_people_ch()
+
+        results = sync_execute(
+            "SELECT person_id FROM cohortpeople GROUP BY person_id, team_id, cohort_id HAVING sum(sign) > 0"
+        )
+        self.assertEqual(len(results), 1)
+        self.assertNotEqual(results[0][0], p1.uuid)
+
+    def test_precalculated_cohort_only_used_while_current(self):
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "something"}}])
+
+        with self.settings(USE_PRECALCULATED_CH_COHORT_PEOPLE=True):
+            self.assertFalse(is_precalculated_query(cohort))
+
+            with freeze_time("2020-01-10T12:00:00Z"):
+                cohort.calculate_people_ch()
+                self.assertTrue(is_precalculated_query(cohort))
+
+            # Still used while waiting to be calculated again
+            with freeze_time("2020-01-10T14:00:00Z"):
+                self.assertTrue(is_precalculated_query(cohort))
+
+            cohort.calculate_people_ch()
+            cohort.groups = [{"properties": {"$some_prop": "another"}}]
+            cohort.save()
+            self.assertFalse(is_precalculated_query(cohort))
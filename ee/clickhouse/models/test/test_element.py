@@ -1,6 +1,7 @@
 from ee.clickhouse.client import sync_execute
-from ee.clickhouse.models.element import chain_to_elements, elements_to_string
+from ee.clickhouse.models.element import chain_to_element_dicts, chain_to_elements, elements_to_string
 from ee.clickhouse.util import ClickhouseTestMixin
+from posthog.api.element import ElementSerializer
 from posthog.models import Element
 from posthog.models.utils import UUIDT
 from posthog.test.base import BaseTest
@@ -79,3 +80,30 @@ class TestClickhouseElement(ClickhouseTestMixin, BaseTest):
         self.assertEqual(elements[0].tag_name, "a")
         self.assertEqual(elements[0].href, "/a-url")
         self.assertEqual(elements[0].attr_class, ["small", "xy:z"])
+
+    def test_chain_to_element_dicts(self):
+        elements_string = elements_to_string(
+            elements=[
+                Element(
+                    tag_name="a",
+                    href="/a-url",
+                    attr_class=["small"],
+                    text="bla bla",
+                    attributes={"data-attr": 'something " that; could mess up'},
+                    nth_child=1,
+                    nth_of_type=0,
+                ),
+                Element(tag_name="div", nth_child=0, nth_of_type=0, attr_id="nested"),
+            ],
+        )
+
+        self.assertEqual(
+            chain_to_element_dicts(elements_string),
+            ElementSerializer(chain_to_elements(elements_string), many=True).data,
+        )
+
+        # Parsed chains are cached, changing the result doesn't change what later calls get
+        chain_to_element_dicts(elements_string)[0]["attributes"]["data-attr"] = "changed"
+        self.assertEqual(
+            chain_to_element_dicts(elements_string)[0]["attributes"], {"data-attr": r"something \" that; could mess up"}
+        )
@@ -0,0 +1,66 @@
+from datetime import datetime
+from uuid import UUID
+
+from ee.clickhouse.client import sync_execute
+from ee.clickhouse.models.person import (
+    create_person,
+    delete_person,
+    get_inconsistent_person_distinct_id_mapping_teams,
+    repair_person_distinct_id_mapping,
+)
+from ee.clickhouse.sql.person import GET_LATEST_PERSON_SQL, GET_TEAM_PERSON_DISTINCT_IDS
+from ee.clickhouse.util import ClickhouseTestMixin
+from posthog.models.person import Person
+from posthog.test.base import BaseTest
+
+
+class TestPersonDistinctIdMapping(ClickhouseTestMixin, BaseTest):
+    def test_mapping_follows_person_distinct_ids(self):
+        person = Person.objects.create(team=self.team, distinct_ids=["1", "2"])
+        other_person = Person.objects.create(team=self.team, distinct_ids=["3"])
+
+        self.assertCountEqual(
+            sync_execute(GET_TEAM_PERSON_DISTINCT_IDS, {"team_id": self.team.pk}),
+            [(person.uuid, "1"), (person.uuid, "2"), (other_person.uuid, "3")],
+        )
+        self.assertEqual(get_inconsistent_person_distinct_id_mapping_teams(), [])
+
+    def test_repair_inconsistent_mapping(self):
+        Person.objects.create(team=self.team, distinct_ids=["1", "2"])
+        sync_execute("TRUNCATE TABLE person_distinct_id_mapping")
+
+        self.assertEqual(get_inconsistent_person_distinct_id_mapping_teams(), [self.team.pk])
+        self.assertEqual(get_inconsistent_person_distinct_id_mapping_teams([self.team.pk + 1]), [])
+
+        repair_person_distinct_id_mapping([self.team.pk])
+
+        self.assertEqual(get_inconsistent_person_distinct_id_mapping_teams(), [])
+        self.assertEqual(len(sync_execute(GET_TEAM_PERSON_DISTINCT_IDS, {"team_id": self.team.pk})), 2)
+
+
+class TestLatestPerson(ClickhouseTestMixin, BaseTest):
+    def test_latest_version_of_persons_that_are_not_deleted(self):
+        person_id = create_person(
+            team_id=self.team.pk, properties={"email": "old@posthog.com"}, timestamp=datetime(2021, 1, 1)
+        )
+        create_person(
+            team_id=self.team.pk,
+            uuid=person_id,
+            properties={"email": "new@posthog.com"},
+            is_identified=True,
+            timestamp=datetime(2021, 1, 2),
+        )
+        deleted_person_id = create_person(team_id=self.team.pk, properties={"email": "deleted@posthog.com"})
+        delete_person(UUID(deleted_person_id), {}, False, team_id=self.team.pk)
+
+        persons = sync_execute(
+            "SELECT id, properties, is_identified FROM ({})".format(GET_LATEST_PERSON_SQL.format(query="")),
+            {"team_id": self.team.pk},
+        )
+        self.assertEqual(persons, [(UUID(person_id), '{"email": "new@posthog.com"}', 1)])
+
+        filtered = sync_execute(
+            GET_LATEST_PERSON_SQL.format(query="AND JSONExtractString(properties, 'email') = 'old@posthog.com'"),
+            {"team_id": self.team.pk},
+        )
+        self.assertEqual(filtered, [])
@@ -4,6 +4,7 @@ from uuid import UUID, uuid4
 import pytest
 
 from ee.clickhouse.client import sync_execute
+from ee.clickhouse.materialized_columns import backfill_materialized_columns, get_materialized_columns, materialize
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.models.property import parse_prop_clauses, prop_filter_json_extract
 from ee.clickhouse.util import ClickhouseTestMixin
@@ -291,6 +292,60 @@ class TestPropDenormalized(ClickhouseTestMixin, BaseTest):
             self.assertEqual(len(self._run_query(filter)), 1)
 
 
+class TestPropMaterialized(ClickhouseTestMixin, BaseTest):
+    CLASS_DATA_LEVEL_SETUP = False
+
+    def _run_query(self, filter: Filter) -> List:
+        query, params = parse_prop_clauses(filter.properties, self.team.pk, allow_denormalized_props=True)
+        final_query = "SELECT uuid FROM events WHERE team_id = %(team_id)s {}".format(query)
+        self.assertNotIn("json", final_query.lower())
+        return sync_execute(final_query, {**params, "team_id": self.team.pk})
+
+    def test_prop_event_materialized(self):
+        column = materialize("materialized prop")
+        self.assertEqual(get_materialized_columns()["materialized prop"], column)
+        self.assertEqual(materialize("materialized prop"), column)
+
+        _create_event(
+            event="$pageview", team=self.team, distinct_id="whatever", properties={"materialized prop": "some_val"},
+        )
+        _create_event(
+            event="$pageview", team=self.team, distinct_id="whatever", properties={"materialized prop": "other_val"},
+        )
+        _create_event(event="$pageview", team=self.team, distinct_id="whatever", properties={})
+
+        filter = Filter(data={"properties": [{"key": "materialized prop", "value": "some_val"}]})
+        self.assertEqual(len(self._run_query(filter)), 1)
+
+        filter = Filter(data={"properties": [{"key": "materialized prop", "value": "_val", "operator": "icontains"}]})
+        self.assertEqual(len(self._run_query(filter)), 2)
+
+        filter = Filter(data={"properties": [{"key": "materialized prop", "value": "", "operator": "is_set"}]})
+        self.assertEqual(len(self._run_query(filter)), 2)
+
+        filter = Filter(data={"properties": [{"key": "materialized prop", "value": "", "operator": "is_not_set"}]})
+        self.assertEqual(len(self._run_query(filter)), 1)
+
+    def test_backfilled_columns_stay_materialized(self):
+        _create_event(
+            event="$pageview", team=self.team, distinct_id="whatever", properties={"materialized prop": "some_val"},
+        )
+        column = materialize("materialized prop")
+        backfill_materialized_columns(["materialized prop"], backfill_period_days=30)
+
+        default_kind = sync_execute(
+            "SELECT default_kind FROM system.columns WHERE table = 'events' AND name = %(column)s", {"column": column}
+        )
+        self.assertEqual(default_kind, [("MATERIALIZED",)])
+
+        # Positional inserts and SELECT * leave materialized columns out
+        _create_event(event="$pageview", team=self.team, distinct_id="whatever", properties={"materialized prop": "x"})
+        self.assertNotIn(column, [row[0] for row in sync_execute("DESCRIBE (SELECT * FROM events)")])
+
+        filter = Filter(data={"properties": [{"key": "materialized prop", "value": "some_val"}]})
+        self.assertEqual(len(self._run_query(filter)), 1)
+
+
 @pytest.fixture
 def test_events(db, team) -> List[UUID]:
     return [
@@ -2,6 +2,8 @@ import datetime
 import json
 from typing import Any, Callable, List, Optional, Tuple
 
+import pytz
+
 from ee.clickhouse.client import sync_execute
 from posthog.models import Team
 from posthog.models.filters.sessions_filter import SessionsFilter
@@ -19,44 +21,77 @@ SINGLE_RECORDING_QUERY = """
     WHERE
         team_id = %(team_id)s
         AND session_id = %(session_id)s
+        {window_query}
     ORDER BY timestamp
 """
 
+SINGLE_RECORDING_WINDOW_END_QUERY = """
+    SELECT timestamp
+    FROM session_recording_events
+    WHERE
+        team_id = %(team_id)s
+        AND session_id = %(session_id)s
+        {after_query}
+    ORDER BY timestamp
+    LIMIT 1 OFFSET %(offset)s
+"""
+
 SESSIONS_IN_RANGE_QUERY = """
     SELECT
         session_id,
         distinct_id,
-        start_time,
-        end_time,
-        dateDiff('second', toDateTime(start_time), toDateTime(end_time)) as duration
+        recording_start AS start_time,
+        recording_end AS end_time,
+        dateDiff('second', toDateTime(recording_start), toDateTime(recording_end)) as duration
     FROM (
         SELECT
             session_id,
             distinct_id,
-            MIN(timestamp) AS start_time,
-            MAX(timestamp) AS end_time,
-            COUNT((JSONExtractInt(snapshot_data, 'type') = 2 OR JSONExtractBool(snapshot_data, 'has_full_snapshot')) ? 1 : NULL) as full_snapshots
-        FROM session_recording_events
-        WHERE
-            team_id = %(team_id)s
-            AND timestamp >= %(start_time)s
-            AND timestamp <= %(end_time)s
-        GROUP BY distinct_id, session_id
+            min(start_time) AS recording_start,
+            max(end_time) AS recording_end,
+            max(has_full_snapshot) AS full_snapshot
+        FROM session_recordings
+        WHERE team_id = %(team_id)s
+        GROUP BY session_id, distinct_id
+        HAVING recording_start <= %(end_time)s AND recording_end >= %(start_time)s
     )
-    WHERE full_snapshots > 0 {filter_query}
+    WHERE full_snapshot {filter_query}
 """
 SESSIONS_IN_RANGE_QUERY_COLUMNS = ["session_id", "distinct_id", "start_time", "end_time", "duration"]
 
 
 class SessionRecording(BaseSessionRecording):
     def query_recording_snapshots(
-        self, team: Team, session_id: str
+        self,
+        team: Team,
+        session_id: str,
+        after: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
     ) -> Tuple[Optional[DistinctId], Optional[datetime.datetime], Snapshots]:
-        response = sync_execute(SINGLE_RECORDING_QUERY, {"team_id": team.id, "session_id": session_id})
+        window_query, params = "", {"team_id": team.id, "session_id": session_id}
+        if after is not None:
+            window_query += "AND timestamp > toDateTime64(%(after)s, 6, 'UTC') "
+            params["after"] = _format_timestamp(after)
+        if until is not None:
+            window_query += "AND timestamp <= toDateTime64(%(until)s, 6, 'UTC')"
+            params["until"] = _format_timestamp(until)
+
+        response = sync_execute(SINGLE_RECORDING_QUERY.format(window_query=window_query), params)
         if len(response) == 0:
             return None, None, []
         return response[0][0], response[0][1], [json.loads(snapshot_data) for _, _, snapshot_data in response]
 
+    def query_window_end(
+        self, team: Team, session_id: str, after: Optional[datetime.datetime], limit: int
+    ) -> Optional[datetime.datetime]:
+        after_query, params = "", {"team_id": team.id, "session_id": session_id, "offset": limit - 1}
+        if after is not None:
+            after_query = "AND timestamp > toDateTime64(%(after)s, 6, 'UTC')"
+            params["after"] = _format_timestamp(after)
+
+        response = sync_execute(SINGLE_RECORDING_WINDOW_END_QUERY.format(after_query=after_query), params)
+        return response[0][0] if response else None
+
 
 def join_with_session_recordings(team: Team, sessions_results: List[Any], filter: SessionsFilter) -> List[Any]:
     return _join_with_session_recordings(team, sessions_results, filter, query=query_sessions_in_range)
@@ -84,3 +119,9 @@ def query_sessions_in_range(
     )
 
     return [dict(zip(SESSIONS_IN_RANGE_QUERY_COLUMNS, row)) for row in results]
+
+
+def _format_timestamp(timestamp: datetime.datetime) -> str:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(pytz.utc)
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -0,0 +1,101 @@
+"""
+Bulk export of events as CSV or JSON lines, streamed to the response one page of events at a time. Each page is read
+from ClickHouse in full before any of it is sent, so that a slow client doesn't keep a connection of the pool busy.
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from ee.clickhouse.client import sync_execute
+from ee.clickhouse.models.event import ClickhouseEventSerializer
+from ee.clickhouse.sql.events import EXPORT_EVENTS_SQL
+from posthog.helpers.person_summary import get_person_summaries
+
+CSV = "csv"
+JSONL = "jsonl"
+EXPORT_FORMATS = {CSV: "text/csv", JSONL: "application/x-ndjson"}
+
+# Events queried (and held in memory) at once. Each page continues where the previous one stopped
+EXPORT_PAGE_SIZE = 10_000
+# Events serialized (and whose persons are looked up) at once
+EXPORT_BLOCK_SIZE = 1_000
+
+# Nested values are written as JSON, as their keys differ from event to event and CSV headers come first
+CSV_COLUMNS = ["id", "event", "timestamp", "distinct_id", "person", "properties", "elements_chain"]
+
+KEYSET_CONDITION = """
+AND (timestamp < %(cursor_timestamp)s OR (timestamp = %(cursor_timestamp)s AND uuid < toUUID(%(cursor_uuid)s)))
+"""
+
+
+def iter_events(
+    team_id: int, conditions: str, filters: str, params: Dict[str, Any], page_size: Optional[int] = None
+) -> Generator[Tuple, None, None]:
+    """All events matching the conditions and filters, newest first, one page of `page_size` events at a time."""
+    page_size = page_size or EXPORT_PAGE_SIZE
+    cursor: Optional[Tuple] = None
+    while True:
+        keyset, keyset_params = "", {}
+        if cursor is not None:
+            keyset = KEYSET_CONDITION
+            keyset_params = {
+                "cursor_timestamp": cursor[3].strftime("%Y-%m-%d %H:%M:%S.%f"),
+                "cursor_uuid": str(cursor[0]),
+            }
+
+        page = sync_execute(
+            EXPORT_EVENTS_SQL.format(conditions=conditions, filters=filters, keyset=keyset),
+            {"team_id": team_id, "page_size": page_size, **params, **keyset_params},
+        )
+        yield from page
+
+        if len(page) < page_size:
+            return
+        cursor = page[-1]
+
+
+def export_events(team_id: int, events: Iterable[Tuple], export_format: str) -> Generator[str, None, None]:
+    """Serialize events block by block, as chunks of the CSV or JSON lines file."""
+    if export_format == CSV:
+        yield _to_csv([CSV_COLUMNS])
+
+    for block in _blocks(events, EXPORT_BLOCK_SIZE):
+        people = get_person_summaries(team_id, [event[5] for event in block])
+        serialized = ClickhouseEventSerializer(block, many=True, context={"people": people}).data
+        if export_format == CSV:
+            yield _to_csv(
+                [
+                    [
+                        event["id"],
+                        event["event"],
+                        event["timestamp"],
+                        event["distinct_id"],
+                        json.dumps(event["person"], cls=JSONEncoder) if event["person"] else "",
+                        json.dumps(event["properties"], cls=JSONEncoder),
+                        event["elements_chain"],
+                    ]
+                    for event in serialized
+                ]
+            )
+        else:
+            yield "".join(json.dumps(event, cls=JSONEncoder) + "\n" for event in serialized)
+
+
+def _blocks(rows: Iterable[Tuple], size: int) -> Generator[List[Tuple], None, None]:
+    block: List[Tuple] = []
+    for row in rows:
+        block.append(row)
+        if len(block) == size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _to_csv(rows: List[List[Any]]) -> str:
+    output = io.StringIO()
+    csv.writer(output).writerows(rows)
+    return output.getvalue()
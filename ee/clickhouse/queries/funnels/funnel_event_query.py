@@ -1,11 +1,10 @@
-from typing import Any, Dict, Tuple
-
-from django.conf import settings
+from typing import Any, Dict, List, Tuple
 
+from ee.clickhouse.materialized_columns import get_materialized_column
 from ee.clickhouse.queries.event_query import ClickhouseEventQuery
-from ee.settings import CLICKHOUSE_DENORMALIZED_PROPERTIES
 from posthog.constants import TREND_FILTER_TYPE_ACTIONS
 from posthog.models.action import Action
+from posthog.models.entity import Entity
 
 
 class FunnelEventQuery(ClickhouseEventQuery):
@@ -14,14 +13,7 @@ class FunnelEventQuery(ClickhouseEventQuery):
             f"{self.EVENT_TABLE_ALIAS}.event as event, {self.EVENT_TABLE_ALIAS}.team_id as team_id, {self.EVENT_TABLE_ALIAS}.distinct_id as distinct_id, {self.EVENT_TABLE_ALIAS}.timestamp as timestamp, {self.EVENT_TABLE_ALIAS}.properties as properties, {self.EVENT_TABLE_ALIAS}.elements_chain as elements_chain"
             + (f", {self.DISTINCT_ID_TABLE_ALIAS}.person_id as person_id" if self._should_join_distinct_ids else "")
             + (f", {self.PERSON_TABLE_ALIAS}.person_props as person_props" if self._should_join_persons else "")
-            + (
-                " ".join(
-                    [
-                        f", {self.EVENT_TABLE_ALIAS}.properties_{prop} as properties_{prop}"
-                        for prop in settings.CLICKHOUSE_DENORMALIZED_PROPERTIES
-                    ]
-                )
-            )
+            + self._get_materialized_column_fields(entities or self._filter.entities)
         )
 
         date_query, date_params = self._get_date_filter()
@@ -51,6 +43,19 @@ class FunnelEventQuery(ClickhouseEventQuery):
 
         return query, self.params
 
+    def _get_materialized_column_fields(self, entities: List[Entity]) -> str:
+        # Step property filters are applied on top of this query, reading the columns of the properties they filter on
+        columns = {
+            get_materialized_column(prop.key)
+            for entity in entities
+            for prop in entity.properties
+            if prop.type == "event"
+        }
+        return "".join(
+            f", {self.EVENT_TABLE_ALIAS}.{column} as {column}"
+            for column in sorted(column for column in columns if column is not None)
+        )
+
     def _determine_should_join_distinct_ids(self) -> None:
         self._should_join_distinct_ids = True
 
@@ -10,7 +10,8 @@ from ee.clickhouse.queries.clickhouse_session_recording import join_with_session
 from ee.clickhouse.queries.sessions.clickhouse_sessions import set_default_dates
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.sessions.list import SESSION_SQL, SESSIONS_DISTINCT_ID_SQL
-from posthog.models import Entity, Person
+from posthog.helpers.person_summary import get_person_summaries
+from posthog.models import Entity
 from posthog.models.filters.sessions_filter import SessionsFilter
 from posthog.queries.sessions.sessions_list import SessionsList
 from posthog.utils import flatten
@@ -95,16 +96,11 @@ class ClickhouseSessionsList(SessionsList):
         if len(distinct_ids) == 0:
             return
 
-        persons = get_persons_by_distinct_ids(self.team.pk, distinct_ids)
-
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
+        persons = get_person_summaries(self.team.pk, distinct_ids)
 
         for session in sessions:
-            if distinct_to_person.get(session["distinct_id"], None):
-                session["email"] = distinct_to_person[session["distinct_id"]].properties.get("email")
+            if persons.get(session["distinct_id"], None):
+                session["email"] = persons[session["distinct_id"]]["properties"].get("email")
 
     def _parse_list_results(self, results: List[Tuple]):
         return [
@@ -0,0 +1,112 @@
+"""
+Query-level result cache for `sync_execute(..., use_query_cache=True)`.
+
+Results are keyed on the normalized SQL, its params and the team's ingestion watermark: the latest `_timestamp` of the
+team's events, persons, distinct IDs and static cohort members, and when its cohorts were last precalculated, as
+`cohortpeople` has no timestamp of its own. New data for a team moves its watermark and so changes the key of every
+cached query of that team, which makes explicit invalidation unnecessary. Watermarks are themselves cached for
+`CLICKHOUSE_QUERY_CACHE_WATERMARK_TTL` seconds, which bounds how stale a cached result can be. Only events with
+a timestamp in the last month move the watermark, older ones arriving late show up once results expire after
+`CLICKHOUSE_QUERY_CACHE_TTL`.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.db.models import Max
+from sentry_sdk.api import capture_exception
+
+from ee.clickhouse.result_cache_codecs import get_result_codec
+from posthog import redis
+from posthog.internal_metrics import incr
+
+# Events are partitioned by month of their timestamp, so only the partitions of the last month are scanned
+TEAM_INGESTION_WATERMARK_SQL = """
+SELECT
+    (SELECT max(_timestamp) FROM events WHERE team_id = %(team_id)s AND timestamp > now() - INTERVAL 1 MONTH),
+    (SELECT max(_timestamp) FROM person WHERE team_id = %(team_id)s),
+    (SELECT max(_timestamp) FROM person_distinct_id WHERE team_id = %(team_id)s),
+    (SELECT max(_timestamp) FROM person_static_cohort WHERE team_id = %(team_id)s)
+"""
+
+_COMMENT_REGEX = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+_WHITESPACE_REGEX = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Strip comments and collapse whitespace, so that formatting differences don't produce different cache keys."""
+    return _WHITESPACE_REGEX.sub(" ", _COMMENT_REGEX.sub(" ", query)).strip()
+
+
+def get_team_watermark(team_id: int, execute: Callable) -> str:
+    client = redis.get_client()
+    key = f"clickhouse_team_watermark:{team_id}"
+    watermark = client.get(key)
+    if watermark is not None:
+        return watermark.decode("utf-8")
+
+    from posthog.models import Cohort
+
+    rows = execute(TEAM_INGESTION_WATERMARK_SQL, {"team_id": team_id})
+    precalculated_at = Cohort.objects.filter(team_id=team_id).aggregate(latest=Max("precalculated_at"))["latest"]
+    watermark = ",".join(str(value) for value in [*rows[0], precalculated_at])
+    client.set(key, watermark, ex=settings.CLICKHOUSE_QUERY_CACHE_WATERMARK_TTL)
+    return watermark
+
+
+def invalidate_team_watermark(team_id: int) -> None:
+    """Make the next cached query of the team pick up data written just now, e.g. by the app itself."""
+    redis.get_client().delete(f"clickhouse_team_watermark:{team_id}")
+
+
+def cached_execute(
+    query: str, args: Any, with_column_types: bool, execute: Callable, tags: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    Return the cached result of the query, running it through `execute(query, args, with_column_types=...)` on a miss.
+    Queries without a `team_id` param can't be tied to a watermark and are always executed.
+    """
+    team_id = args.get("team_id") if isinstance(args, dict) else None
+    if not settings.CLICKHOUSE_QUERY_CACHE_ENABLED or team_id is None:
+        return execute(query, args, with_column_types=with_column_types)
+
+    metric_tags = {"kind": (tags or {}).get("kind"), "id": (tags or {}).get("id")}
+    client = redis.get_client()
+    codec = get_result_codec()
+    try:
+        watermark = get_team_watermark(team_id, execute)
+    except Exception as err:
+        capture_exception(err)
+        return execute(query, args, with_column_types=with_column_types)
+
+    fingerprint = hashlib.sha256(
+        "\n".join(
+            [
+                normalize_query(query),
+                json.dumps(args, sort_keys=True, default=str),
+                str(int(with_column_types)),
+                watermark,
+                codec.name,
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+    key = f"clickhouse_query_result:{team_id}:{fingerprint}"
+
+    cached = client.get(key)
+    if cached is not None:
+        try:
+            result = codec.decode(cached)
+        except Exception as err:
+            capture_exception(err)
+        else:
+            incr("clickhouse_query_cache_hit", tags=metric_tags)
+            return result
+
+    incr("clickhouse_query_cache_miss", tags=metric_tags)
+    result = execute(query, args, with_column_types=with_column_types)
+    encoded = codec.encode(result)
+    if len(encoded) <= settings.CLICKHOUSE_RESULT_CACHE_MAX_BYTES:
+        client.set(key, encoded, ex=settings.CLICKHOUSE_QUERY_CACHE_TTL)
+    return result
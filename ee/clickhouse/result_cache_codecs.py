@@ -0,0 +1,194 @@
+"""
+Codecs for storing ClickHouse query results in Redis (see `cache_sync_execute`).
+
+`ColumnarCodec` stores each column of a result with a type-specific binary encoding and compresses the whole payload,
+keeping datetime, date and UUID values intact. `JSONCodec` is the previous format, kept for comparison and rollback.
+"""
+import datetime
+import io
+import json
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from uuid import UUID
+
+from django.conf import settings
+
+
+class ResultCodec:
+    name: str
+
+    def encode(self, result: Any) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError()
+
+
+class JSONCodec(ResultCodec):
+    """Rows as JSON arrays. Loses any type JSON doesn't have, e.g. datetimes and UUIDs become strings."""
+
+    name = "json"
+
+    def encode(self, result: Any) -> bytes:
+        return json.dumps(result, default=str).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        return [tuple(row) for row in json.loads(data)]
+
+
+# Column type tags
+_INT = 1
+_FLOAT = 2
+_STR = 3
+_BOOL = 4
+_DATETIME = 5
+_DATE = 6
+_UUID = 8
+_PICKLE = 9
+
+# Result kinds
+_ROWS = 1
+_OTHER = 2
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _all(column: Sequence[Any], check: Callable[[Any], bool]) -> bool:
+    return all(check(value) for value in column)
+
+
+def _is_int64(value: Any) -> bool:
+    return type(value) is int and _INT64_MIN <= value <= _INT64_MAX
+
+
+def _isoformat_column(column: Sequence[Any]) -> bytes:
+    # ISO 8601 strings parse back with `fromisoformat`, which is a lot faster than any per-value arithmetic in Python
+    return "\n".join(value.isoformat() for value in column).encode("ascii")
+
+
+def _encode_column(column: Sequence[Any]) -> Tuple[int, bytes]:
+    if _all(column, lambda value: type(value) is bool):
+        return _BOOL, _to_bytes(array("b", column))
+    if _all(column, _is_int64):
+        return _INT, _to_bytes(array("q", column))
+    if _all(column, lambda value: type(value) is float):
+        return _FLOAT, _to_bytes(array("d", column))
+    if _all(column, lambda value: type(value) is str):
+        encoded = [value.encode("utf-8") for value in column]
+        lengths = _to_bytes(array("Q", [len(value) for value in encoded]))
+        return _STR, lengths + b"".join(encoded)
+    if _all(column, lambda value: type(value) is datetime.datetime):
+        return _DATETIME, _isoformat_column(column)
+    if _all(column, lambda value: type(value) is datetime.date):
+        return _DATE, _isoformat_column(column)
+    if _all(column, lambda value: type(value) is UUID):
+        return _UUID, b"".join(value.bytes for value in column)
+    # Nullable, array and mixed columns
+    return _PICKLE, pickle.dumps(list(column), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_column(tag: int, data: bytes, row_count: int) -> List[Any]:
+    if tag == _BOOL:
+        return [bool(value) for value in _from_bytes("b", data)]
+    if tag == _INT:
+        return _from_bytes("q", data).tolist()
+    if tag == _FLOAT:
+        return _from_bytes("d", data).tolist()
+    if tag == _STR:
+        lengths = _from_bytes("Q", data[: row_count * 8])
+        values, offset = [], row_count * 8
+        for length in lengths:
+            values.append(data[offset : offset + length].decode("utf-8"))
+            offset += length
+        return values
+    if tag == _DATETIME:
+        return list(map(datetime.datetime.fromisoformat, data.decode("ascii").split("\n")))
+    if tag == _DATE:
+        return list(map(datetime.date.fromisoformat, data.decode("ascii").split("\n")))
+    if tag == _UUID:
+        return [UUID(bytes=data[index : index + 16]) for index in range(0, len(data), 16)]
+    if tag == _PICKLE:
+        return pickle.loads(data)
+    raise ValueError(f"Unknown column type tag {tag}")
+
+
+def _is_rows(result: Any) -> bool:
+    if not isinstance(result, list) or not result or not isinstance(result[0], tuple):
+        return False
+    width = len(result[0])
+    return all(isinstance(row, tuple) and len(row) == width for row in result)
+
+
+class ColumnarCodec(ResultCodec):
+    """
+    Rows are split into columns, each encoded according to the Python type of its values, and the whole payload is
+    compressed with zlib. Results that aren't plain lists of rows are pickled as a whole.
+
+    Layout (before compression): kind byte, then for rows: row count, column count and each column as
+    (type tag, byte length, bytes).
+    """
+
+    name = "columnar"
+    MAGIC = b"PHC1"
+
+    def __init__(self, compression_level: int = 1):
+        self.compression_level = compression_level
+
+    def encode(self, result: Any) -> bytes:
+        buffer = io.BytesIO()
+        if _is_rows(result):
+            columns = list(zip(*result))
+            buffer.write(struct.pack("<BII", _ROWS, len(result), len(columns)))
+            for column in columns:
+                tag, data = _encode_column(column)
+                buffer.write(struct.pack("<BQ", tag, len(data)))
+                buffer.write(data)
+        else:
+            buffer.write(struct.pack("<B", _OTHER))
+            buffer.write(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return self.MAGIC + zlib.compress(buffer.getvalue(), self.compression_level)
+
+    def decode(self, data: bytes) -> Any:
+        if not data.startswith(self.MAGIC):
+            raise ValueError("Not a columnar-encoded result")
+        payload = memoryview(zlib.decompress(data[len(self.MAGIC) :]))
+        (kind,) = struct.unpack_from("<B", payload)
+        if kind == _OTHER:
+            return pickle.loads(payload[1:])
+
+        row_count, column_count = struct.unpack_from("<II", payload, 1)
+        offset = 9
+        columns = []
+        for _ in range(column_count):
+            tag, length = struct.unpack_from("<BQ", payload, offset)
+            offset += 9
+            columns.append(_decode_column(tag, bytes(payload[offset : offset + length]), row_count))
+            offset += length
+        return list(zip(*columns))
+
+
+RESULT_CODECS: Dict[str, ResultCodec] = {codec.name: codec for codec in (ColumnarCodec(), JSONCodec())}
+
+
+def get_result_codec(name: str = "") -> ResultCodec:
+    return RESULT_CODECS[name or settings.CLICKHOUSE_RESULT_CACHE_CODEC]
@@ -22,33 +22,36 @@ Order By (team_id, cohort_id, person_id)
 
 DROP_COHORTPEOPLE_TABLE_SQL = f"DROP TABLE cohortpeople ON CLUSTER {CLICKHOUSE_CLUSTER}"
 
-REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL = """
+# Write only the difference between the persons matching the cohort and its current members: persons that only match
+# (state 1) join the cohort, persons that are only members (state 2) leave it, and persons in both (state 3) are left
+# as they are. {person_scope} and {member_scope} restrict both sides to the persons worth evaluating again.
+RECALCULATE_COHORT_BY_ID_SQL = """
 INSERT INTO cohortpeople
-SELECT person_id, cohort_id, %(team_id)s as team_id,  -1 as _sign
-FROM cohortpeople
-JOIN (
-    SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s GROUP BY id
-) as person ON (person.id = cohortpeople.person_id)
-WHERE cohort_id = %(cohort_id)s
-AND
-    (
-        person.is_deleted = 1 OR NOT person_id IN ({cohort_filter})
+SELECT person_id, %(cohort_id)s AS cohort_id, %(team_id)s AS team_id, if(state = 1, 1, -1) AS sign
+FROM (
+    SELECT person_id, sum(source) AS state
+    FROM (
+        SELECT DISTINCT id AS person_id, 1 AS source
+        FROM person
+        WHERE team_id = %(team_id)s {person_scope}
+          AND id IN ({cohort_filter})
+        UNION ALL
+        SELECT person_id, 2 AS source
+        FROM cohortpeople
+        WHERE team_id = %(team_id)s AND cohort_id = %(cohort_id)s {member_scope}
+        GROUP BY person_id
+        HAVING sum(sign) > 0
     )
+    GROUP BY person_id
+)
+WHERE state != 3
 """
 
-INSERT_PEOPLE_MATCHING_COHORT_ID_SQL = """
-INSERT INTO cohortpeople
-    SELECT id, %(cohort_id)s as cohort_id, %(team_id)s as team_id, 1 as _sign
-    FROM (
-        SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s GROUP BY id
-    ) as person
-    LEFT JOIN (
-        SELECT person_id FROM cohortpeople WHERE cohort_id = %(cohort_id)s AND team_id = %(team_id)s
-    ) as cohortpeople ON (person.id = cohortpeople.person_id)
-    WHERE cohortpeople.person_id = '00000000-0000-0000-0000-000000000000'
-    AND person.is_deleted = 0
-    AND id IN ({cohort_filter})
-"""
+# Persons that have a version written since %(since)s, including ones deleted since then
+RECALCULATE_COHORT_PERSON_SCOPE = "AND _timestamp >= %(since)s"
+RECALCULATE_COHORT_MEMBER_SCOPE = (
+    "AND person_id IN (SELECT id FROM person WHERE team_id = %(team_id)s AND _timestamp >= %(since)s)"
+)
 
 GET_DISTINCT_ID_BY_ENTITY_SQL = """
 SELECT distinct_id FROM events WHERE team_id = %(team_id)s {date_query} AND {entity_query}
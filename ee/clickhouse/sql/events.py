@@ -128,7 +128,7 @@ FROM
     events
 where team_id = %(team_id)s
 {conditions}
-ORDER BY toDate(timestamp) DESC, timestamp DESC {limit}
+ORDER BY toDate(timestamp) DESC, timestamp DESC, uuid DESC {limit}
 """
 
 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL = """
@@ -146,7 +146,28 @@ WHERE
 team_id = %(team_id)s
 {conditions}
 {filters}
-ORDER BY toDate(timestamp) DESC, timestamp DESC {limit}
+ORDER BY toDate(timestamp) DESC, timestamp DESC, uuid DESC {limit}
+"""
+
+# Keyset paginated on (timestamp, uuid), so that each page is a cheap query however deep into the export it is
+EXPORT_EVENTS_SQL = """
+SELECT
+    uuid,
+    event,
+    properties,
+    timestamp,
+    team_id,
+    distinct_id,
+    elements_chain,
+    created_at
+FROM events
+WHERE
+team_id = %(team_id)s
+{conditions}
+{filters}
+{keyset}
+ORDER BY toDate(timestamp) DESC, timestamp DESC, uuid DESC
+LIMIT %(page_size)s
 """
 
 SELECT_ONE_EVENT_SQL = """
@@ -201,4 +222,6 @@ GET_CUSTOM_EVENTS = """
 SELECT DISTINCT event FROM events where team_id = %(team_id)s AND event NOT IN ['$autocapture', '$pageview', '$identify', '$pageleave', '$screen']
 """
 
-GET_EVENTS_VOLUME = "SELECT event, count(1) as count FROM events WHERE team_id = %(team_id)s AND timestamp > %(timestamp)s GROUP BY event ORDER BY count DESC"
+GET_EVENTS_VOLUME = """
+SELECT team_id, event, count(1) as count FROM events WHERE team_id IN %(team_ids)s AND timestamp > %(timestamp)s GROUP BY team_id, event
+"""
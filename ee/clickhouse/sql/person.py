@@ -1,7 +1,14 @@
 from ee.kafka_client.topics import KAFKA_PERSON, KAFKA_PERSON_UNIQUE_ID
 from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE
 
-from .clickhouse import KAFKA_COLUMNS, REPLACING_MERGE_TREE, STORAGE_POLICY, kafka_engine, table_engine
+from .clickhouse import (
+    AGGREGATING_MERGE_TREE,
+    KAFKA_COLUMNS,
+    REPLACING_MERGE_TREE,
+    STORAGE_POLICY,
+    kafka_engine,
+    table_engine,
+)
 
 DROP_PERSON_TABLE_SQL = f"DROP TABLE person ON CLUSTER {CLICKHOUSE_CLUSTER}"
 
@@ -58,23 +65,31 @@ FROM {database}.kafka_{table_name}
     table_name=PERSONS_TABLE, cluster=CLICKHOUSE_CLUSTER, database=CLICKHOUSE_DATABASE,
 )
 
+# The latest version of each person that isn't deleted. person is a ReplacingMergeTree on _timestamp, so merges keep
+# it collapsed to about one row per person, and the versions that haven't been merged yet are resolved in one scan
 GET_LATEST_PERSON_SQL = """
-SELECT * FROM person JOIN (
-    SELECT id, max(_timestamp) as _timestamp, max(is_deleted) as is_deleted
+SELECT * FROM (
+    SELECT
+        id,
+        argMax(created_at, person._timestamp) as created_at,
+        team_id,
+        argMax(properties, person._timestamp) as properties,
+        argMax(is_identified, person._timestamp) as is_identified,
+        max(is_deleted) as is_deleted
     FROM person
     WHERE team_id = %(team_id)s
-    GROUP BY id
-) as person_max ON person.id = person_max.id AND person._timestamp = person_max._timestamp
-WHERE team_id = %(team_id)s
-  AND person_max.is_deleted = 0
-  {query}
+    GROUP BY team_id, id
+    HAVING is_deleted = 0
+)
+WHERE 1 = 1 {query}
 """
 
+# Reads the deduplicated mapping rather than person_distinct_id, see PERSON_DISTINCT_ID_MAPPING_TABLE
 GET_TEAM_PERSON_DISTINCT_IDS = """
 SELECT person_id, distinct_id
-FROM person_distinct_id
+FROM person_distinct_id_mapping
 WHERE team_id = %(team_id)s
-GROUP BY person_id, distinct_id, team_id
+GROUP BY person_id, distinct_id
 HAVING max(is_deleted) = 0
 """
 
@@ -138,6 +153,80 @@ FROM {database}.kafka_{table_name}
     table_name=PERSONS_DISTINCT_ID_TABLE, cluster=CLICKHOUSE_CLUSTER, database=CLICKHOUSE_DATABASE,
 )
 
+#
+# Person distinct id mapping
+#
+
+# One row per (distinct id, person) pair and insert block, which merges into one row per pair, with whether the pair
+# was ever deleted. Maintained on insert into person_distinct_id, which keeps every version of every row, so that
+# queries mapping distinct ids to persons don't need to deduplicate all of person_distinct_id each time.
+PERSON_DISTINCT_ID_MAPPING_TABLE = "person_distinct_id_mapping"
+
+PERSON_DISTINCT_ID_MAPPING_TABLE_SQL = """
+CREATE TABLE {table_name} ON CLUSTER {cluster}
+(
+    team_id Int64,
+    distinct_id VARCHAR,
+    person_id UUID,
+    is_deleted SimpleAggregateFunction(max, Int8)
+) ENGINE = {engine}
+ORDER BY (team_id, distinct_id, person_id)
+{storage_policy}
+""".format(
+    table_name=PERSON_DISTINCT_ID_MAPPING_TABLE,
+    cluster=CLICKHOUSE_CLUSTER,
+    engine=table_engine(PERSON_DISTINCT_ID_MAPPING_TABLE, engine_type=AGGREGATING_MERGE_TREE),
+    storage_policy=STORAGE_POLICY,
+)
+
+PERSON_DISTINCT_ID_MAPPING_SELECT = """
+SELECT team_id, distinct_id, person_id, max(is_deleted) AS is_deleted
+FROM {database}.{source_table_name}
+{where}
+GROUP BY team_id, distinct_id, person_id
+"""
+
+PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL = (
+    """
+CREATE MATERIALIZED VIEW {table_name}_mv ON CLUSTER {cluster}
+TO {database}.{table_name}
+AS """
+    + PERSON_DISTINCT_ID_MAPPING_SELECT
+).format(
+    table_name=PERSON_DISTINCT_ID_MAPPING_TABLE,
+    source_table_name=PERSONS_DISTINCT_ID_TABLE,
+    cluster=CLICKHOUSE_CLUSTER,
+    database=CLICKHOUSE_DATABASE,
+    where="",
+)
+
+# Pairs are aggregated with max(), so inserting rows that are already in the mapping again changes nothing
+BACKFILL_PERSON_DISTINCT_ID_MAPPING_SQL = f"INSERT INTO {PERSON_DISTINCT_ID_MAPPING_TABLE} " + (
+    PERSON_DISTINCT_ID_MAPPING_SELECT.format(
+        source_table_name=PERSONS_DISTINCT_ID_TABLE, database=CLICKHOUSE_DATABASE, where="{where}"
+    )
+)
+
+# Count and checksum of the valid pairs of each team, as computed from person_distinct_id and from the mapping
+PERSON_DISTINCT_ID_MAPPING_CHECKSUM_SQL = """
+SELECT team_id, count(), sum(cityHash64(person_id, distinct_id))
+FROM (
+    SELECT team_id, person_id, distinct_id
+    FROM {table_name}
+    {where}
+    GROUP BY team_id, person_id, distinct_id
+    HAVING max(is_deleted) = 0
+)
+GROUP BY team_id
+"""
+
+DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_SQL = (
+    f"DROP TABLE {PERSON_DISTINCT_ID_MAPPING_TABLE} ON CLUSTER {CLICKHOUSE_CLUSTER}"
+)
+DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL = (
+    f"DROP TABLE {PERSON_DISTINCT_ID_MAPPING_TABLE}_mv ON CLUSTER {CLICKHOUSE_CLUSTER}"
+)
+
 #
 # Static Cohort
 #
@@ -1,7 +1,15 @@
 from ee.kafka_client.topics import KAFKA_SESSION_RECORDING_EVENTS
 from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE
 
-from .clickhouse import KAFKA_COLUMNS, REPLACING_MERGE_TREE, STORAGE_POLICY, kafka_engine, table_engine, ttl_period
+from .clickhouse import (
+    AGGREGATING_MERGE_TREE,
+    KAFKA_COLUMNS,
+    REPLACING_MERGE_TREE,
+    STORAGE_POLICY,
+    kafka_engine,
+    table_engine,
+    ttl_period,
+)
 
 SESSION_RECORDING_EVENTS_TABLE = "session_recording_events"
 
@@ -65,3 +73,58 @@ INSERT INTO session_recording_events SELECT %(uuid)s, %(timestamp)s, %(team_id)s
 """
 
 DROP_SESSION_RECORDING_EVENTS_TABLE_SQL = f"DROP TABLE {SESSION_RECORDING_EVENTS_TABLE} ON CLUSTER {CLICKHOUSE_CLUSTER}"
+
+# One row per recording and insert block, which merges into one row per recording. Maintained on insert into
+# session_recording_events, so listing recordings doesn't need to go through (and parse) every snapshot.
+SESSION_RECORDINGS_TABLE = "session_recordings"
+
+SESSION_RECORDINGS_TABLE_SQL = """
+CREATE TABLE {table_name} ON CLUSTER {cluster}
+(
+    team_id Int64,
+    session_id VARCHAR,
+    distinct_id VARCHAR,
+    start_time SimpleAggregateFunction(min, DateTime64(6, 'UTC')),
+    end_time SimpleAggregateFunction(max, DateTime64(6, 'UTC')),
+    has_full_snapshot SimpleAggregateFunction(max, UInt8)
+) ENGINE = {engine}
+ORDER BY (team_id, session_id, distinct_id)
+{ttl_period}
+""".format(
+    table_name=SESSION_RECORDINGS_TABLE,
+    cluster=CLICKHOUSE_CLUSTER,
+    engine=table_engine(SESSION_RECORDINGS_TABLE, engine_type=AGGREGATING_MERGE_TREE),
+    ttl_period=ttl_period("end_time"),
+)
+
+SESSION_RECORDINGS_SUMMARY_SELECT = """
+SELECT
+    team_id,
+    session_id,
+    distinct_id,
+    min(timestamp) AS start_time,
+    max(timestamp) AS end_time,
+    max(JSONExtractInt(snapshot_data, 'type') = 2 OR JSONExtractBool(snapshot_data, 'has_full_snapshot')) AS has_full_snapshot
+FROM {database}.{source_table_name}
+GROUP BY team_id, session_id, distinct_id
+"""
+
+SESSION_RECORDINGS_TABLE_MV_SQL = (
+    """
+CREATE MATERIALIZED VIEW {table_name}_mv ON CLUSTER {cluster}
+TO {database}.{table_name}
+AS """
+    + SESSION_RECORDINGS_SUMMARY_SELECT
+).format(
+    table_name=SESSION_RECORDINGS_TABLE,
+    source_table_name=SESSION_RECORDING_EVENTS_TABLE,
+    cluster=CLICKHOUSE_CLUSTER,
+    database=CLICKHOUSE_DATABASE,
+)
+
+BACKFILL_SESSION_RECORDINGS_SQL = f"INSERT INTO {SESSION_RECORDINGS_TABLE} " + SESSION_RECORDINGS_SUMMARY_SELECT.format(
+    source_table_name=SESSION_RECORDING_EVENTS_TABLE, database=CLICKHOUSE_DATABASE
+)
+
+DROP_SESSION_RECORDINGS_TABLE_SQL = f"DROP TABLE {SESSION_RECORDINGS_TABLE} ON CLUSTER {CLICKHOUSE_CLUSTER}"
+DROP_SESSION_RECORDINGS_TABLE_MV_SQL = f"DROP TABLE {SESSION_RECORDINGS_TABLE}_mv ON CLUSTER {CLICKHOUSE_CLUSTER}"
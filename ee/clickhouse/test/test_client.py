@@ -1,10 +1,15 @@
 import datetime
+import threading
+from uuid import UUID
 
 import fakeredis
+import pytz
 from django.test import TestCase
 from freezegun import freeze_time
 
-from ee.clickhouse.client import CACHE_TTL, _deserialize, _key_hash, cache_sync_execute
+from ee.clickhouse import client
+from ee.clickhouse.client import CACHE_TTL, _annotate_tagged_query, _key_hash, cache_sync_execute, tag_queries
+from ee.clickhouse.result_cache_codecs import ColumnarCodec, JSONCodec, get_result_codec
 
 
 class ClickhouseClientTestCase(TestCase):
@@ -17,7 +22,7 @@ class ClickhouseClientTestCase(TestCase):
         args = None
         res = cache_sync_execute(query, args=args, redis_client=self.redis_client)
         cache = self.redis_client.get(_key_hash(query, args=args))
-        cache_res = _deserialize(cache)
+        cache_res = get_result_codec().decode(cache)
         self.assertEqual(res, cache_res)
         ts_end = datetime.datetime.now()
         dur = (ts_end - ts_start).microseconds
@@ -43,3 +48,77 @@ class ClickhouseClientTestCase(TestCase):
         with freeze_time(start + datetime.timedelta(seconds=CACHE_TTL + 10)):
             exists = self.redis_client.exists(_key_hash(query, args=args))
             self.assertFalse(exists)
+
+    def test_caching_client_preserves_types(self):
+        query = "select toDateTime('2021-01-01 12:00:00'), toDate('2021-01-02'), toUUID(%(uuid)s), 1.5, 'a'"
+        args = {"uuid": "0179fcb6-f7fa-0000-c78a-c7b289c94008"}
+        res = cache_sync_execute(query, args=args, redis_client=self.redis_client)
+        res_cached = cache_sync_execute(query, args=args, redis_client=self.redis_client)
+
+        self.assertEqual(
+            res_cached,
+            [
+                (
+                    datetime.datetime(2021, 1, 1, 12, 0),
+                    datetime.date(2021, 1, 2),
+                    UUID("0179fcb6-f7fa-0000-c78a-c7b289c94008"),
+                    1.5,
+                    "a",
+                )
+            ],
+        )
+        self.assertEqual(res, res_cached)
+
+    def test_caching_client_skips_large_results(self):
+        with self.settings(CLICKHOUSE_RESULT_CACHE_MAX_BYTES=10):
+            cache_sync_execute("select number from numbers(1000)", redis_client=self.redis_client)
+        self.assertFalse(self.redis_client.exists(_key_hash("select number from numbers(1000)", args=None)))
+
+
+class ResultCacheCodecsTestCase(TestCase):
+    ROWS = [
+        (datetime.datetime(2021, 1, 1, 12, 0, 0, 123), datetime.date(2021, 1, 2), 15, 2.5, "$pageview", True),
+        (datetime.datetime(2021, 1, 2, 12, 0, 0), datetime.date(2021, 1, 3), -(2 ** 40), 0.0, "", False),
+    ]
+
+    def test_columnar_codec_roundtrip(self):
+        codec = ColumnarCodec()
+        rows = [
+            row + (UUID(int=index), [1, 2], None if index else "x", datetime.datetime(2021, 1, 1, tzinfo=pytz.utc))
+            for index, row in enumerate(self.ROWS)
+        ]
+        self.assertEqual(codec.decode(codec.encode(rows)), rows)
+        self.assertEqual(codec.decode(codec.encode([])), [])
+
+        with_column_types = ([(1, "a")], [("count", "UInt8"), ("name", "String")])
+        self.assertEqual(codec.decode(codec.encode(with_column_types)), with_column_types)
+
+    def test_json_codec_roundtrip(self):
+        codec = JSONCodec()
+        self.assertEqual(codec.decode(codec.encode([(1, "a", 2.5)])), [(1, "a", 2.5)])
+
+    def test_tag_queries_only_tags_the_current_thread(self):
+        request_information = {"kind": "request", "id": "api/dashboard"}
+        client._request_information = {"kind": "celery", "id": "other_task"}
+        try:
+            tagged = threading.Event()
+            done = threading.Event()
+            annotated = []
+
+            def worker():
+                with tag_queries({"request_information": request_information, "query_id_prefix": None}):
+                    tagged.set()
+                    done.wait(5)
+                    annotated.append(_annotate_tagged_query("SELECT 1", None)[0])
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            tagged.wait(5)
+            self.assertEqual(_annotate_tagged_query("SELECT 1", None)[0], "/* celery:other_task */ SELECT 1")
+            done.set()
+            thread.join()
+
+            self.assertEqual(annotated, ["/* request:api_dashboard */ SELECT 1"])
+            self.assertEqual(client._request_information, {"kind": "celery", "id": "other_task"})
+        finally:
+            client._request_information = None
@@ -0,0 +1,86 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.timezone import now
+
+from ee.clickhouse.query_cache import (
+    TEAM_INGESTION_WATERMARK_SQL,
+    cached_execute,
+    invalidate_team_watermark,
+    normalize_query,
+)
+from posthog.models import Cohort, Organization, Team
+from posthog.redis import get_client
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.watermark = "2021-01-01 00:00:00"
+        self.queries = []
+
+    def __call__(self, query, args, with_column_types=False):
+        if query == TEAM_INGESTION_WATERMARK_SQL:
+            return [(self.watermark, "2021-01-01 00:00:00", "2021-01-01 00:00:00", "2021-01-01 00:00:00")]
+        self.queries.append(query)
+        return [(len(self.queries), args.get("key"))]
+
+
+@override_settings(CLICKHOUSE_QUERY_CACHE_ENABLED=True)
+class TestQueryCache(TestCase):
+    def setUp(self):
+        get_client().flushdb()
+        self.execute = FakeExecutor()
+
+    def test_normalize_query(self):
+        self.assertEqual(
+            normalize_query("/* request:api */ SELECT 1\n  FROM events -- comment\nWHERE team_id = 2"),
+            "SELECT 1 FROM events WHERE team_id = 2",
+        )
+
+    def test_same_normalized_query_hits_cache(self):
+        first = cached_execute("SELECT 1 FROM events", {"team_id": 2, "key": "a"}, False, self.execute)
+        second = cached_execute("SELECT 1\n    FROM events", {"key": "a", "team_id": 2}, False, self.execute)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.execute.queries), 1)
+
+    def test_different_params_miss(self):
+        cached_execute("SELECT 1", {"team_id": 2, "key": "a"}, False, self.execute)
+        cached_execute("SELECT 1", {"team_id": 2, "key": "b"}, False, self.execute)
+        cached_execute("SELECT 1", {"team_id": 3, "key": "a"}, False, self.execute)
+
+        self.assertEqual(len(self.execute.queries), 3)
+
+    def test_new_data_invalidates_once_watermark_expires(self):
+        cached_execute("SELECT 1", {"team_id": 2}, False, self.execute)
+        self.execute.watermark = "2021-01-01 00:00:05"
+
+        # Watermark is still cached
+        cached_execute("SELECT 1", {"team_id": 2}, False, self.execute)
+        self.assertEqual(len(self.execute.queries), 1)
+
+        invalidate_team_watermark(2)
+        cached_execute("SELECT 1", {"team_id": 2}, False, self.execute)
+        self.assertEqual(len(self.execute.queries), 2)
+
+    def test_cohort_precalculation_invalidates(self):
+        team = Team.objects.create(organization=Organization.objects.create(name="Test"))
+        cohort = Cohort.objects.create(team=team, groups=[{"properties": {"$some_prop": "something"}}])
+        cached_execute("SELECT 1", {"team_id": team.pk}, False, self.execute)
+
+        Cohort.objects.filter(pk=cohort.pk).update(precalculated_at=now())
+        invalidate_team_watermark(team.pk)
+        cached_execute("SELECT 1", {"team_id": team.pk}, False, self.execute)
+        self.assertEqual(len(self.execute.queries), 2)
+
+    def test_queries_without_team_are_not_cached(self):
+        cached_execute("SELECT 1", {}, False, self.execute)
+        cached_execute("SELECT 1", {}, False, self.execute)
+
+        self.assertEqual(len(self.execute.queries), 2)
+
+    @override_settings(CLICKHOUSE_QUERY_CACHE_ENABLED=False)
+    def test_disabled(self):
+        cached_execute("SELECT 1", {"team_id": 2}, False, self.execute)
+        cached_execute("SELECT 1", {"team_id": 2}, False, self.execute)
+
+        self.assertEqual(len(self.execute.queries), 2)
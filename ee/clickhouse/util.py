@@ -7,16 +7,24 @@ from ee.clickhouse.client import sync_execute
 from ee.clickhouse.sql.cohort import CREATE_COHORTPEOPLE_TABLE_SQL, DROP_COHORTPEOPLE_TABLE_SQL
 from ee.clickhouse.sql.events import DROP_EVENTS_TABLE_SQL, EVENTS_TABLE_SQL
 from ee.clickhouse.sql.person import (
+    DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL,
+    DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_SQL,
     DROP_PERSON_DISTINCT_ID_TABLE_SQL,
     DROP_PERSON_STATIC_COHORT_TABLE_SQL,
     DROP_PERSON_TABLE_SQL,
+    PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL,
+    PERSON_DISTINCT_ID_MAPPING_TABLE_SQL,
     PERSON_STATIC_COHORT_TABLE_SQL,
     PERSONS_DISTINCT_ID_TABLE_SQL,
     PERSONS_TABLE_SQL,
 )
 from ee.clickhouse.sql.session_recording_events import (
     DROP_SESSION_RECORDING_EVENTS_TABLE_SQL,
+    DROP_SESSION_RECORDINGS_TABLE_MV_SQL,
+    DROP_SESSION_RECORDINGS_TABLE_SQL,
     SESSION_RECORDING_EVENTS_TABLE_SQL,
+    SESSION_RECORDINGS_TABLE_MV_SQL,
+    SESSION_RECORDINGS_TABLE_SQL,
 )
 
 
@@ -42,19 +50,27 @@ class ClickhouseTestMixin:
 
     def _destroy_person_tables(self):
         sync_execute(DROP_PERSON_TABLE_SQL)
+        sync_execute(DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL)
+        sync_execute(DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_SQL)
         sync_execute(DROP_PERSON_DISTINCT_ID_TABLE_SQL)
         sync_execute(DROP_PERSON_STATIC_COHORT_TABLE_SQL)
 
     def _create_person_tables(self):
         sync_execute(PERSONS_TABLE_SQL)
         sync_execute(PERSONS_DISTINCT_ID_TABLE_SQL)
+        sync_execute(PERSON_DISTINCT_ID_MAPPING_TABLE_SQL)
+        sync_execute(PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL)
         sync_execute(PERSON_STATIC_COHORT_TABLE_SQL)
 
     def _destroy_session_recording_tables(self):
+        sync_execute(DROP_SESSION_RECORDINGS_TABLE_MV_SQL)
+        sync_execute(DROP_SESSION_RECORDINGS_TABLE_SQL)
         sync_execute(DROP_SESSION_RECORDING_EVENTS_TABLE_SQL)
 
     def _create_session_recording_tables(self):
         sync_execute(SESSION_RECORDING_EVENTS_TABLE_SQL)
+        sync_execute(SESSION_RECORDINGS_TABLE_SQL)
+        sync_execute(SESSION_RECORDINGS_TABLE_MV_SQL)
 
     def _destroy_event_tables(self):
         sync_execute(DROP_EVENTS_TABLE_SQL)
@@ -1,19 +1,21 @@
 import json
-from datetime import timedelta
-from typing import Any, Dict, List, Optional, Union
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+from dateutil.parser import isoparse
+from django.http import StreamingHttpResponse
 from django.utils.timezone import now
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.event import ClickhouseEventSerializer, determine_event_conditions
-from ee.clickhouse.models.person import get_persons_by_distinct_ids
 from ee.clickhouse.models.property import get_property_values_for_key, parse_prop_clauses
 from ee.clickhouse.queries.clickhouse_session_recording import SessionRecording
+from ee.clickhouse.queries.events_export import CSV, EXPORT_FORMATS, export_events, iter_events
 from ee.clickhouse.queries.sessions.list import ClickhouseSessionsList
 from ee.clickhouse.sql.events import (
     GET_CUSTOM_EVENTS,
@@ -22,65 +24,110 @@ from ee.clickhouse.sql.events import (
     SELECT_ONE_EVENT_SQL,
 )
 from posthog.api.event import EventViewSet
-from posthog.models import Filter, Person, Team
+from posthog.helpers.person_summary import get_person_summaries
+from posthog.models import Filter, Team
 from posthog.models.action import Action
 from posthog.models.filters.sessions_filter import SessionEventsFilter, SessionsFilter
-from posthog.models.session_recording_event import SessionRecordingViewed
 from posthog.models.utils import UUIDT
 from posthog.utils import convert_property_value, flatten
 
+# Windows the events list is searched in, each going further back than the previous one, until enough events are found.
+# Events are partitioned by month, so windows of a month or more start at the beginning of a month
+EVENTS_LIST_WINDOWS = [
+    timedelta(days=1),
+    timedelta(days=7),
+    timedelta(days=30),
+    timedelta(days=90),
+    timedelta(days=365),
+]
+
+
+def _window_start(end: datetime, window: timedelta) -> datetime:
+    start = end - window
+    if window >= timedelta(days=30):
+        start = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start
+
 
 class ClickhouseEventsViewSet(EventViewSet):
 
     serializer_class = ClickhouseEventSerializer  # type: ignore
 
-    def _get_people(self, query_result: List[Dict], team: Team) -> Dict[str, Any]:
-        distinct_ids = [event[5] for event in query_result]
-        persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
-        return distinct_to_person
-
-    def _query_events_list(
-        self, filter: Filter, team: Team, request: Request, long_date_from: bool = False, limit: int = 100
-    ) -> List:
-        limit += 1
-        limit_sql = "LIMIT %(limit)s"
-        conditions, condition_params = determine_event_conditions(
-            team,
-            {
-                "after": (now() - timedelta(days=1)).isoformat(),
-                "before": (now() + timedelta(seconds=5)).isoformat(),
-                **request.GET.dict(),
-            },
-            long_date_from,
-        )
+    def _get_event_filters(
+        self, filter: Filter, team: Team, request: Request, conditions: Dict[str, Any]
+    ) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """Conditions and property/action filters of an events query, or None if no events can match."""
+        if conditions.get("before_uuid") and not UUIDT.is_valid_uuid(conditions["before_uuid"]):
+            raise ValidationError("before_uuid must be a UUID")
+        condition_sql, condition_params = determine_event_conditions(team, conditions, long_date_from=False)
         prop_filters, prop_filter_params = parse_prop_clauses(filter.properties, team.pk)
 
         if request.GET.get("action_id"):
             try:
                 action = Action.objects.get(pk=request.GET["action_id"], team_id=team.pk)
             except Action.DoesNotExist:
-                return []
+                return None
             if action.steps.count() == 0:
-                return []
+                return None
             action_query, params = format_action_filter(action)
             prop_filters += " AND {}".format(action_query)
             prop_filter_params = {**prop_filter_params, **params}
 
+        return condition_sql, prop_filters, {**condition_params, **prop_filter_params}
+
+    def _query_events_list(self, filter: Filter, team: Team, request: Request, limit: int = 100) -> List:
+        """
+        Newest events matching the request. Unless the request asks for a time range, windows going further and
+        further back are searched until `limit` events are found, rather than scanning every partition of `events`.
+        Each window only covers the time before the previous one, so no event is read twice.
+        """
+        limit += 1
+        end = isoparse(request.GET["before"]) if request.GET.get("before") else now() + timedelta(seconds=5)
+        event_filters = self._get_event_filters(
+            filter, team, request, {"before": end.isoformat(), **request.GET.dict()}
+        )
+        if event_filters is None:
+            return []
+        conditions, prop_filters, params = event_filters
+
+        if request.GET.get("after"):
+            return self._query_events(team, conditions, prop_filters, params, limit)
+
+        result: List = []
+        window_end: Optional[datetime] = None
+        for window in [*EVENTS_LIST_WINDOWS, None]:
+            window_start = _window_start(end, window) if window is not None else None
+            window_conditions, window_params = "", {}
+            if window_start is not None:
+                window_conditions += " AND timestamp >= %(window_start)s"
+                window_params["window_start"] = window_start.strftime("%Y-%m-%d %H:%M:%S.%f")
+            if window_end is not None:
+                window_conditions += " AND timestamp < %(window_end)s"
+                window_params["window_end"] = window_end.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+            result.extend(
+                self._query_events(
+                    team, conditions + window_conditions, prop_filters, {**params, **window_params}, limit - len(result)
+                )
+            )
+            if len(result) >= limit or window_start is None:
+                return result
+            window_end = window_start
+        return result
+
+    def _query_events(self, team: Team, conditions: str, prop_filters: str, params: Dict[str, Any], limit: int) -> List:
+        limit_sql = "LIMIT %(limit)s"
         if prop_filters != "":
             return sync_execute(
                 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL.format(
                     conditions=conditions, limit=limit_sql, filters=prop_filters
                 ),
-                {"team_id": team.pk, "limit": limit, **condition_params, **prop_filter_params},
+                {"team_id": team.pk, "limit": limit, **params},
             )
         else:
             return sync_execute(
                 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_SQL.format(conditions=conditions, limit=limit_sql),
-                {"team_id": team.pk, "limit": limit, **condition_params},
+                {"team_id": team.pk, "limit": limit, **params},
             )
 
     def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -97,29 +144,47 @@ class ClickhouseEventsViewSet(EventViewSet):
 
         query_result = self._query_events_list(filter, team, request, limit=limit)
 
-        # Retry the query without the 1 day optimization
-        if len(query_result) < limit and not request.GET.get("after"):
-            query_result = self._query_events_list(filter, team, request, long_date_from=True, limit=limit)
-
         result = ClickhouseEventSerializer(
-            query_result[0:limit], many=True, context={"people": self._get_people(query_result, team),},
+            query_result[0:limit],
+            many=True,
+            context={"people": get_person_summaries(team.pk, [event[5] for event in query_result])},
         ).data
 
         next_url: Optional[str] = None
         if not is_csv_request and len(query_result) > 100:
-            path = request.get_full_path()
-            reverse = request.GET.get("orderBy", "-timestamp") != "-timestamp"
-            next_url = request.build_absolute_uri(
-                "{}{}{}={}".format(
-                    path,
-                    "&" if "?" in path else "?",
-                    "after" if reverse else "before",
-                    query_result[99][3].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                )
-            )
+            last_event = query_result[99]
+            next_params = request.GET.copy()
+            if request.GET.get("orderBy", "-timestamp") != "-timestamp":
+                next_params["after"] = last_event[3].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            else:
+                next_params["before"] = last_event[3].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                next_params["before_uuid"] = str(last_event[0])
+            next_url = request.build_absolute_uri("{}?{}".format(request.path, next_params.urlencode()))
 
         return Response({"next": next_url, "results": result})
 
+    # ******************************************
+    # /event/export
+    # Streams all events matching the same filters as the list, without a limit
+    # params:
+    # - export_format: (string) csv or jsonl, defaults to csv
+    # ******************************************
+    @action(methods=["GET"], detail=False)
+    def export(self, request: Request, *args: Any, **kwargs: Any) -> StreamingHttpResponse:
+        export_format = request.GET.get("export_format", CSV)
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(f"export_format must be one of {', '.join(EXPORT_FORMATS)}")
+
+        team = self.team
+        event_filters = self._get_event_filters(Filter(request=request), team, request, request.GET.dict())
+        events = iter_events(team.pk, *event_filters) if event_filters is not None else iter([])
+
+        response = StreamingHttpResponse(
+            export_events(team.pk, events, export_format), content_type=EXPORT_FORMATS[export_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="events.{export_format}"'
+        return response
+
     def retrieve(self, request: Request, pk: Optional[Union[int, str]] = None, *args: Any, **kwargs: Any) -> Response:
         if not isinstance(pk, str) or not UUIDT.is_valid_uuid(pk):
             return Response({"detail": "Invalid UUID", "code": "invalid", "type": "validation_error",}, status=400)
@@ -167,6 +232,8 @@ class ClickhouseEventsViewSet(EventViewSet):
     # params:
     # - session_recording_id: (string) id of the session recording
     # - save_view: (boolean) save view of the recording
+    # - limit: (int) load the snapshots in windows of about this many, following `next` for the rest
+    # - after: (string) cursor of the window to load, as given by `next`
     # ******************************************
     @action(methods=["GET"], detail=False)
     def session_recording(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -180,13 +247,4 @@ class ClickhouseEventsViewSet(EventViewSet):
                 status=400,
             )
 
-        session_recording = SessionRecording().run(
-            team=self.team, filter=Filter(request=request), session_recording_id=request.GET["session_recording_id"]
-        )
-
-        if request.GET.get("save_view"):
-            SessionRecordingViewed.objects.get_or_create(
-                team=self.team, user=request.user, session_id=request.GET["session_recording_id"]
-            )
-
-        return Response({"result": session_recording})
+        return self._session_recording_response(request, SessionRecording())
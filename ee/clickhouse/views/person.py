@@ -34,7 +34,7 @@ class ClickhousePersonViewSet(PersonViewSet):
 
         return Response(data={"results": [{"people": results, "count": len(results)}], "next": next_url})
 
-    @cached_function()
+    @cached_function(stale_while_revalidate=False)
     def calculate_funnel_persons(self, request: Request) -> Dict[str, Tuple[list, Optional[str]]]:
         if request.user.is_anonymous or not request.user.team:
             return {"result": ([], None)}
@@ -1,10 +1,17 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
 from unittest.mock import patch
 from uuid import uuid4
 
+import pytz
 from django.utils import timezone
+from freezegun import freeze_time
 
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.util import ClickhouseTestMixin
+from ee.clickhouse.views.events import EVENTS_LIST_WINDOWS, _window_start
 from posthog.api.test.test_event import factory_test_event_api
 from posthog.models import Action, ActionStep, Event, Person
 
@@ -34,13 +41,87 @@ class ClickhouseTestEventApi(
 
     @patch("ee.clickhouse.views.events.sync_execute")
     def test_optimize_query(self, patch_sync_execute):
-        #  For ClickHouse we normally only query the last day,
-        # but if a user doesn't have many events we still want to return events that are older
+        # For ClickHouse we first query the last day, then windows further and further back
+        # until enough events are found, so teams without many events still see older events
         patch_sync_execute.return_value = [("event", "d", "{}", timezone.now(), "d", "d", "d")]
         response = self.client.get("/api/event/").json()
-        self.assertEqual(len(response["results"]), 1)
-        self.assertEqual(patch_sync_execute.call_count, 2)
+        self.assertEqual(len(response["results"]), len(EVENTS_LIST_WINDOWS) + 1)
+        self.assertEqual(patch_sync_execute.call_count, len(EVENTS_LIST_WINDOWS) + 1)
+        # The last window has no lower bound
+        self.assertNotIn("window_start", patch_sync_execute.call_args[0][1])
 
+        patch_sync_execute.reset_mock()
         patch_sync_execute.return_value = [("event", "d", "{}", timezone.now(), "d", "d", "d") for _ in range(0, 100)]
         response = self.client.get("/api/event/").json()
-        self.assertEqual(patch_sync_execute.call_count, 3)
+        self.assertEqual(patch_sync_execute.call_count, 2)
+        # The second window only asks for the events still missing, before where the first window started
+        window_params = patch_sync_execute.call_args[0][1]
+        self.assertEqual(window_params["limit"], 1)
+        self.assertEqual(window_params["window_end"], patch_sync_execute.call_args_list[0][0][1]["window_start"])
+
+        patch_sync_execute.reset_mock()
+        response = self.client.get("/api/event/?after=2020-01-01T00:00:00Z").json()
+        self.assertEqual(patch_sync_execute.call_count, 1)
+
+    def test_window_start(self):
+        end = datetime(2021, 3, 15, 12, 30, tzinfo=pytz.UTC)
+        self.assertEqual(_window_start(end, timedelta(days=1)), datetime(2021, 3, 14, 12, 30, tzinfo=pytz.UTC))
+        # Windows of a month or more cover whole monthly partitions
+        self.assertEqual(_window_start(end, timedelta(days=30)), datetime(2021, 2, 1, tzinfo=pytz.UTC))
+
+    def test_pagination_keeps_events_with_the_same_timestamp(self):
+        with freeze_time("2012-01-15T04:01:34.000Z"):
+            for _ in range(150):
+                _create_event(team=self.team, event="some event", distinct_id="1")
+
+        response = self.client.get("/api/event/?distinct_id=1").json()
+        self.assertEqual(len(response["results"]), 100)
+        self.assertIn("before_uuid=", response["next"])
+
+        page2 = self.client.get(response["next"]).json()
+        self.assertEqual(len(page2["results"]), 50)
+        self.assertEqual(len({event["id"] for event in response["results"] + page2["results"]}), 150)
+
+    @patch("ee.clickhouse.queries.events_export.EXPORT_BLOCK_SIZE", 2)
+    @patch("ee.clickhouse.queries.events_export.EXPORT_PAGE_SIZE", 3)
+    def test_export_jsonl(self):
+        Person.objects.create(team=self.team, distinct_ids=["1"], properties={"email": "tim@posthog.com"})
+        with freeze_time("2012-01-15T04:01:34.000Z"):
+            for index in range(7):
+                _create_event(team=self.team, event=f"event {index}", distinct_id="1", properties={"index": index})
+            # Events with the same timestamp must not get lost between pages
+            for index in range(7, 10):
+                _create_event(
+                    team=self.team,
+                    event=f"event {index}",
+                    distinct_id="2",
+                    timestamp=timezone.now() + timedelta(seconds=1),
+                )
+
+        response = self.client.get("/api/event/export?export_format=jsonl")
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(sorted(line["event"] for line in lines), [f"event {index}" for index in range(10)])
+        self.assertEqual(len({line["id"] for line in lines}), 10)
+        self.assertEqual(lines[-1]["person"]["properties"], {"email": "tim@posthog.com"})
+
+    def test_export_csv_with_filters(self):
+        with freeze_time("2012-01-15T04:01:34.000Z"):
+            _create_event(team=self.team, event="$pageview", distinct_id="1", properties={"$browser": "Chrome"})
+            _create_event(team=self.team, event="$pageview", distinct_id="1", properties={"$browser": "Safari"})
+            _create_event(team=self.team, event="$pageleave", distinct_id="1", properties={"$browser": "Chrome"})
+
+        response = self.client.get(
+            "/api/event/export",
+            {"event": "$pageview", "properties": json.dumps([{"key": "$browser", "value": "Chrome"}])},
+        )
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8"))))
+
+        self.assertEqual(rows[0], ["id", "event", "timestamp", "distinct_id", "person", "properties", "elements_chain"])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(json.loads(rows[1][5]), {"$browser": "Chrome"})
+
+    def test_export_invalid_format(self):
+        response = self.client.get("/api/event/export?export_format=xml")
+        self.assertEqual(response.status_code, 400)
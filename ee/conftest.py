@@ -49,16 +49,24 @@ def django_db_setup(django_db_setup, django_db_keepdb):
 def db(db):
     from ee.clickhouse.sql.events import DROP_EVENTS_TABLE_SQL, EVENTS_TABLE_SQL
     from ee.clickhouse.sql.person import (
+        DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL,
+        DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_SQL,
         DROP_PERSON_DISTINCT_ID_TABLE_SQL,
         DROP_PERSON_STATIC_COHORT_TABLE_SQL,
         DROP_PERSON_TABLE_SQL,
+        PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL,
+        PERSON_DISTINCT_ID_MAPPING_TABLE_SQL,
         PERSON_STATIC_COHORT_TABLE_SQL,
         PERSONS_DISTINCT_ID_TABLE_SQL,
         PERSONS_TABLE_SQL,
     )
     from ee.clickhouse.sql.session_recording_events import (
         DROP_SESSION_RECORDING_EVENTS_TABLE_SQL,
+        DROP_SESSION_RECORDINGS_TABLE_MV_SQL,
+        DROP_SESSION_RECORDINGS_TABLE_SQL,
         SESSION_RECORDING_EVENTS_TABLE_SQL,
+        SESSION_RECORDINGS_TABLE_MV_SQL,
+        SESSION_RECORDINGS_TABLE_SQL,
     )
 
     yield
@@ -66,15 +74,23 @@ def db(db):
     try:
         sync_execute(DROP_EVENTS_TABLE_SQL)
         sync_execute(DROP_PERSON_TABLE_SQL)
+        sync_execute(DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL)
+        sync_execute(DROP_PERSON_DISTINCT_ID_MAPPING_TABLE_SQL)
         sync_execute(DROP_PERSON_DISTINCT_ID_TABLE_SQL)
         sync_execute(DROP_PERSON_STATIC_COHORT_TABLE_SQL)
+        sync_execute(DROP_SESSION_RECORDINGS_TABLE_MV_SQL)
+        sync_execute(DROP_SESSION_RECORDINGS_TABLE_SQL)
         sync_execute(DROP_SESSION_RECORDING_EVENTS_TABLE_SQL)
         sync_execute(DROP_PLUGIN_LOG_ENTRIES_TABLE_SQL)
 
         sync_execute(EVENTS_TABLE_SQL)
         sync_execute(SESSION_RECORDING_EVENTS_TABLE_SQL)
+        sync_execute(SESSION_RECORDINGS_TABLE_SQL)
+        sync_execute(SESSION_RECORDINGS_TABLE_MV_SQL)
         sync_execute(PERSONS_TABLE_SQL)
         sync_execute(PERSONS_DISTINCT_ID_TABLE_SQL)
+        sync_execute(PERSON_DISTINCT_ID_MAPPING_TABLE_SQL)
+        sync_execute(PERSON_DISTINCT_ID_MAPPING_TABLE_MV_SQL)
         sync_execute(PERSON_STATIC_COHORT_TABLE_SQL)
         sync_execute(PLUGIN_LOG_ENTRIES_TABLE_SQL)
     except:
@@ -1,16 +1,25 @@
 import io
 import json
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import kafka_helper
 from google.protobuf.internal.encoder import _VarintBytes  # type: ignore
 from google.protobuf.json_format import MessageToJson
 from kafka import KafkaProducer as KP
+from statshog.defaults.django import statsd
 
 from ee.clickhouse.client import async_execute, sync_execute
 from ee.kafka_client import helper
 from ee.settings import KAFKA_ENABLED
-from posthog.settings import IS_HEROKU, KAFKA_BASE64_KEYS, KAFKA_HOSTS, TEST
+from posthog.settings import (
+    IS_HEROKU,
+    KAFKA_BASE64_KEYS,
+    KAFKA_HOSTS,
+    KAFKA_PRODUCER_BATCH_SIZE,
+    KAFKA_PRODUCER_COMPRESSION_TYPE,
+    KAFKA_PRODUCER_LINGER_MS,
+    TEST,
+)
 from posthog.utils import SingletonDecorator
 
 
@@ -27,14 +36,27 @@ class TestKafkaProducer:
 
 class _KafkaProducer:
     def __init__(self):
+        batching_config = {
+            "linger_ms": KAFKA_PRODUCER_LINGER_MS,
+            "batch_size": KAFKA_PRODUCER_BATCH_SIZE,
+            "compression_type": KAFKA_PRODUCER_COMPRESSION_TYPE,
+        }
         if TEST:
             self.producer = TestKafkaProducer()
         elif IS_HEROKU:
-            self.producer = kafka_helper.get_kafka_producer(value_serializer=lambda d: d)
+            # Same as `kafka_helper.get_kafka_producer`, which doesn't take other producer settings
+            self.producer = KP(
+                bootstrap_servers=kafka_helper.get_kafka_brokers(),
+                security_protocol="SSL",
+                ssl_context=kafka_helper.get_kafka_ssl_context(),
+                value_serializer=lambda d: d,
+                acks="all",
+                **batching_config,
+            )
         elif KAFKA_BASE64_KEYS:
-            self.producer = helper.get_kafka_producer(value_serializer=lambda d: d)
+            self.producer = helper.get_kafka_producer(value_serializer=lambda d: d, **batching_config)
         else:
-            self.producer = KP(bootstrap_servers=KAFKA_HOSTS)
+            self.producer = KP(bootstrap_servers=KAFKA_HOSTS, **batching_config)
 
     @staticmethod
     def json_serializer(d):
@@ -47,6 +69,28 @@ class _KafkaProducer:
         b = value_serializer(data)
         self.producer.send(topic, b)
 
+    def produce_batch(self, topic: str, data: List[Any], value_serializer: Optional[Callable[[Any], Any]] = None):
+        """
+        Serialize and send a list of messages in one go, then flush once for the whole batch.
+        Meant for request handlers (e.g. `/batch`) that would otherwise produce message by message.
+        """
+        if not data:
+            return
+        if not value_serializer:
+            value_serializer = self.json_serializer
+        timer = statsd.timer("posthog_cloud_kafka_produce_batch").start()
+        payloads = [value_serializer(d) for d in data]
+        futures = [self.producer.send(topic, b) for b in payloads]
+        self.producer.flush()
+        timer.stop()
+
+        failed = sum(1 for future in futures if future is not None and future.failed())
+        tags = {"topic": topic}
+        statsd.gauge("posthog_cloud_kafka_produce_batch_size", len(payloads), tags=tags)
+        if failed:
+            statsd.incr("posthog_cloud_kafka_produce_batch_failure", failed, tags=tags)
+        statsd.incr("posthog_cloud_kafka_produce_batch_success", len(payloads) - failed, tags=tags)
+
     def close(self):
         self.producer.flush()
 
@@ -0,0 +1,121 @@
+import random
+import re
+import timeit
+from typing import List
+
+from django.core.management.base import BaseCommand
+
+from ee.clickhouse.models.element import (
+    chain_to_element_dicts,
+    elements_to_string,
+    parse_attributes_regex,
+    parse_elements_chain,
+    split_chain_regex,
+)
+from posthog.api.element import ElementSerializer
+from posthog.models.element import Element
+
+# How elements chains were parsed before `parse_elements_chain`, as the baseline
+_split_class_attributes = re.compile(r"(.*?)($|:([a-zA-Z\-\_0-9]*=.*))")
+
+
+def _chain_to_elements_before(chain: str) -> List[Element]:
+    elements = []
+    for idx, el_string in enumerate(re.findall(split_chain_regex, chain)):
+        el_string_split = re.findall(_split_class_attributes, el_string)[0]
+        attributes = re.finditer(parse_attributes_regex, el_string_split[2]) if len(el_string_split) > 2 else []
+
+        element = Element(order=idx)
+
+        if el_string_split[0]:
+            tag_and_class = el_string_split[0].split(".", 1)
+            element.tag_name = tag_and_class[0]
+            if len(tag_and_class) > 1:
+                element.attr_class = [cl for cl in tag_and_class[1].split(".") if cl != ""]
+
+        for ii in attributes:
+            item = ii.groupdict()
+            if item["key"] == "href":
+                element.href = item["value"]
+            elif item["key"] == "nth-child":
+                element.nth_child = int(item["value"])
+            elif item["key"] == "nth-of-type":
+                element.nth_of_type = int(item["value"])
+            elif item["key"] == "text":
+                element.text = item["value"]
+            elif item["key"] == "attr_id":
+                element.attr_id = item["value"]
+            elif item["key"]:
+                element.attributes[item["key"]] = item["value"]
+
+        elements.append(element)
+    return elements
+
+
+def _elements_chain(depth: int) -> str:
+    # A clicked button nested in `depth` divs, as sent by autocapture
+    return elements_to_string(
+        [
+            Element(
+                tag_name="button",
+                attr_class=["btn", "btn-primary", f"variant-{random.randint(0, 50)}"],
+                text=f"Sign up {random.randint(0, 1000)}",
+                attributes={"data-attr": "signup", "type": "submit"},
+                nth_child=1,
+                nth_of_type=1,
+            ),
+            *(
+                Element(
+                    tag_name="div",
+                    attr_class=[f"container-{level}", "flex"],
+                    attr_id=f"section-{level}" if level % 3 == 0 else None,
+                    nth_child=random.randint(0, 5),
+                    nth_of_type=random.randint(0, 5),
+                )
+                for level in range(depth)
+            ),
+        ]
+    )
+
+
+def _event_chains(events: int, distinct_chains: int) -> List[str]:
+    chains = [_elements_chain(depth=random.randint(3, 15)) for _ in range(distinct_chains)]
+    return [random.choice(chains) for _ in range(events)]
+
+
+# ex: python manage.py benchmark_elements_chain --events 10000 --distinct-chains 200
+class Command(BaseCommand):
+    help = "Compare ways of turning elements chains of an event list page into serialized elements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", default=10_000, type=int, help="Events (chains) per run")
+        parser.add_argument("--distinct-chains", default=200, type=int, help="How many different chains there are")
+        parser.add_argument("--iterations", default=3, type=int, help="Runs per method")
+
+    def handle(self, *args, **options):
+        chains = _event_chains(options["events"], options["distinct_chains"])
+        iterations = options["iterations"]
+
+        def serialize_models():
+            for chain in chains:
+                ElementSerializer(_chain_to_elements_before(chain), many=True).data
+
+        def parse_uncached():
+            for chain in chains:
+                [element.to_dict() for element in parse_elements_chain.__wrapped__(chain)]
+
+        def parse_cached():
+            for chain in chains:
+                chain_to_element_dicts(chain)
+
+        methods = {
+            "Element instances + ElementSerializer (before)": serialize_models,
+            "parsed elements, uncached": parse_uncached,
+            "parsed elements, cached": parse_cached,
+        }
+        print(f"{len(chains)} events, {options['distinct_chains']} distinct chains:")
+        for name, method in methods.items():
+            parse_elements_chain.cache_clear()
+            method()  # Warm up, and fill the cache for the cached run
+            elapsed = timeit.timeit(method, number=iterations) / iterations
+            print(f"  {name:>46}: {elapsed * 1000:10.2f} ms")
@@ -0,0 +1,75 @@
+import datetime
+import json
+import random
+import timeit
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+
+from ee.clickhouse.result_cache_codecs import RESULT_CODECS
+
+
+def _trend_breakdown_result(series: int, days: int) -> List[Tuple]:
+    # (counts per day, days, breakdown value) as returned by breakdown trend queries
+    start = datetime.datetime(2021, 1, 1)
+    dates = [start + datetime.timedelta(days=day) for day in range(days)]
+    return [
+        ([float(random.randint(0, 10_000)) for _ in range(days)], dates, f"https://posthog.com/page/{index}")
+        for index in range(series)
+    ]
+
+
+def _funnel_persons_result(persons: int, steps: int) -> List[Tuple]:
+    # (person id, furthest step, time of each step) as returned by funnel persons queries
+    start = datetime.datetime(2021, 1, 1)
+    return [
+        (uuid4(), random.randint(1, steps))
+        + tuple(start + datetime.timedelta(seconds=random.randint(0, 86400 * 30)) for _ in range(steps))
+        for _ in range(persons)
+    ]
+
+
+def _events_result(events: int) -> List[Tuple]:
+    # Raw event rows as returned by the events list query
+    start = datetime.datetime(2021, 1, 1)
+    return [
+        (
+            uuid4(),
+            "$pageview",
+            json.dumps({"$current_url": f"https://posthog.com/{index}", "$browser": "Chrome"}),
+            start + datetime.timedelta(seconds=index),
+            2,
+            f"distinct_id_{index % 500}",
+            "",
+        )
+        for index in range(events)
+    ]
+
+
+SHAPES: Dict[str, Callable[[], Any]] = {
+    "trend (50 breakdowns x 90 days)": lambda: _trend_breakdown_result(50, 90),
+    "funnel persons (10k x 5 steps)": lambda: _funnel_persons_result(10_000, 5),
+    "events (10k rows)": lambda: _events_result(10_000),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare the codecs used by cache_sync_execute on realistic query result shapes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", default=20, type=int, help="Encode/decode runs per codec and shape")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        for shape_name, make_result in SHAPES.items():
+            result = make_result()
+            print(f"{shape_name}:")
+            for codec in RESULT_CODECS.values():
+                encoded = codec.encode(result)
+                encode_time = timeit.timeit(lambda: codec.encode(result), number=iterations) / iterations
+                decode_time = timeit.timeit(lambda: codec.decode(encoded), number=iterations) / iterations
+                print(
+                    f"  {codec.name:>10}: {len(encoded) / 1024:10.1f} KiB, "
+                    f"encode {encode_time * 1000:8.2f} ms, decode {decode_time * 1000:8.2f} ms"
+                )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ee.clickhouse.models.person import (
+    get_inconsistent_person_distinct_id_mapping_teams,
+    repair_person_distinct_id_mapping,
+)
+
+
+# ex: python manage.py check_person_distinct_id_mapping --team-id 2 --repair
+class Command(BaseCommand):
+    help = "Check that the person distinct id mapping table agrees with person_distinct_id, optionally repairing it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team-id", type=int, action="append", help="Team to check, defaults to all teams")
+        parser.add_argument("--repair", action="store_true", help="Backfill the mapping of inconsistent teams again")
+
+    def handle(self, *args, **options):
+        inconsistent_teams = get_inconsistent_person_distinct_id_mapping_teams(options["team_id"])
+        if not inconsistent_teams:
+            print("The person distinct id mapping is consistent")
+            return
+
+        print(f"The person distinct id mapping is inconsistent for teams {', '.join(map(str, inconsistent_teams))}")
+        if options["repair"]:
+            repair_person_distinct_id_mapping(inconsistent_teams)
+            still_inconsistent = get_inconsistent_person_distinct_id_mapping_teams(inconsistent_teams)
+            print(f"Repaired, teams still inconsistent: {', '.join(map(str, still_inconsistent)) or 'none'}")
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ee.clickhouse.materialized_columns import (
+    backfill_materialized_columns,
+    get_materialization_candidates,
+    materialize,
+    materialize_properties_from_usage,
+)
+
+
+# ex: python manage.py materialize_columns --property '$current_url' --backfill-period 30
+class Command(BaseCommand):
+    help = "Materialize event properties as columns, either the given one or the most queried ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--property", help="Property to materialize, instead of picking them from usage")
+        parser.add_argument(
+            "--backfill-period",
+            type=int,
+            default=settings.MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS,
+            help="How many days of existing events to backfill",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only print the properties that would be picked")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            for property in get_materialization_candidates(settings.MATERIALIZE_COLUMNS_PER_RUN):
+                print(property)
+            return
+
+        if options["property"]:
+            column = materialize(options["property"])
+            backfill_materialized_columns([options["property"]], options["backfill_period"])
+            print(f"Materialized {options['property']} as {column}")
+        else:
+            for property in materialize_properties_from_usage(options["backfill_period"]):
+                print(f"Materialized {property}")
@@ -5,7 +5,8 @@ import os
 from typing import Dict, List
 
 from posthog.constants import RDBMS
-from posthog.settings import PRIMARY_DB, TEST
+from posthog.settings import PRIMARY_DB, TEST, get_from_env
+from posthog.utils import str_to_bool
 
 # Zapier REST hooks
 HOOK_EVENTS: Dict[str, str] = {
@@ -31,4 +32,12 @@ CLICKHOUSE_DENORMALIZED_PROPERTIES: list = (
     if os.getenv("CLICKHOUSE_DENORMALIZED_PROPERTIES")
     else []
 )
+# Automatically materialize the most queried event properties as columns, see ee/clickhouse/materialized_columns.py
+MATERIALIZE_COLUMNS_ENABLED = get_from_env("MATERIALIZE_COLUMNS_ENABLED", not TEST, type_cast=str_to_bool)
+MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_DAYS = get_from_env("MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_DAYS", 7, type_cast=int)
+# Properties need at least this many seconds of query time within the analysis period to be materialized
+MATERIALIZE_COLUMNS_MIN_QUERY_TIME = get_from_env("MATERIALIZE_COLUMNS_MIN_QUERY_TIME", 60 * 60, type_cast=int)
+MATERIALIZE_COLUMNS_MAX = get_from_env("MATERIALIZE_COLUMNS_MAX", 50, type_cast=int)
+MATERIALIZE_COLUMNS_PER_RUN = get_from_env("MATERIALIZE_COLUMNS_PER_RUN", 5, type_cast=int)
+MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS = get_from_env("MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS", 90, type_cast=int)
 KAFKA_ENABLED = PRIMARY_DB == RDBMS.CLICKHOUSE and not TEST
@@ -1,7 +1,7 @@
 import json
 import re
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from dateutil import parser
 from django.conf import settings
@@ -27,7 +27,7 @@ if is_clickhouse_enabled():
     from ee.kafka_client.client import KafkaProducer
     from ee.kafka_client.topics import KAFKA_EVENTS_PLUGIN_INGESTION
 
-    def log_event(
+    def _kafka_event_payload(
         distinct_id: str,
         ip: Optional[str],
         site_url: str,
@@ -36,12 +36,8 @@ if is_clickhouse_enabled():
         now: datetime,
         sent_at: Optional[datetime],
         event_uuid: UUIDT,
-        *,
-        topic: str = KAFKA_EVENTS_PLUGIN_INGESTION,
-    ) -> None:
-        if settings.DEBUG:
-            print(f'Logging event {data["event"]} to Kafka topic {topic}')
-        data = {
+    ) -> Dict[str, Any]:
+        return {
             "uuid": str(event_uuid),
             "distinct_id": distinct_id,
             "ip": ip,
@@ -51,7 +47,42 @@ if is_clickhouse_enabled():
             "now": now.isoformat(),
             "sent_at": sent_at.isoformat() if sent_at else "",
         }
-        KafkaProducer().produce(topic=topic, data=data)
+
+    def log_event(
+        distinct_id: str,
+        ip: Optional[str],
+        site_url: str,
+        data: dict,
+        team_id: int,
+        now: datetime,
+        sent_at: Optional[datetime],
+        event_uuid: UUIDT,
+        *,
+        topic: str = KAFKA_EVENTS_PLUGIN_INGESTION,
+    ) -> None:
+        if settings.DEBUG:
+            print(f'Logging event {data["event"]} to Kafka topic {topic}')
+        payload = _kafka_event_payload(distinct_id, ip, site_url, data, team_id, now, sent_at, event_uuid)
+        KafkaProducer().produce(topic=topic, data=payload)
+
+    def log_event_batch(
+        events: List[Tuple[dict, str]],
+        ip: Optional[str],
+        site_url: str,
+        team_id: int,
+        now: datetime,
+        sent_at: Optional[datetime],
+        *,
+        topic: str = KAFKA_EVENTS_PLUGIN_INGESTION,
+    ) -> None:
+        """Send all events of a single request to Kafka as one batch, flushing once at the end."""
+        if settings.DEBUG:
+            print(f"Logging {len(events)} events to Kafka topic {topic}")
+        payloads = [
+            _kafka_event_payload(distinct_id, ip, site_url, data, team_id, now, sent_at, UUIDT())
+            for data, distinct_id in events
+        ]
+        KafkaProducer().produce_batch(topic=topic, data=payloads)
 
 
 def _datetime_from_seconds_or_millis(timestamp: str) -> datetime:
@@ -204,6 +235,10 @@ def get_event(request):
             request, generate_exception_response("capture", f"Invalid payload: {e}", code="invalid_payload")
         )
 
+    site_url = request.build_absolute_uri("/")[:-1]
+    ip = None if team.anonymize_ips else get_ip_address(request)
+
+    events_to_capture: List[Tuple[Dict[str, Any], str]] = []
     for event in events:
         try:
             distinct_id = _get_distinct_id(event)
@@ -235,9 +270,6 @@ def get_event(request):
                 ),
             )
 
-        site_url = request.build_absolute_uri("/")[:-1]
-        ip = None if team.anonymize_ips else get_ip_address(request)
-
         if not event.get("properties"):
             event["properties"] = {}
 
@@ -248,7 +280,9 @@ def get_event(request):
         _ensure_web_feature_flags_in_properties(event, team, distinct_id)
 
         statsd.incr("posthog_cloud_plugin_server_ingestion")
-        capture_internal(event, distinct_id, ip, site_url, now, sent_at, team.pk)
+        events_to_capture.append((event, distinct_id))
+
+    capture_internal_batch(events_to_capture, ip, site_url, now, sent_at, team.pk)
 
     timer.stop()
     statsd.incr(
@@ -257,6 +291,15 @@ def get_event(request):
     return cors_response(request, JsonResponse({"status": 1}))
 
 
+def capture_internal_batch(events: List[Tuple[Dict[str, Any], str]], ip, site_url, now, sent_at, team_id):
+    """Capture all (event, distinct_id) pairs of a request, producing them to Kafka as a single batch."""
+    if is_clickhouse_enabled():
+        log_event_batch(events, ip=ip, site_url=site_url, team_id=team_id, now=now, sent_at=sent_at)
+    else:
+        for event, distinct_id in events:
+            capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id)
+
+
 def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id):
     event_uuid = UUIDT()
 
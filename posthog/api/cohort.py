@@ -1,3 +1,4 @@
+import codecs
 import csv
 from typing import Any, Dict, List, Optional, cast
 
@@ -24,7 +25,12 @@ from posthog.queries.stickiness import (
     stickiness_format_intervals,
     stickiness_process_entity_type,
 )
-from posthog.tasks.calculate_cohort import calculate_cohort, calculate_cohort_ch, calculate_cohort_from_list
+from posthog.tasks.calculate_cohort import (
+    calculate_cohort,
+    calculate_cohort_ch,
+    calculate_cohort_from_list,
+    calculate_cohort_from_staged_list,
+)
 
 
 class CohortSerializer(serializers.ModelSerializer):
@@ -46,6 +52,7 @@ class CohortSerializer(serializers.ModelSerializer):
             "errors_calculating",
             "count",
             "is_static",
+            "staged_upload_count",
         ]
         read_only_fields = [
             "id",
@@ -55,6 +62,7 @@ class CohortSerializer(serializers.ModelSerializer):
             "last_calculation",
             "errors_calculating",
             "count",
+            "staged_upload_count",
         ]
 
     def _handle_csv(self, file, cohort: Cohort) -> None:
@@ -99,10 +107,10 @@ class CohortSerializer(serializers.ModelSerializer):
                 raise ValueError("This cohort has no conditions")
 
     def _calculate_static_by_csv(self, file, cohort: Cohort) -> None:
-        decoded_file = file.read().decode("utf-8").splitlines()
-        reader = csv.reader(decoded_file)
-        distinct_ids_and_emails = [row[0] for row in reader if len(row) > 0 and row]
-        calculate_cohort_from_list.delay(cohort.pk, distinct_ids_and_emails)
+        # Streamed into Postgres line by line, so that large files aren't held in memory or passed to the task
+        reader = csv.reader(codecs.iterdecode(file, "utf-8"))
+        cohort.stage_users(row[0] for row in reader if len(row) > 0 and row)
+        calculate_cohort_from_staged_list.delay(cohort.pk)
 
     def _calculate_static_by_people(self, people: List[str], cohort: Cohort) -> None:
         calculate_cohort_from_list.delay(cohort.pk, people)
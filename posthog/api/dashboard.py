@@ -1,18 +1,20 @@
+import json
 import secrets
 from typing import Any, Dict, Optional
 
 import posthoganalytics
 from django.db.models import Model, Prefetch, QuerySet
 from django.db.models.query_utils import Q
-from django.http import HttpRequest
+from django.http import HttpRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils.timezone import now
 from django.views.decorators.clickjacking import xframe_options_exempt
 from rest_framework import authentication, response, serializers, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
 
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.api.shared import UserBasicSerializer
@@ -20,7 +22,12 @@ from posthog.auth import PersonalAPIKeyAuthentication, PublicTokenAuthentication
 from posthog.helpers import create_dashboard_from_template
 from posthog.models import Dashboard, DashboardItem, Team
 from posthog.permissions import ProjectMembershipNecessaryPermissions
-from posthog.tasks.update_cache import update_dashboard_item_cache, update_dashboard_items_cache
+from posthog.tasks.update_cache import (
+    iter_update_dashboard_items_cache,
+    record_dashboard_view,
+    update_dashboard_item_cache,
+    update_dashboard_items_cache,
+)
 from posthog.utils import get_safe_cache, render_template, str_to_bool
 
 
@@ -99,6 +106,8 @@ class DashboardSerializer(serializers.ModelSerializer):
 
         if self.context["request"].GET.get("refresh"):
             update_dashboard_items_cache(dashboard)
+            # Items are all freshly calculated already
+            self.context.update({"items_refreshed": True})
 
         items = dashboard.items.filter(deleted=False).order_by("order").all()
         self.context.update({"dashboard": dashboard})
@@ -141,9 +150,33 @@ class DashboardsViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         dashboard = get_object_or_404(queryset, pk=pk)
         dashboard.last_accessed_at = now()
         dashboard.save()
+        record_dashboard_view(dashboard.pk)
         serializer = DashboardSerializer(dashboard, context={"view": self, "request": request})
         return response.Response(serializer.data)
 
+    @action(methods=["GET"], detail=True)
+    def refresh_stream(self, request: Request, *args: Any, **kwargs: Any) -> StreamingHttpResponse:
+        """
+        Recalculate all items of the dashboard, streaming each item as a line of JSON as soon as it's done, so that
+        tiles can be shown one by one rather than after the slowest one. Items that fail to calculate are streamed as
+        `{"id": ..., "error": ...}` instead.
+        """
+        dashboard = get_object_or_404(self.get_queryset(), pk=kwargs["pk"])
+        context = {"view": self, "request": request, "dashboard": dashboard, "items_refreshed": True}
+        refreshed_items = iter_update_dashboard_items_cache(dashboard)
+
+        def stream():
+            for item, error in refreshed_items:
+                if error is not None:
+                    detail = error.detail if isinstance(error, APIException) else "Failed to calculate this item."
+                    data = {"id": item.pk, "error": detail}
+                else:
+                    item.refresh_from_db()
+                    data = DashboardItemSerializer(item, context=context).data
+                yield json.dumps(data, cls=JSONEncoder) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
     def get_parents_query_dict(self) -> Dict[str, Any]:  # to be moved to a separate Legacy*ViewSet Class
         if not self.request.user.is_authenticated or "share_token" in self.request.GET or not self.request.user.team:
             return {}
@@ -208,7 +241,7 @@ class DashboardItemSerializer(serializers.ModelSerializer):
         if not dashboard_item.filters_hash:
             return None
 
-        if self.context["request"].GET.get("refresh"):
+        if self.context["request"].GET.get("refresh") and not self.context.get("items_refreshed"):
             update_dashboard_item_cache(dashboard_item, None)
 
         result = get_safe_cache(dashboard_item.filters_hash)
@@ -2,6 +2,7 @@ import json
 from datetime import timedelta
 from typing import Any, Dict, List, Optional, Union, cast
 
+from dateutil import parser
 from django.db.models import Prefetch, QuerySet
 from django.db.models.query_utils import Q
 from django.utils import timezone
@@ -100,6 +101,7 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, ProjectMembershipNecessaryPermissions]
 
     CSV_EXPORT_LIMIT = 100_000  # Return at most this number of events in CSV export
+    SESSION_RECORDING_MAX_WINDOW = 5_000  # Load at most this number of snapshots per session recording window
 
     def get_queryset(self):
         queryset = cast(EventManager, super().get_queryset()).add_person_id(self.team_id)
@@ -302,6 +304,8 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     # params:
     # - session_recording_id: (string) id of the session recording
     # - save_view: (boolean) save view of the recording
+    # - limit: (int) load the snapshots in windows of about this many, following `next` for the rest
+    # - after: (string) cursor of the window to load, as given by `next`
     # ******************************************
     @action(methods=["GET"], detail=False)
     def session_recording(self, request: request.Request, *args: Any, **kwargs: Any) -> response.Response:
@@ -314,11 +318,38 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
                 },
                 status=400,
             )
-        session_recording = SessionRecording().run(
-            team=self.team, filter=Filter(request=request), session_recording_id=request.GET["session_recording_id"]
+        return self._session_recording_response(request, SessionRecording())
+
+    def _session_recording_response(
+        self, request: request.Request, session_recording_query: SessionRecording
+    ) -> response.Response:
+        limit, after = None, None
+        try:
+            if request.GET.get("limit"):
+                limit = min(max(int(request.GET["limit"]), 1), self.SESSION_RECORDING_MAX_WINDOW)
+            if request.GET.get("after"):
+                after = parser.isoparse(request.GET["after"])
+        except ValueError:
+            raise ValidationError("Invalid limit or after parameter.")
+
+        session_recording = session_recording_query.run(
+            team=self.team,
+            filter=Filter(request=request),
+            session_recording_id=request.GET["session_recording_id"],
+            limit=limit,
+            after=after,
         )
 
-        if request.GET.get("save_view"):
+        if limit is not None:
+            next_cursor = session_recording.pop("next")
+            session_recording["next"] = None
+            if next_cursor is not None:
+                params = request.GET.copy()
+                params["after"] = next_cursor.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                session_recording["next"] = request.build_absolute_uri("{}?{}".format(request.path, params.urlencode()))
+
+        # Only the first window counts as a view
+        if request.GET.get("save_view") and after is None:
             SessionRecordingViewed.objects.get_or_create(
                 team=self.team, user=request.user, session_id=request.GET["session_recording_id"]
             )
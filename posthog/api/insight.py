@@ -7,6 +7,7 @@ from django.utils.timezone import now
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import request, serializers, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
@@ -31,6 +32,7 @@ from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.permissions import ProjectMembershipNecessaryPermissions
 from posthog.queries import paths, retention, stickiness, trends
 from posthog.queries.sessions.sessions import Sessions
+from posthog.tasks import async_query
 from posthog.utils import generate_cache_key, get_safe_cache, should_refresh, str_to_bool
 
 
@@ -310,6 +312,50 @@ class InsightViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         resp = paths.Paths().run(filter=filter, team=team)
         return {"result": resp}
 
+    # ******************************************
+    # /insight/query_status, /insight/query_result, /insight/cancel_query
+    # Insights requested with ?async=true return a query_id instead of the result, to be polled with these.
+    #
+    # params:
+    # - query_id: (string) id of the query as returned by the insight endpoint
+    # ******************************************
+    @action(methods=["GET"], detail=False)
+    def query_status(self, request: request.Request, *args: Any, **kwargs: Any) -> Response:
+        state = self._get_query_state(request)
+        return Response({key: state[key] for key in ("id", "status", "error", "created_at")})
+
+    @action(methods=["GET"], detail=False)
+    def query_result(self, request: request.Request, *args: Any, **kwargs: Any) -> Response:
+        state = self._get_query_state(request)
+        if state["status"] != async_query.COMPLETE:
+            return Response({"result": {"loading": True}, "query_id": state["id"], "status": state["status"]})
+
+        cached_result = get_safe_cache(state["cache_key"]) or {}
+        return Response(
+            {
+                "result": cached_result.get("result"),
+                "last_refresh": cached_result.get("last_refresh"),
+                "is_cached": True,
+                "query_id": state["id"],
+                "status": state["status"],
+            }
+        )
+
+    @action(methods=["POST"], detail=False)
+    def cancel_query(self, request: request.Request, *args: Any, **kwargs: Any) -> Response:
+        query_id = request.data.get("query_id") or request.GET.get("query_id")
+        state = async_query.cancel_query(self.team.pk, query_id) if query_id else None
+        if state is None:
+            raise NotFound(detail="Query not found.")
+        return Response({key: state[key] for key in ("id", "status", "error", "created_at")})
+
+    def _get_query_state(self, request: request.Request) -> Dict[str, Any]:
+        query_id = request.GET.get("query_id")
+        state = async_query.get_query_state(self.team.pk, query_id) if query_id else None
+        if state is None:
+            raise NotFound(detail="Query not found.")
+        return state
+
     # Checks if a dashboard id has been set and if so, update the refresh date
     def _refresh_dashboard(self, request) -> None:
         dashboard_id = request.GET.get(FROM_DASHBOARD, None)
@@ -519,6 +519,24 @@ class TestCapture(BaseTest):
             ),
         )
 
+    @patch("posthog.models.team.TEAM_CACHE", {})
+    @patch("posthog.api.capture.celery_app.send_task")
+    def test_batch_with_invalid_event_captures_nothing(self, patch_process_event_with_plugins):
+        response = self.client.post(
+            "/batch/",
+            data={
+                "api_key": self.team.api_token,
+                "batch": [
+                    {"type": "capture", "event": "user signed up", "distinct_id": "2"},
+                    {"type": "capture", "event": "user signed up"},
+                ],
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(patch_process_event_with_plugins.call_count, 0)
+
     @patch("posthog.models.team.TEAM_CACHE", {})
     @patch("posthog.api.capture.celery_app.send_task")
     def test_engage(self, patch_process_event_with_plugins):
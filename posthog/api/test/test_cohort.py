@@ -3,7 +3,7 @@ from unittest.mock import patch
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 
-from posthog.models import Person
+from posthog.models import Person, StaticCohortUploadItem
 from posthog.models.cohort import Cohort
 from posthog.test.base import APIBaseTest
 
@@ -69,8 +69,8 @@ class TestCohort(APIBaseTest):
             },
         )
 
-    @patch("posthog.tasks.calculate_cohort.calculate_cohort_from_list.delay")
-    def test_static_cohort_csv_upload(self, patch_calculate_cohort_from_list):
+    @patch("posthog.tasks.calculate_cohort.calculate_cohort_from_staged_list.delay")
+    def test_static_cohort_csv_upload(self, patch_calculate_cohort_from_staged_list):
         self.team.app_urls = ["http://somewebsite.com"]
         self.team.save()
         Person.objects.create(team=self.team, properties={"email": "email@example.org"})
@@ -91,7 +91,11 @@ email@example.org,
 
         response = self.client.post("/api/cohort/", {"name": "test", "csv": csv, "is_static": True}, format="multipart")
         self.assertEqual(response.status_code, 201)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 1)
+        patch_calculate_cohort_from_staged_list.assert_called_once_with(response.json()["id"])
+        self.assertEqual(
+            list(StaticCohortUploadItem.objects.order_by("id").values_list("value", flat=True)),
+            ["User ID", "email@example.org", "123"],
+        )
         self.assertFalse(response.json()["is_calculating"], False)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
 
@@ -114,6 +118,6 @@ User ID,
             "/api/cohort/%s/" % response.json()["id"], {"name": "test", "csv": csv}, format="multipart"
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 2)
+        self.assertEqual(patch_calculate_cohort_from_staged_list.call_count, 2)
         self.assertFalse(response.json()["is_calculating"], False)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
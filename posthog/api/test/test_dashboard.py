@@ -1,11 +1,14 @@
 import json
+from unittest.mock import patch
 
 from django.utils import timezone
 from django.utils.timezone import now
 from freezegun import freeze_time
 from rest_framework import status
 
+from posthog.exceptions import EstimatedQueryExecutionTimeTooLong
 from posthog.models import Dashboard, DashboardItem, Filter, User
+from posthog.tasks.update_cache import update_dashboard_item_cache
 from posthog.test.base import APIBaseTest
 from posthog.utils import generate_cache_key
 
@@ -211,6 +214,48 @@ class TestDashboard(APIBaseTest):
             self.assertAlmostEqual(item_default.last_refresh, now(), delta=timezone.timedelta(seconds=5))
             self.assertAlmostEqual(item_sessions.last_refresh, now(), delta=timezone.timedelta(seconds=5))
 
+    def test_refresh_stream(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        items = [
+            DashboardItem.objects.create(
+                dashboard=dashboard, filters=Filter(data={"events": [{"id": event}]}).to_dict(), team=self.team,
+            )
+            for event in ["$pageview", "sign up"]
+        ]
+
+        response = self.client.get(f"/api/dashboard/{dashboard.pk}/refresh_stream/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        streamed = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertCountEqual([item["id"] for item in streamed], [item.pk for item in items])
+        for item in streamed:
+            self.assertEqual(item["result"][0]["count"], 0)
+            self.assertIsNotNone(item["last_refresh"])
+
+    def test_refresh_stream_streams_items_failing_to_calculate_as_errors(self):
+        dashboard = Dashboard.objects.create(team=self.team, name="dashboard")
+        item, failing_item = [
+            DashboardItem.objects.create(
+                dashboard=dashboard, filters=Filter(data={"events": [{"id": event}]}).to_dict(), team=self.team,
+            )
+            for event in ["$pageview", "slow"]
+        ]
+
+        def update_item(dashboard_item, dashboard):
+            if dashboard_item.pk == failing_item.pk:
+                raise EstimatedQueryExecutionTimeTooLong()
+            update_dashboard_item_cache(dashboard_item, dashboard)
+
+        with patch("posthog.tasks.update_cache.update_dashboard_item_cache", side_effect=update_item):
+            response = self.client.get(f"/api/dashboard/{dashboard.pk}/refresh_stream/")
+            streamed = {line["id"]: line for line in map(json.loads, b"".join(response.streaming_content).splitlines())}
+
+        self.assertEqual(streamed[item.pk]["result"][0]["count"], 0)
+        self.assertEqual(
+            streamed[failing_item.pk], {"id": failing_item.pk, "error": "Estimated query execution time is too long"}
+        )
+
     def test_dashboard_endpoints(self):
         # create
         response = self.client.post("/api/dashboard/", {"name": "Default", "pinned": "true"},)
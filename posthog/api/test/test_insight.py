@@ -146,6 +146,40 @@ def insight_test_factory(event_factory, person_factory):
             self.assertEqual(response["result"][0]["count"], 2)
             self.assertEqual(response["result"][0]["action"]["name"], "$pageview")
 
+        def test_insight_trends_async(self):
+            with freeze_time("2012-01-14T03:21:34.000Z"):
+                event_factory(team=self.team, event="$pageview", distinct_id="1")
+                event_factory(team=self.team, event="$pageview", distinct_id="2")
+
+            with freeze_time("2012-01-15T04:01:34.000Z"):
+                response = self.client.get(
+                    "/api/insight/trend/", data={"events": json.dumps([{"id": "$pageview"}]), "async": "true"}
+                ).json()
+                query_id = response["query_id"]
+                self.assertEqual(response["result"], {"loading": True})
+
+                # Celery runs tasks eagerly in tests, so the query is done already
+                status_response = self.client.get("/api/insight/query_status/", data={"query_id": query_id}).json()
+                self.assertEqual(status_response["status"], "complete")
+
+                result_response = self.client.get("/api/insight/query_result/", data={"query_id": query_id}).json()
+                self.assertEqual(result_response["result"][0]["count"], 2)
+
+                cancel_response = self.client.post("/api/insight/cancel_query/", {"query_id": query_id}).json()
+                self.assertEqual(cancel_response["status"], "complete")
+
+            self.assertEqual(
+                self.client.get("/api/insight/query_status/", data={"query_id": "nonexistent"}).status_code,
+                status.HTTP_404_NOT_FOUND,
+            )
+
+        def test_insight_async_team_concurrency_limit(self):
+            with self.settings(INSIGHT_ASYNC_QUERY_TEAM_CONCURRENCY=0):
+                response = self.client.get(
+                    "/api/insight/trend/", data={"events": json.dumps([{"id": "$pageview"}]), "async": "true"}
+                )
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
         def test_nonexistent_cohort_is_handled(self):
             response_nonexistent_property = self.client.get(
                 f"/api/insight/trend/?events={json.dumps([{'id': '$pageview'}])}&properties={json.dumps([{'type':'property','key':'foo','value':'barabarab'}])}"
@@ -82,6 +82,8 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
         sender.add_periodic_task(120, clickhouse_row_count.s(), name="clickhouse events table row count")
         sender.add_periodic_task(120, clickhouse_part_count.s(), name="clickhouse table parts count")
         sender.add_periodic_task(120, clickhouse_mutation_count.s(), name="clickhouse table mutations count")
+        if getattr(settings, "MATERIALIZE_COLUMNS_ENABLED", False):
+            sender.add_periodic_task(crontab(hour=5, minute=0), clickhouse_materialize_columns.s())
     elif settings.PLUGIN_SERVER_ACTION_MATCHING >= 2:
         sender.add_periodic_task(
             ACTION_EVENT_MAPPING_INTERVAL_SECONDS,
@@ -192,6 +194,14 @@ def clickhouse_part_count():
         pass
 
 
+@app.task(ignore_result=True)
+def clickhouse_materialize_columns():
+    if is_clickhouse_enabled() and settings.EE_AVAILABLE:
+        from ee.clickhouse.materialized_columns import materialize_properties_from_usage
+
+        materialize_properties_from_usage()
+
+
 @app.task(ignore_result=True)
 def clickhouse_mutation_count():
     if is_clickhouse_enabled() and settings.EE_AVAILABLE:
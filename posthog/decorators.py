@@ -1,17 +1,21 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from functools import wraps
-from typing import Callable, Dict, List, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Union, cast
 
+from django.conf import settings
 from django.core.cache import cache
 from django.utils.timezone import now
 from rest_framework.request import Request
 
+from posthog.helpers.single_flight import is_locked, redis_lock, wait_for
 from posthog.models import Filter, Team, User
 from posthog.models.dashboard_item import DashboardItem
 from posthog.models.filters.utils import get_filter
+from posthog.redis import get_client
 from posthog.settings import TEMP_CACHE_RESULTS_TTL
-from posthog.utils import should_refresh
+from posthog.types import FilterType
+from posthog.utils import should_refresh, str_to_bool
 
 from .utils import generate_cache_key, get_safe_cache
 
@@ -25,10 +29,22 @@ class CacheType(str, Enum):
     PATHS = "Path"
 
 
-def cached_function():
+def cached_function(stale_while_revalidate: bool = True):
+    """
+    Cache the result of an insight calculation under the filter's cache key.
+
+    Concurrent calls for the same cache key are collapsed into one calculation: the first caller takes a Redis lock
+    and the others wait for its result to land in the cache. When `stale_while_revalidate` is set, cached results
+    older than `INSIGHT_CACHE_STALE_SECONDS` are still returned right away while a refresh runs in the background,
+    and requests with `?async=true` get a query id to poll instead of waiting for the calculation (see
+    `posthog.tasks.async_query`). Only enable it for functions whose results `update_cache_item` computes too.
+    """
+
     def parameterized_decorator(f: Callable):
         @wraps(f)
-        def wrapper(*args, **kwargs) -> Dict[str, Union[List, datetime, bool, str]]:
+        def wrapper(*args, **kwargs) -> Dict[str, Union[List, Dict, datetime, bool, str]]:
+            from posthog.internal_metrics import incr, timing
+
             # prepare caching params
             request: Request = args[1]
             team = cast(User, request.user).team
@@ -42,20 +58,86 @@ def cached_function():
             if not should_refresh(request):
                 cached_result = get_safe_cache(cache_key)
                 if cached_result and cached_result.get("result"):
+                    if stale_while_revalidate and _is_stale(cached_result):
+                        incr("insight_cache_stale_served")
+                        _refresh_in_background(cache_key, filter, team.pk)
+                    else:
+                        incr("insight_cache_hit")
                     return {**cached_result, "is_cached": True}
-            # call function being wrapped
-            result = f(*args, **kwargs)
-
-            # cache new data
-            if result is not None and not (isinstance(result.get("result"), dict) and result["result"].get("loading")):
-                cache.set(
-                    cache_key, {"result": result["result"], "last_refresh": now()}, TEMP_CACHE_RESULTS_TTL,
-                )
-                if filter:
-                    dashboard_items = DashboardItem.objects.filter(team_id=team.pk, filters_hash=cache_key)
-                    dashboard_items.update(last_refresh=now())
+                incr("insight_cache_miss")
+
+            if stale_while_revalidate and str_to_bool(request.GET.get("async", False)):
+                # Imported here: posthog.tasks imports posthog.tasks.update_cache, which imports this module
+                from posthog.tasks.async_query import submit_query
+
+                query_id = submit_query(team.pk, cache_key, filter)
+                return {"result": {"loading": True}, "query_id": query_id}
+
+            # Taken before trying the lock, as the holder may cache its result before we start waiting
+            wait_start = now()
+            with redis_lock(cache_key, settings.INSIGHT_CACHE_LOCK_TIMEOUT) as acquired:
+                if not acquired:
+                    # The same result is already being calculated elsewhere, wait for it instead of calculating it again
+                    waited_result = wait_for(
+                        lambda: get_fresh_cached_result(cache_key, since=wait_start), settings.INSIGHT_CACHE_LOCK_WAIT
+                    )
+                    timing(
+                        "insight_cache_lock_wait",
+                        (now() - wait_start).total_seconds() * 1000,
+                        tags={"success": waited_result is not None},
+                    )
+                    if waited_result is not None:
+                        return {**waited_result, "is_cached": True}
+
+                # call function being wrapped
+                result = f(*args, **kwargs)
+
+                # cache new data
+                if result is not None and not (
+                    isinstance(result.get("result"), dict) and result["result"].get("loading")
+                ):
+                    cache.set(
+                        cache_key, {"result": result["result"], "last_refresh": now()}, TEMP_CACHE_RESULTS_TTL,
+                    )
+                    if filter:
+                        dashboard_items = DashboardItem.objects.filter(team_id=team.pk, filters_hash=cache_key)
+                        dashboard_items.update(last_refresh=now())
             return result
 
         return wrapper
 
     return parameterized_decorator
+
+
+def get_fresh_cached_result(cache_key: str, since: datetime) -> Optional[Dict[str, Any]]:
+    """Return the cached result for the key if it has been calculated after `since`."""
+    cached_result = get_safe_cache(cache_key)
+    if (
+        cached_result
+        and cached_result.get("result")
+        and cached_result.get("last_refresh")
+        and cached_result["last_refresh"] >= since
+    ):
+        return cached_result
+    return None
+
+
+def _is_stale(cached_result: Dict[str, Any]) -> bool:
+    last_refresh = cached_result.get("last_refresh")
+    if not last_refresh:
+        return False
+    return now() - last_refresh > timedelta(seconds=settings.INSIGHT_CACHE_STALE_SECONDS)
+
+
+def _refresh_in_background(cache_key: str, filter: FilterType, team_id: int) -> None:
+    from posthog.celery import update_cache_item_task
+    from posthog.tasks.update_cache import get_cache_type
+
+    if is_locked(cache_key):
+        return  # Already being calculated
+    # Only queue one refresh per key, however many requests see the stale result in the meantime
+    if not get_client().set(f"refresh_queued:{cache_key}", 1, nx=True, ex=settings.INSIGHT_CACHE_LOCK_TIMEOUT):
+        return
+    update_cache_item_task.delay(
+        cache_key, get_cache_type(filter), {"filter": filter.toJSON(), "team_id": team_id},
+    )
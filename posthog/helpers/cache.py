@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from django.core.cache import cache
+from django.db import models
+
+V = TypeVar("V")
+
+# Marker stored for lookups that resolved to nothing, so that negative results can be cached too
+MISSING = "__posthog_cache_missing__"
+
+
+def _is_missing(value: Any) -> bool:
+    return isinstance(value, str) and value == MISSING
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+M = TypeVar("M", bound=models.Model)
+
+
+def dump_model(instance: models.Model) -> Dict[str, Any]:
+    """
+    The loaded field values of a model instance. Unlike a pickled instance, these can still be loaded after the model
+    changed, e.g. by the next deploy.
+    """
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.attname in instance.__dict__
+    }
+
+
+def load_model(model: Type[M], data: Dict[str, Any]) -> M:
+    "An instance of the model from `dump_model` values. Fields that weren't dumped are deferred, unknown ones ignored."
+    field_names = [field.attname for field in model._meta.concrete_fields if field.attname in data]
+    return model.from_db(None, field_names, [data[name] for name in field_names])
+
+
+class LRUTTLCache(Generic[V]):
+    """
+    Thread-safe, size-bounded in-process cache. Entries expire `ttl` seconds after being set and the least recently
+    used entry is evicted once `max_size` is exceeded.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: V, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    In-process LRU+TTL cache backed by the shared Django (Redis) cache.
+
+    Lookups hit the local cache first, then Redis, and only call `fetch` when both miss. `None` results are cached as
+    well (with `negative_ttl`), so that repeated lookups of unknown keys don't reach the database. Values go through
+    `dump` on their way into Redis and `load` on their way out, e.g. to store plain field values rather than model
+    instances; values Redis holds that can't be loaded are fetched again.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        max_size: int,
+        local_ttl: int,
+        ttl: int,
+        negative_ttl: int,
+        dump: Callable[[Any], Any] = _identity,
+        load: Callable[[Any], Any] = _identity,
+    ):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.dump = dump
+        self.load = load
+        self.local: LRUTTLCache[Any] = LRUTTLCache(max_size=max_size, ttl=local_ttl)
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        value = self.local.get(key)
+        if value is None:
+            value = self._get_from_redis(key)
+            if value is None:
+                fetched = fetch()
+                value = MISSING if fetched is None else fetched
+                cache.set(
+                    self._redis_key(key),
+                    MISSING if fetched is None else self.dump(fetched),
+                    self.negative_ttl if fetched is None else self.ttl,
+                )
+            self.local.set(key, value, min(self.local.ttl, self.negative_ttl) if _is_missing(value) else None)
+        return None if _is_missing(value) else value
+
+    def _get_from_redis(self, key: str) -> Any:
+        stored = cache.get(self._redis_key(key))
+        if stored is None or _is_missing(stored):
+            return stored
+        try:
+            return self.load(stored)
+        except Exception:
+            return None
+
+    def invalidate(self, key: str) -> None:
+        self.local.delete(key)
+        cache.delete(self._redis_key(key))
+
+    def clear_local(self) -> None:
+        self.local.clear()
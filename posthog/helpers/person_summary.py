@@ -0,0 +1,87 @@
+"""
+Lightweight summaries of the persons behind distinct ids, for lists of events, sessions and recordings.
+
+These lists only show who did something, so instead of loading `Person` models (plus a query per person for its
+distinct ids) the summaries of a whole page are fetched with one query and cached in Redis for a short while.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from posthog.models.person import PersonDistinctId
+
+# Person properties worth showing next to an event
+SUMMARY_PROPERTIES = ["email", "name", "username"]
+
+# Cached for distinct ids without a person as well, so that anonymous events don't hit the database on every page
+NO_PERSON = "__no_person__"
+
+
+# id, uuid, is_identified, distinct_id (the person's first, not necessarily the one looked up) and the
+# SUMMARY_PROPERTIES the person has
+PersonSummary = Dict[str, Any]
+
+
+def get_person_summaries(team_id: int, distinct_ids: Iterable[str]) -> Dict[str, PersonSummary]:
+    """Map of each given distinct id that belongs to a person to the summary of that person."""
+    keys = {distinct_id: _cache_key(team_id, distinct_id) for distinct_id in set(distinct_ids)}
+    if not keys:
+        return {}
+
+    cached = cache.get_many(list(keys.values()))
+    summaries: Dict[str, PersonSummary] = {}
+    missing: List[str] = []
+    for distinct_id, key in keys.items():
+        if key not in cached:
+            missing.append(distinct_id)
+        elif cached[key] != NO_PERSON:
+            summaries[distinct_id] = cached[key]
+
+    if missing:
+        fetched = _fetch_person_summaries(team_id, missing)
+        cache.set_many(
+            {keys[distinct_id]: fetched.get(distinct_id, NO_PERSON) for distinct_id in missing},
+            settings.PERSON_SUMMARY_CACHE_TTL,
+        )
+        summaries.update(fetched)
+    return summaries
+
+
+def get_person_summary(team_id: int, distinct_id: str) -> Optional[PersonSummary]:
+    return get_person_summaries(team_id, [distinct_id]).get(distinct_id)
+
+
+def _fetch_person_summaries(team_id: int, distinct_ids: List[str]) -> Dict[str, PersonSummary]:
+    first_distinct_id = (
+        PersonDistinctId.objects.filter(team_id=team_id, person_id=OuterRef("person_id"))
+        .order_by("id")
+        .values("distinct_id")[:1]
+    )
+    rows = (
+        PersonDistinctId.objects.filter(team_id=team_id, distinct_id__in=distinct_ids)
+        .annotate(first_distinct_id=Subquery(first_distinct_id))
+        .values_list(
+            "distinct_id",
+            "person_id",
+            "person__uuid",
+            "person__is_identified",
+            "person__properties",
+            "first_distinct_id",
+        )
+    )
+    return {
+        distinct_id: {
+            "id": person_id,
+            "uuid": str(uuid),
+            "is_identified": is_identified,
+            "distinct_id": first_distinct_id,
+            "properties": {key: properties[key] for key in SUMMARY_PROPERTIES if key in properties},
+        }
+        for distinct_id, person_id, uuid, is_identified, properties, first_distinct_id in rows
+    }
+
+
+def _cache_key(team_id: int, distinct_id: str) -> str:
+    return f"person_summary:{team_id}:{distinct_id}"
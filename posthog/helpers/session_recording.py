@@ -1,9 +1,11 @@
 import base64
 import gzip
 import json
+import zlib
 from collections import defaultdict
-from typing import Dict, Generator, List
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
+from django.conf import settings
 from sentry_sdk.api import capture_exception, capture_message
 
 from posthog.models import utils
@@ -13,6 +15,13 @@ SnapshotData = Dict
 
 FULL_SNAPSHOT = 2
 
+# Values of the `compression` field of chunks, one per version of the format. Chunks always store base64 text, as
+# `snapshot_data` is JSON.
+# Legacy: UTF-16 JSON, gzipped. Only read, as UTF-16 doubles the input of the compressor for the mostly-ASCII snapshots
+COMPRESSION_GZIP_BASE64 = "gzip-base64"
+# UTF-8 JSON, zlib-compressed
+COMPRESSION_ZLIB_UTF8_BASE64 = "zlib-utf8-base64"
+
 
 def preprocess_session_recording_events(events: List[Event]) -> List[Event]:
     result = []
@@ -30,12 +39,15 @@ def preprocess_session_recording_events(events: List[Event]) -> List[Event]:
     return result
 
 
-def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) -> Generator[Event, None, None]:
+def compress_and_chunk_snapshots(
+    events: List[Event], chunk_size=512 * 1024, compression: Optional[str] = None
+) -> Generator[Event, None, None]:
     data_list = [event["properties"]["$snapshot_data"] for event in events]
     session_id = events[0]["properties"]["$session_id"]
     has_full_snapshot = any(snapshot_data["type"] == FULL_SNAPSHOT for snapshot_data in data_list)
 
-    compressed_data = compress_to_string(json.dumps(data_list))
+    compression = compression or settings.SESSION_RECORDING_COMPRESSION
+    compressed_data = compress_to_string(json.dumps(data_list), compression)
 
     id = str(utils.UUIDT())
     chunks = chunk_string(compressed_data, chunk_size)
@@ -50,7 +62,7 @@ def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) ->
                     "chunk_index": index,
                     "chunk_count": len(chunks),
                     "data": chunk,
-                    "compression": "gzip-base64",
+                    "compression": compression,
                     "has_full_snapshot": has_full_snapshot,
                 },
             },
@@ -58,26 +70,31 @@ def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) ->
 
 
 def decompress_chunked_snapshot_data(
-    team_id: int, session_recording_id: str, snapshot_list: List[SnapshotData]
+    team_id: int, session_recording_id: str, snapshot_list: Iterable[SnapshotData]
 ) -> Generator[SnapshotData, None, None]:
-    chunks_collector = defaultdict(list)
+    """
+    Decompress snapshots lazily, in the order they're given: each batch of chunks is decompressed as soon as all its
+    chunks have been seen, so the first snapshots are available before the rest has been read, let alone decompressed.
+    """
+    chunks_collector: Dict[str, List[SnapshotData]] = defaultdict(list)
     for snapshot_data in snapshot_list:
         if "chunk_id" not in snapshot_data:
             yield snapshot_data
-        else:
-            chunks_collector[snapshot_data["chunk_id"]].append(snapshot_data)
-
-    for chunks in chunks_collector.values():
-        if len(chunks) != chunks[0]["chunk_count"]:
-            capture_message(
-                "Did not find all session recording chunks! Team: {}, Session: {}".format(team_id, session_recording_id)
-            )
             continue
 
-        b64_compressed_data = "".join(chunk["data"] for chunk in sorted(chunks, key=lambda c: c["chunk_index"]))
-        decompressed_data = json.loads(decompress(b64_compressed_data))
+        chunks = chunks_collector[snapshot_data["chunk_id"]]
+        chunks.append(snapshot_data)
+        if len(chunks) == snapshot_data["chunk_count"]:
+            del chunks_collector[snapshot_data["chunk_id"]]
+            b64_compressed_data = "".join(chunk["data"] for chunk in sorted(chunks, key=lambda c: c["chunk_index"]))
+            yield from json.loads(
+                decompress(b64_compressed_data, chunks[0].get("compression", COMPRESSION_GZIP_BASE64))
+            )
 
-        yield from decompressed_data
+    if chunks_collector:
+        capture_message(
+            "Did not find all session recording chunks! Team: {}, Session: {}".format(team_id, session_recording_id)
+        )
 
 
 def chunk_string(string: str, chunk_length: int) -> List[str]:
@@ -97,11 +114,23 @@ def is_unchunked_snapshot(event: Dict) -> bool:
         raise ValueError('$snapshot events must contain property "$snapshot_data"!')
 
 
-def compress_to_string(json_string: str) -> str:
-    compressed_data = gzip.compress(json_string.encode("utf-16", "surrogatepass"))
-    return base64.b64encode(compressed_data).decode("utf-8")
+def compress_to_string(json_string: str, compression: str) -> str:
+    compress_bytes, _ = _CODECS[compression]
+    return base64.b64encode(compress_bytes(json_string)).decode("utf-8")
+
+
+def decompress(base64data: str, compression: str) -> str:
+    _, decompress_bytes = _CODECS[compression]
+    return decompress_bytes(base64.b64decode(base64data))
 
 
-def decompress(base64data: str) -> str:
-    compressed_bytes = base64.b64decode(base64data)
-    return gzip.decompress(compressed_bytes).decode("utf-16", "surrogatepass")
+_CODECS: Dict[str, Tuple[Callable[[str], bytes], Callable[[bytes], str]]] = {
+    COMPRESSION_GZIP_BASE64: (
+        lambda string: gzip.compress(string.encode("utf-16", "surrogatepass")),
+        lambda data: gzip.decompress(data).decode("utf-16", "surrogatepass"),
+    ),
+    COMPRESSION_ZLIB_UTF8_BASE64: (
+        lambda string: zlib.compress(string.encode("utf-8", "surrogatepass"), 6),
+        lambda data: zlib.decompress(data).decode("utf-8", "surrogatepass"),
+    ),
+}
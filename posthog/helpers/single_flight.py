@@ -0,0 +1,65 @@
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Generator, Optional, TypeVar
+
+from posthog.redis import get_client
+
+T = TypeVar("T")
+
+_held_locks = threading.local()
+
+# Deletes the lock only if it's still held by whoever took it, so that an expired lock taken over by someone else
+# doesn't get released by the previous owner
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+
+@contextmanager
+def redis_lock(key: str, timeout: int) -> Generator[bool, None, None]:
+    """
+    Try to take a Redis lock without blocking, yielding whether it was acquired. The lock expires after `timeout`
+    seconds in case the holder dies. Locks are re-entrant within a thread, e.g. for Celery tasks run eagerly.
+    """
+    held = _held_locks.__dict__.setdefault("keys", set())
+    if key in held:
+        yield True
+        return
+
+    client = get_client()
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    acquired = bool(client.set(lock_key, token, nx=True, ex=timeout))
+    if acquired:
+        held.add(key)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            held.discard(key)
+            try:
+                client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception:
+                # Scripting isn't available everywhere (e.g. fakeredis without lua), the lock expires anyway
+                if client.get(lock_key) == token.encode("utf-8"):
+                    client.delete(lock_key)
+
+
+def is_locked(key: str) -> bool:
+    return bool(get_client().exists(f"lock:{key}"))
+
+
+def wait_for(fetch: Callable[[], Optional[T]], timeout: float, poll_interval: float = 0.1) -> Optional[T]:
+    """Poll `fetch` until it returns something other than None or `timeout` seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = fetch()
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        time.sleep(poll_interval)
@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+from posthog.helpers.cache import LRUTTLCache, TwoTierCache
+
+
+def test_lru_ttl_cache_evicts_least_recently_used():
+    cache: LRUTTLCache[int] = LRUTTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_ttl_cache_expires_entries():
+    cache: LRUTTLCache[int] = LRUTTLCache(max_size=10, ttl=60)
+    with patch("posthog.helpers.cache.time.monotonic", return_value=1000):
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=5)
+    with patch("posthog.helpers.cache.time.monotonic", return_value=1010):
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+    with patch("posthog.helpers.cache.time.monotonic", return_value=1061):
+        assert cache.get("a") is None
+
+
+def test_two_tier_cache_caches_positive_and_negative_results():
+    cache = TwoTierCache("test_two_tier", max_size=10, local_ttl=60, ttl=60, negative_ttl=60)
+    calls = []
+
+    def fetch(value):
+        def _fetch():
+            calls.append(value)
+            return value
+
+        return _fetch
+
+    assert cache.get_or_fetch("found", fetch("team")) == "team"
+    assert cache.get_or_fetch("found", fetch("other")) == "team"
+    assert cache.get_or_fetch("missing", fetch(None)) is None
+    assert cache.get_or_fetch("missing", fetch(None)) is None
+    assert calls == ["team", None]
+
+    cache.invalidate("found")
+    assert cache.get_or_fetch("found", fetch("other")) == "other"
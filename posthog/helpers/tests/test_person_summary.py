@@ -0,0 +1,38 @@
+from posthog.helpers.person_summary import get_person_summaries, get_person_summary
+from posthog.models import Person
+from posthog.test.base import BaseTest
+
+
+class TestPersonSummary(BaseTest):
+    def test_get_person_summaries(self):
+        person = Person.objects.create(
+            team=self.team,
+            distinct_ids=["first", "second"],
+            is_identified=True,
+            properties={"email": "tim@posthog.com", "plan": "free"},
+        )
+
+        with self.assertNumQueries(1):
+            summaries = get_person_summaries(self.team.pk, ["second", "first", "anonymous"])
+
+        self.assertEqual(
+            summaries["second"],
+            {
+                "id": person.pk,
+                "uuid": str(person.uuid),
+                "is_identified": True,
+                "distinct_id": "first",
+                "properties": {"email": "tim@posthog.com"},
+            },
+        )
+        self.assertEqual(summaries["first"], summaries["second"])
+        self.assertNotIn("anonymous", summaries)
+
+    def test_summaries_are_cached_including_missing_persons(self):
+        Person.objects.create(team=self.team, distinct_ids=["1"])
+        get_person_summaries(self.team.pk, ["1", "anonymous"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_person_summaries(self.team.pk, ["1", "anonymous"]).keys(), {"1"})
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_person_summary(self.team.pk, "2"))
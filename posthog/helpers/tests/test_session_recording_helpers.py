@@ -2,6 +2,8 @@ import pytest
 from pytest_mock import MockerFixture
 
 from posthog.helpers.session_recording import (
+    COMPRESSION_GZIP_BASE64,
+    COMPRESSION_ZLIB_UTF8_BASE64,
     compress_and_chunk_snapshots,
     decompress_chunked_snapshot_data,
     preprocess_session_recording_events,
@@ -47,7 +49,7 @@ def test_compression_and_chunking(snapshot_events, mocker: MockerFixture):
     mocker.patch("posthog.models.utils.UUIDT", return_value="0178495e-8521-0000-8e1c-2652fa57099b")
     mocker.patch("time.time", return_value=0)
 
-    assert list(compress_and_chunk_snapshots(snapshot_events)) == [
+    assert list(compress_and_chunk_snapshots(snapshot_events, compression=COMPRESSION_GZIP_BASE64)) == [
         {
             "event": "$snapshot",
             "properties": {
@@ -72,8 +74,34 @@ def test_decompression_results_in_same_data(snapshot_events):
         snapshot_events[0]["properties"]["$snapshot_data"],
         snapshot_events[1]["properties"]["$snapshot_data"],
     ]
-    assert len(list(compress_and_chunk_snapshots(snapshot_events, 100))) == 2
-    assert compress_and_decompress(snapshot_events, 100) == [
+    assert len(list(compress_and_chunk_snapshots(snapshot_events, 50))) == 2
+    assert compress_and_decompress(snapshot_events, 50) == [
+        snapshot_events[0]["properties"]["$snapshot_data"],
+        snapshot_events[1]["properties"]["$snapshot_data"],
+    ]
+
+
+def test_compresses_with_utf8_zlib_by_default(snapshot_events):
+    chunks = list(compress_and_chunk_snapshots(snapshot_events))
+    assert [chunk["properties"]["$snapshot_data"]["compression"] for chunk in chunks] == [COMPRESSION_ZLIB_UTF8_BASE64]
+    assert compress_and_decompress(snapshot_events, 10) == [
+        snapshot_events[0]["properties"]["$snapshot_data"],
+        snapshot_events[1]["properties"]["$snapshot_data"],
+    ]
+
+
+def test_decompresses_legacy_chunks(snapshot_events):
+    legacy_chunks = [
+        {
+            "chunk_count": 1,
+            "chunk_id": "0178495e-8521-0000-8e1c-2652fa57099b",
+            "chunk_index": 0,
+            "compression": "gzip-base64",
+            "data": "H4sIAAAAAAAC//v/L5qhmkGJoYShkqGAIRXIsmJQYDBi0AGSSgxpDPlACBFTYkhiSGQoAtK1YFlMXcZYdVUB5UuAOkH6YhkAxKw6nnAAAAA=",
+            "has_full_snapshot": True,
+        }
+    ]
+    assert list(decompress_chunked_snapshot_data(1, "someid", legacy_chunks)) == [
         snapshot_events[0]["properties"]["$snapshot_data"],
         snapshot_events[1]["properties"]["$snapshot_data"],
     ]
@@ -115,6 +143,20 @@ def test_decompress_ignores_if_not_enough_chunks(snapshot_events):
     assert list(decompress_chunked_snapshot_data(1, "someid", snapshot_data)) == complete_snapshots
 
 
+def test_decompress_yields_chunks_as_soon_as_complete(snapshot_events):
+    first_batch = [
+        event["properties"]["$snapshot_data"] for event in compress_and_chunk_snapshots(snapshot_events, 100)
+    ]
+    unchunked = {"type": 3, "foo": "unchunked"}
+    snapshot_data = iter([*first_batch, unchunked, {"chunk_id": "never_complete", "chunk_index": 0, "chunk_count": 2}])
+
+    decompressed = decompress_chunked_snapshot_data(1, "someid", snapshot_data)
+    assert next(decompressed) == snapshot_events[0]["properties"]["$snapshot_data"]
+    assert next(decompressed) == snapshot_events[1]["properties"]["$snapshot_data"]
+    assert next(decompressed) == unchunked
+    assert list(decompressed) == []
+
+
 @pytest.fixture
 def snapshot_events():
     return [
@@ -0,0 +1,36 @@
+import threading
+
+from posthog.helpers.single_flight import is_locked, redis_lock, wait_for
+
+
+def test_redis_lock_is_exclusive_across_threads():
+    results = []
+
+    with redis_lock("test_single_flight", timeout=10) as acquired:
+        assert acquired
+        assert is_locked("test_single_flight")
+
+        def try_lock():
+            with redis_lock("test_single_flight", timeout=10) as acquired_elsewhere:
+                results.append(acquired_elsewhere)
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+
+    assert results == [False]
+    assert not is_locked("test_single_flight")
+
+
+def test_redis_lock_is_reentrant_within_a_thread():
+    with redis_lock("test_single_flight_reentrant", timeout=10) as acquired:
+        with redis_lock("test_single_flight_reentrant", timeout=10) as acquired_again:
+            assert acquired and acquired_again
+        assert is_locked("test_single_flight_reentrant")
+    assert not is_locked("test_single_flight_reentrant")
+
+
+def test_wait_for():
+    values = iter([None, None, "done"])
+    assert wait_for(lambda: next(values), timeout=5, poll_interval=0) == "done"
+    assert wait_for(lambda: None, timeout=0) is None
@@ -0,0 +1,157 @@
+"""
+In-process aggregation of internal metrics.
+
+Capturing an event per `timing`/`gauge`/`incr` call made instrumentation about as expensive to ingest as what it
+measures, so values are aggregated per (kind, metric, tags) series instead, and a background thread captures one
+summary event per series every INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from sentry_sdk import capture_exception
+from statshog.client.base import Tags
+from statshog.defaults.django import statsd
+
+from posthog import utils
+
+TIMING = "timing"
+GAUGE = "gauge"
+COUNTER = "counter"
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+# Counts values dropped because there were too many series at once
+DROPPED_METRIC = "internal_metrics_dropped"
+
+SeriesKey = Tuple[str, str, Tuple[Tuple[str, Any], ...]]
+
+
+class Series:
+    __slots__ = ("count", "sum", "min", "max", "last", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum: float = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+        self.samples: List[float] = []
+
+    def add(self, value: float, max_samples: int) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+        # Reservoir sampling, so that percentiles are estimated from a uniform sample of all values
+        if len(self.samples) < max_samples:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < max_samples:
+                self.samples[index] = value
+
+    def summary(self, kind: str) -> Dict[str, Any]:
+        if kind == COUNTER:
+            return {"value": self.sum, "count": self.count}
+        if kind == GAUGE:
+            return {"value": self.last, "count": self.count, "min": self.min, "max": self.max}
+
+        samples = sorted(self.samples)
+        return {
+            "value": self.sum / self.count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            **{name: samples[min(len(samples) - 1, int(q * len(samples)))] for name, q in PERCENTILES.items()},
+        }
+
+
+class MetricsAggregator:
+    def __init__(self, max_series: int, max_samples: int) -> None:
+        self.max_series = max_series
+        self.max_samples = max_samples
+        self.dropped = 0
+        self._series: Dict[SeriesKey, Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, metric_name: str, value: float, tags: Tags) -> None:
+        key = (kind, metric_name, tuple(sorted((tags or {}).items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    self.dropped += 1
+                    return
+                series = self._series[key] = Series()
+            series.add(value, self.max_samples)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        "Summary events of all series aggregated since the last drain."
+        with self._lock:
+            series, self._series = self._series, {}
+            dropped, self.dropped = self.dropped, 0
+
+        events = [
+            {"event": f"$${metric_name}", "properties": {**series.summary(kind), **dict(tags)}}
+            for (kind, metric_name, tags), series in series.items()
+        ]
+        if dropped:
+            statsd.incr(DROPPED_METRIC, dropped)
+            events.append({"event": f"$${DROPPED_METRIC}", "properties": {"value": dropped}})
+        return events
+
+
+_aggregator: Optional[MetricsAggregator] = None
+_aggregator_pid: Optional[int] = None
+_setup_lock = threading.Lock()
+
+
+def record(kind: str, metric_name: str, value: float, tags: Tags) -> None:
+    _get_aggregator().record(kind, metric_name, value, tags)
+
+
+def flush() -> None:
+    "Capture the summaries of everything aggregated in this process so far."
+    from posthog.api.capture import capture_internal_batch
+    from posthog.internal_metrics.team import get_internal_metrics_team_id
+
+    events = _get_aggregator().drain()
+    team_id = get_internal_metrics_team_id()
+    if events and team_id is not None:
+        now = timezone.now()
+        distinct_id = utils.get_machine_id()
+        capture_internal_batch([(event, distinct_id) for event in events], None, None, now, now, team_id)
+
+
+def _get_aggregator() -> MetricsAggregator:
+    global _aggregator, _aggregator_pid
+
+    # Neither aggregated values nor the flushing thread survive forking (e.g. into gunicorn and celery workers)
+    if _aggregator_pid != os.getpid():
+        with _setup_lock:
+            if _aggregator_pid != os.getpid():
+                _aggregator = MetricsAggregator(
+                    settings.INTERNAL_METRICS_MAX_SERIES, settings.INTERNAL_METRICS_MAX_SAMPLES
+                )
+                _aggregator_pid = os.getpid()
+                if not settings.TEST:
+                    threading.Thread(target=_flush_periodically, name="internal-metrics", daemon=True).start()
+                    atexit.register(flush)
+    return _aggregator  # type: ignore
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(settings.INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS)
+        try:
+            flush()
+        except Exception:
+            capture_exception()
@@ -11,6 +11,8 @@ from posthog.models.dashboard import Dashboard
 from posthog.models.dashboard_item import DashboardItem
 
 NAME = "Posthog Internal Metrics"
+# Percentiles are calculated per process and flush (see `aggregator`), they can't be combined into the percentiles of
+# all values. Charts show the highest of them instead, an upper bound of the real percentile.
 CLICKHOUSE_DASHBOARD = {
     "name": "Clickhouse internal dashboard",
     "items": [
@@ -23,6 +25,8 @@ CLICKHOUSE_DASHBOARD = {
                         "name": "insights loaded",
                         "type": "events",
                         "order": 0,
+                        "math": "sum",
+                        "math_property": "count",
                         "properties": [{"key": "success", "type": "event", "value": ["true"], "operator": "exact"}],
                     },
                     {
@@ -30,6 +34,8 @@ CLICKHOUSE_DASHBOARD = {
                         "name": "insights loaded",
                         "type": "events",
                         "order": 1,
+                        "math": "sum",
+                        "math_property": "count",
                         "properties": [{"key": "success", "type": "event", "value": ["false"], "operator": "exact"}],
                     },
                 ],
@@ -55,21 +61,21 @@ CLICKHOUSE_DASHBOARD = {
                     },
                     {
                         "id": "$$insight_load_time",
-                        "math": "p90",
+                        "math": "max",
                         "name": "Load time (p90)",
                         "type": "events",
                         "order": 1,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p90",
                     },
                     {
                         "id": "$$insight_load_time",
-                        "math": "p95",
+                        "math": "max",
                         "name": "Load time (p95)",
                         "type": "events",
                         "order": 2,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p95",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -88,6 +94,8 @@ CLICKHOUSE_DASHBOARD = {
                         "name": "insight timeout",
                         "type": "events",
                         "order": 0,
+                        "math": "sum",
+                        "math_property": "value",
                         "properties": [],
                     },
                 ],
@@ -107,7 +115,8 @@ CLICKHOUSE_DASHBOARD = {
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "events",
                         "order": 0,
-                        "math": "total",
+                        "math": "sum",
+                        "math_property": "count",
                     }
                 ],
                 "display": "ActionsLineGraph",
@@ -132,21 +141,21 @@ CLICKHOUSE_DASHBOARD = {
                     },
                     {
                         "id": "$$clickhouse_sync_execution_time",
-                        "math": "p90",
+                        "math": "max",
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "events",
                         "order": 1,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p90",
                     },
                     {
                         "id": "$$clickhouse_sync_execution_time",
-                        "math": "p95",
+                        "math": "max",
                         "name": "$$clickhouse_sync_execution_time",
                         "type": "events",
                         "order": 2,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "p95",
                     },
                 ],
                 "display": "ActionsLineGraph",
@@ -167,7 +176,7 @@ CLICKHOUSE_DASHBOARD = {
                         "type": "events",
                         "order": 0,
                         "properties": [],
-                        "math_property": "value",
+                        "math_property": "sum",
                     },
                 ],
                 "display": "ActionsLineGraph",
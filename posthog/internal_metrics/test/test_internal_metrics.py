@@ -1,3 +1,4 @@
+from typing import Dict, List
 from unittest import mock
 
 import pytest
@@ -5,7 +6,7 @@ from django.conf import settings
 from pytest_mock import MockFixture
 from pytest_mock.plugin import MockerFixture
 
-from posthog.internal_metrics import gauge, incr, timing
+from posthog.internal_metrics import aggregator, gauge, incr, timing
 from posthog.internal_metrics.team import (
     CLICKHOUSE_DASHBOARD,
     NAME,
@@ -21,46 +22,49 @@ def mock_capture_internal(mocker: MockerFixture):
     get_internal_metrics_team_id.cache_clear()
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", True)
     mocker.patch("posthog.utils.get_machine_id", return_value="machine_id")
-    yield mocker.patch("posthog.api.capture.capture_internal")
+    aggregator._get_aggregator().drain()
+    yield mocker.patch("posthog.api.capture.capture_internal_batch")
 
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
     get_internal_metrics_team_id.cache_clear()
 
 
+def _captured_events(mock_capture_internal) -> List[Dict]:
+    aggregator.flush()
+    return [event for call in mock_capture_internal.call_args_list for event, _ in call[0][0]]
+
+
 def test_methods_capture_enabled(db, mock_capture_internal):
     timing("foo_metric", 100, tags={"team_id": 15})
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
 
-    mock_capture_internal.assert_any_call(
-        {"event": "$$foo_metric", "properties": {"value": 100, "team_id": 15}},
-        "machine_id",
-        None,
-        None,
-        mock.ANY,
-        mock.ANY,
-        get_internal_metrics_team_id(),
-    )
-
-    mock_capture_internal.assert_any_call(
-        {"event": "$$bar_metric", "properties": {"value": 20, "team_id": 15}},
-        "machine_id",
-        None,
-        None,
-        mock.ANY,
-        mock.ANY,
-        get_internal_metrics_team_id(),
-    )
+    aggregator.flush()
 
-    mock_capture_internal.assert_any_call(
-        {"event": "$$zeta_metric", "properties": {"value": 1}},
-        "machine_id",
-        None,
-        None,
-        mock.ANY,
-        mock.ANY,
-        get_internal_metrics_team_id(),
+    mock_capture_internal.assert_called_once_with(
+        mock.ANY, None, None, mock.ANY, mock.ANY, get_internal_metrics_team_id(),
     )
+    events = mock_capture_internal.call_args[0][0]
+    assert {distinct_id for _, distinct_id in events} == {"machine_id"}
+    assert [event for event, _ in events] == [
+        {
+            "event": "$$foo_metric",
+            "properties": {
+                "value": 100,
+                "count": 1,
+                "sum": 100,
+                "min": 100,
+                "max": 100,
+                "p50": 100,
+                "p90": 100,
+                "p95": 100,
+                "p99": 100,
+                "team_id": 15,
+            },
+        },
+        {"event": "$$bar_metric", "properties": {"value": 20, "count": 1, "min": 20, "max": 20, "team_id": 15}},
+        {"event": "$$zeta_metric", "properties": {"value": 1, "count": 1}},
+    ]
 
 
 def test_methods_capture_disabled(db, mock_capture_internal, mocker: MockerFixture):
@@ -70,9 +74,55 @@ def test_methods_capture_disabled(db, mock_capture_internal, mocker: MockerFixtu
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
 
+    aggregator.flush()
+
     mock_capture_internal.assert_not_called()
 
 
+def test_values_are_aggregated_per_series(db, mock_capture_internal):
+    for ms in range(1, 101):
+        timing("foo_metric", ms, tags={"kind": "request"})
+    timing("foo_metric", 1000, tags={"kind": "celery"})
+    for _ in range(3):
+        incr("zeta_metric", 2)
+        gauge("bar_metric", 5)
+    gauge("bar_metric", 7)
+
+    events = {
+        (event["event"], event["properties"].get("kind")): event["properties"]
+        for event in _captured_events(mock_capture_internal)
+    }
+
+    assert len(events) == 4
+    request_timings = events[("$$foo_metric", "request")]
+    assert request_timings["count"] == 100
+    assert request_timings["value"] == 50.5
+    assert (request_timings["min"], request_timings["max"]) == (1, 100)
+    assert (request_timings["p50"], request_timings["p90"], request_timings["p99"]) == (51, 91, 100)
+    assert events[("$$foo_metric", "celery")]["count"] == 1
+    assert events[("$$zeta_metric", None)] == {"value": 6, "count": 3}
+    assert events[("$$bar_metric", None)]["value"] == 7
+
+    aggregator.flush()
+    assert mock_capture_internal.call_count == 1
+
+
+def test_series_beyond_the_limit_are_dropped(db, mock_capture_internal, mocker: MockerFixture):
+    mocker.patch.object(aggregator._get_aggregator(), "max_series", 2)
+
+    for team_id in range(5):
+        incr("zeta_metric", tags={"team_id": team_id})
+    incr("zeta_metric", tags={"team_id": 0})
+
+    events = _captured_events(mock_capture_internal)
+
+    assert [event["properties"] for event in events if event["event"] == "$$zeta_metric"] == [
+        {"value": 2, "count": 2, "team_id": 0},
+        {"value": 1, "count": 1, "team_id": 1},
+    ]
+    assert {"event": "$$internal_metrics_dropped", "properties": {"value": 3}} in events
+
+
 def test_get_internal_metrics_team_id_with_capture_disabled(db, django_assert_num_queries, mocker: MockerFixture):
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
 
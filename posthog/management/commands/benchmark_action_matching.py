@@ -0,0 +1,103 @@
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posthog.models import Action, ActionStep, Element, Event, Organization, Team
+from posthog.models.action_matcher import get_team_action_matcher
+
+PATHS = ["/", "/pricing", "/docs/actions", "/signup"]
+URLS = [f"https://example.com{path}" for path in PATHS]
+
+
+class Rollback(Exception):
+    pass
+
+
+def _create_actions(team: Team, count: int) -> List[Action]:
+    # A mix of the kinds of steps actions usually have
+    step_kinds: List[Callable[[int], Dict[str, Any]]] = [
+        lambda index: {"event": "$pageview", "url": random.choice(PATHS)},
+        lambda index: {"event": "$pageview", "url": r"/docs/\w+", "url_matching": ActionStep.REGEX},
+        lambda index: {"event": "$autocapture", "selector": f"div > button.variant-{index % 10}"},
+        lambda index: {"event": "$autocapture", "tag_name": "button", "text": f"Sign up {index % 10}"},
+        lambda index: {"event": f"custom event {index % 20}", "properties": [{"key": "plan", "value": "paid"}]},
+    ]
+    actions = []
+    for index in range(count):
+        action = Action.objects.create(team=team, name=f"action {index}")
+        ActionStep.objects.create(action=action, **random.choice(step_kinds)(index))
+        actions.append(action)
+    return actions
+
+
+def _create_events(team: Team, count: int) -> List[Event]:
+    events = []
+    for index in range(count):
+        if index % 2:
+            events.append(
+                Event.objects.create(
+                    team=team,
+                    event="$autocapture",
+                    distinct_id=f"user {index}",
+                    properties={"$current_url": random.choice(URLS)},
+                    elements=[
+                        Element(tag_name="button", attr_class=[f"variant-{index % 10}"], text=f"Sign up {index % 10}"),
+                        Element(tag_name="div"),
+                    ],
+                )
+            )
+        else:
+            events.append(
+                Event.objects.create(
+                    team=team,
+                    event=random.choice(["$pageview", f"custom event {index % 20}"]),
+                    distinct_id=f"user {index}",
+                    properties={"$current_url": random.choice(URLS), "plan": random.choice(["free", "paid"])},
+                )
+            )
+    return events
+
+
+def _events_per_second(method: Callable[[Event], List[Action]], events: List[Event]) -> float:
+    started_at = time.perf_counter()
+    for event in events:
+        method(event)
+    return len(events) / (time.perf_counter() - started_at)
+
+
+# ex: python manage.py benchmark_action_matching --actions 100 --events 500
+class Command(BaseCommand):
+    help = "Compare matching events to actions in the database and in memory, in a transaction that is rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--actions", default=100, type=int, help="Actions of the team")
+        parser.add_argument("--events", default=500, type=int, help="Events matched per method")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                organization = Organization.objects.create(name="Action matching benchmark")
+                team = Team.objects.create(organization=organization, name="Action matching benchmark")
+                actions = _create_actions(team, options["actions"])
+                events = _create_events(team, options["events"])
+
+                def query_database(event: Event) -> List[Action]:
+                    return [
+                        action
+                        for action in actions
+                        if Event.objects.filter(pk=event.pk).query_db_by_action(action).exists()
+                    ]
+
+                def match_in_memory(event: Event) -> List[Action]:
+                    return event.actions
+
+                get_team_action_matcher(team.pk)  # Compile the actions
+                print(f"{len(actions)} actions, {len(events)} events:")
+                for name, method in {"database query per action": query_database, "in memory": match_in_memory}.items():
+                    print(f"  {name:>26}: {_events_per_second(method, events):10.1f} events/s")
+                raise Rollback()
+        except Rollback:
+            pass
@@ -0,0 +1,93 @@
+import json
+import random
+import timeit
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+
+from posthog.helpers.session_recording import (
+    COMPRESSION_GZIP_BASE64,
+    COMPRESSION_ZLIB_UTF8_BASE64,
+    compress_and_chunk_snapshots,
+    decompress_chunked_snapshot_data,
+)
+
+
+def _snapshot_events(dom_nodes: int, incremental_snapshots: int) -> List[Dict]:
+    # A full snapshot of the page followed by mouse move incremental snapshots, as sent by rrweb
+    full_snapshot = {
+        "type": 2,
+        "timestamp": 1_600_000_000_000,
+        "data": {
+            "node": {
+                "type": 0,
+                "childNodes": [
+                    {
+                        "type": 2,
+                        "tagName": "div",
+                        "attributes": {"class": f"row row-{index} flex"},
+                        "childNodes": [{"type": 3, "textContent": f"Item {index}: Ünïcödé text of the page"}],
+                    }
+                    for index in range(dom_nodes)
+                ],
+            }
+        },
+    }
+    incremental = [
+        {
+            "type": 3,
+            "timestamp": 1_600_000_000_000 + index * 50,
+            "data": {
+                "source": 1,
+                "positions": [
+                    {"x": random.randint(0, 1920), "y": random.randint(0, 1080), "id": random.randint(1, dom_nodes)}
+                    for _ in range(5)
+                ],
+            },
+        }
+        for index in range(incremental_snapshots)
+    ]
+    return [
+        {"event": "$snapshot", "properties": {"$session_id": "1234", "distinct_id": "abc123", "$snapshot_data": data}}
+        for data in [full_snapshot, *incremental]
+    ]
+
+
+SHAPES = {
+    "small page (200 nodes, 1k incremental)": lambda: _snapshot_events(200, 1_000),
+    "large page (5k nodes, 20k incremental)": lambda: _snapshot_events(5_000, 20_000),
+}
+
+
+# ex: python manage.py benchmark_session_recording_compression --iterations 5
+class Command(BaseCommand):
+    help = "Compare session recording compression formats on ingest time, stored size and playback decode time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", default=5, type=int, help="Compress/decompress runs per format and shape")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        for shape_name, make_events in SHAPES.items():
+            events = make_events()
+            print(f"{shape_name}:")
+            for compression in (COMPRESSION_GZIP_BASE64, COMPRESSION_ZLIB_UTF8_BASE64):
+                chunks = [
+                    event["properties"]["$snapshot_data"]
+                    for event in compress_and_chunk_snapshots(events, compression=compression)
+                ]
+                stored_size = sum(len(json.dumps(chunk)) for chunk in chunks)
+                ingest_time = (
+                    timeit.timeit(
+                        lambda: list(compress_and_chunk_snapshots(events, compression=compression)), number=iterations
+                    )
+                    / iterations
+                )
+                decode_time = (
+                    timeit.timeit(lambda: list(decompress_chunked_snapshot_data(0, "1234", chunks)), number=iterations)
+                    / iterations
+                )
+                print(
+                    f"  {compression:>18}: {stored_size / 1024:10.1f} KiB in {len(chunks)} chunks, "
+                    f"ingest {ingest_time * 1000:8.2f} ms, decode {decode_time * 1000:8.2f} ms"
+                )
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0161_property_defs_search"),
+    ]
+
+    operations = [
+        migrations.AddField(model_name="cohort", name="version", field=models.IntegerField(default=0),),
+        migrations.AddField(
+            model_name="cohort", name="precalculated_version", field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="cohort", name="precalculated_at", field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
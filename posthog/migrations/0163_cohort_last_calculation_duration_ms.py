@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0162_cohort_precalculated_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cohort", name="last_calculation_duration_ms", field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
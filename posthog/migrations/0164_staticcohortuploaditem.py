@@ -0,0 +1,24 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0163_cohort_last_calculation_duration_ms"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StaticCohortUploadItem",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("value", models.TextField()),
+                ("cohort", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="posthog.cohort")),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="staticcohortuploaditem",
+            index=models.Index(fields=["cohort_id", "id"], name="posthog_sta_cohort__e0737e_idx"),
+        ),
+    ]
@@ -0,0 +1,12 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0164_staticcohortuploaditem"),
+    ]
+
+    operations = [
+        migrations.AddField(model_name="cohort", name="staged_upload_count", field=models.IntegerField(default=0),),
+    ]
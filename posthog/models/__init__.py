@@ -1,7 +1,7 @@
 from .action import Action
 from .action_step import ActionStep
 from .annotation import Annotation
-from .cohort import Cohort, CohortPeople
+from .cohort import Cohort, CohortPeople, StaticCohortUploadItem
 from .dashboard import Dashboard
 from .dashboard_item import DashboardItem
 from .element import Element
@@ -53,6 +53,7 @@ __all__ = [
     "PropertyDefinition",
     "SessionRecordingEvent",
     "SessionsFilter",
+    "StaticCohortUploadItem",
     "Team",
     "User",
     "UserManager",
@@ -123,9 +123,15 @@ class Action(models.Model):
 
 @receiver(post_save, sender=Action)
 def action_saved(sender, instance: Action, created, **kwargs):
+    from .action_matcher import bump_team_actions_version
+
+    bump_team_actions_version(instance.team_id)
     get_client().publish("reload-action", json.dumps({"teamId": instance.team_id, "actionId": instance.id}))
 
 
 @receiver(post_delete, sender=Action)
 def action_deleted(sender, instance: Action, **kwargs):
+    from .action_matcher import bump_team_actions_version
+
+    bump_team_actions_version(instance.team_id)
     get_client().publish("drop-action", json.dumps({"teamId": instance.team_id, "actionId": instance.id}))
@@ -0,0 +1,411 @@
+"""
+Matching events to the actions of their team in Python.
+
+The steps of a team's actions are compiled into predicates, which are kept in process until any action of the team
+changes. Finding the actions an event matches then doesn't need a query per action, nor one per event. Predicates
+follow the semantics of `EventManager.query_db_by_action`; only persons and cohorts are looked up in the database,
+and only for steps that filter on them.
+"""
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from sentry_sdk import capture_exception
+
+from posthog.helpers.cache import LRUTTLCache
+from posthog.utils import is_valid_regex
+
+from .action import Action
+from .action_step import ActionStep
+from .filters import Filter
+from .person import Person
+from .property import Property
+
+logger = logging.getLogger(__name__)
+
+# Anything with the attributes of an `Element`: `Element` instances or elements parsed from an elements chain
+ElementLike = Any
+
+# Compiled matchers are checked against the team's actions version on every use, the TTL is only a safety net
+MATCHERS_CACHE_SIZE = 1_000
+MATCHERS_CACHE_TTL = 60 * 60
+
+
+class MatchContext:
+    """An event to match, with its person and elements only looked up when a step needs them."""
+
+    def __init__(
+        self,
+        team_id: int,
+        event: Optional[str],
+        distinct_id: str,
+        properties: Dict[str, Any],
+        get_elements: Callable[[], Sequence[ElementLike]],
+    ) -> None:
+        self.team_id = team_id
+        self.event = event
+        self.distinct_id = distinct_id
+        self.properties = properties or {}
+        self._get_elements = get_elements
+        self._elements: Optional[Sequence[ElementLike]] = None
+        self._person: Optional[Tuple[Optional[int], Dict[str, Any]]] = None
+        self._cohorts: Dict[int, bool] = {}
+
+    @property
+    def elements(self) -> Sequence[ElementLike]:
+        if self._elements is None:
+            self._elements = self._get_elements()
+        return self._elements
+
+    @property
+    def person_id(self) -> Optional[int]:
+        return self._load_person()[0]
+
+    @property
+    def person_properties(self) -> Dict[str, Any]:
+        return self._load_person()[1]
+
+    def in_cohort(self, cohort_id: int) -> bool:
+        from .cohort import CohortPeople
+
+        if cohort_id not in self._cohorts:
+            self._cohorts[cohort_id] = (
+                self.person_id is not None
+                and CohortPeople.objects.filter(cohort_id=cohort_id, person_id=self.person_id).exists()
+            )
+        return self._cohorts[cohort_id]
+
+    def _load_person(self) -> Tuple[Optional[int], Dict[str, Any]]:
+        if self._person is None:
+            person = (
+                Person.objects.filter(
+                    team_id=self.team_id,
+                    persondistinctid__team_id=self.team_id,
+                    persondistinctid__distinct_id=self.distinct_id,
+                )
+                .values_list("id", "properties")
+                .first()
+            )
+            self._person = (person[0], person[1] or {}) if person else (None, {})
+        return self._person
+
+
+Predicate = Callable[[MatchContext], bool]
+
+
+class ActionMatcher:
+    """The steps of a set of actions (with their steps prefetched), compiled."""
+
+    def __init__(self, actions: Sequence[Action]) -> None:
+        self._positions: Dict[int, int] = {}
+        self._steps_by_event: Dict[Optional[str], List[Tuple[Action, Predicate]]] = defaultdict(list)
+        for position, action in enumerate(actions):
+            self._positions[id(action)] = position
+            for step in action.steps.all():
+                # A step that can't be compiled never matches, rather than keeping the other actions from matching
+                try:
+                    predicate = compile_step(step)
+                except Exception as err:
+                    logger.warning("Could not compile step %s of action %s: %s", step.pk, action.pk, err)
+                    capture_exception(err)
+                    continue
+                self._steps_by_event[step.event or None].append((action, predicate))
+
+    def match(self, context: MatchContext) -> List[Action]:
+        "Actions with any step the event matches, in the order they were given."
+        matched: Dict[int, Action] = {}
+        for steps in (self._steps_by_event.get(context.event, []), self._steps_by_event.get(None, [])):
+            for action, predicate in steps:
+                if id(action) not in matched and _safe_match(action, predicate, context):
+                    matched[id(action)] = action
+        return sorted(matched.values(), key=lambda action: self._positions[id(action)])
+
+
+def _safe_match(action: Action, predicate: Predicate, context: MatchContext) -> bool:
+    try:
+        return predicate(context)
+    except Exception as err:
+        logger.warning("Could not match an event to action %s: %s", action.pk, err)
+        capture_exception(err)
+        return False
+
+
+_team_matchers: LRUTTLCache[Tuple[int, ActionMatcher]] = LRUTTLCache(
+    max_size=MATCHERS_CACHE_SIZE, ttl=MATCHERS_CACHE_TTL
+)
+
+
+def get_team_action_matcher(team_id: int) -> ActionMatcher:
+    version = get_team_actions_version(team_id)
+    cached = _team_matchers.get(team_id)
+    if cached is None or cached[0] != version:
+        actions = (
+            Action.objects.filter(team_id=team_id, deleted=False)
+            .order_by("id")
+            .prefetch_related(Prefetch("steps", queryset=ActionStep.objects.order_by("id")))
+        )
+        cached = (version, ActionMatcher(list(actions)))
+        _team_matchers.set(team_id, cached)
+    return cached[1]
+
+
+def get_team_actions_version(team_id: int) -> int:
+    key = _version_key(team_id)
+    version = cache.get(key)
+    if version is None:
+        # Starting from the current time rather than 0, so that a version that got evicted isn't reused
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_team_actions_version(team_id: int) -> None:
+    "Make processes compile the actions of the team again, as they've changed."
+    key = _version_key(team_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def _version_key(team_id: int) -> str:
+    return f"team_actions_version:{team_id}"
+
+
+def compile_step(step: ActionStep) -> Predicate:
+    predicates: List[Predicate] = []
+    event = step.event
+    if event:
+        predicates.append(lambda context: context.event == event)
+
+    url = _compile_url(step)
+    if url is not None:
+        predicates.append(url)
+
+    elements = _compile_elements(
+        {"selector": step.selector, "tag_name": step.tag_name, "text": step.text, "href": step.href}
+    )
+    if elements is not None:
+        predicates.append(elements)
+
+    predicates.extend(_compile_properties(Filter(data={"properties": step.properties or []}).properties))
+    return lambda context: all(predicate(context) for predicate in predicates)
+
+
+def _compile_url(step: ActionStep) -> Optional[Predicate]:
+    if not step.url:
+        return None
+    if step.url_matching == ActionStep.EXACT:
+        url = step.url
+        return lambda context: _text(context.properties.get("$current_url")) == url
+    if step.url_matching == ActionStep.REGEX:
+        if not is_valid_regex(step.url):
+            return lambda context: False
+        pattern = re.compile(step.url)
+    else:
+        pattern = _like_to_regex(f"%{step.url}%")
+    return lambda context: _search(pattern, context.properties.get("$current_url"))
+
+
+def _compile_properties(properties: List[Property]) -> List[Predicate]:
+    # Cheapest first: event properties, then elements, then the person and its cohorts, which need queries
+    predicates: List[Predicate] = []
+    for prop in properties:
+        if prop.type == "event":
+            predicates.append(
+                lambda context, matches=_compile_operator(prop): matches(context.properties)  # type: ignore
+            )
+
+    element_properties = {prop.key: prop.value for prop in properties if prop.type == "element"}
+    elements = _compile_elements(element_properties) if element_properties else None
+    if elements is not None:
+        predicates.append(elements)
+
+    for prop in properties:
+        if prop.type == "person":
+            predicates.append(
+                lambda context, matches=_compile_operator(prop): matches(context.person_properties)  # type: ignore
+            )
+    for prop in properties:
+        if prop.type == "cohort":
+            cohort_id = int(prop._parse_value(prop.value))
+            predicates.append(lambda context, cohort_id=cohort_id: context.in_cohort(cohort_id))  # type: ignore
+    return predicates
+
+
+def _compile_operator(prop: Property) -> Callable[[Dict[str, Any]], bool]:
+    "Mirrors `Property.property_to_Q` on the properties of an event or person."
+    key, operator, value = prop.key, prop.operator, prop._parse_value(prop.value)
+
+    if operator == "is_not":
+        equals = _compile_equals(value)
+        return lambda properties: not (key in properties and equals(properties[key]))
+    if operator == "is_set":
+        return lambda properties: key in properties
+    if operator == "is_not_set":
+        return lambda properties: key not in properties
+    # Values that look like numbers are parsed as such, while patterns are text
+    if operator in ("regex", "not_regex") and not is_valid_regex(str(value)):
+        return lambda properties: False
+    if isinstance(operator, str) and operator.startswith("not_"):
+        lookup = _compile_lookup(operator[4:], value)
+        return lambda properties: properties.get(key) is None or not lookup(properties[key])
+    if operator == "exact" or operator is None:
+        equals = _compile_equals(value)
+        return lambda properties: key in properties and equals(properties[key])
+
+    lookup = _compile_lookup(operator, value)
+    return lambda properties: properties.get(key) is not None and lookup(properties[key])
+
+
+def _compile_equals(value: Any) -> Callable[[Any], bool]:
+    # Equality of JSON values, where 1 is neither true nor "1"
+    values = value if isinstance(value, list) else [value]
+    return lambda candidate: any(_json_equal(candidate, value) for value in values)
+
+
+def _compile_lookup(operator: str, value: Any) -> Callable[[Any], bool]:
+    if operator == "icontains":
+        needle = (_text(value) or "").lower()
+        return lambda candidate: needle in (_text(candidate) or "").lower()
+    if operator == "regex":
+        pattern = re.compile(str(value))
+        return lambda candidate: _search(pattern, candidate)
+    if operator in ("gt", "gte", "lt", "lte"):
+        compare = {
+            "gt": lambda a, b: a > b,
+            "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b,
+            "lte": lambda a, b: a <= b,
+        }[operator]
+        return lambda candidate: compare(_jsonb_sort_key(candidate), _jsonb_sort_key(value))
+    # Lookups the database doesn't know either, so that nothing would match
+    return lambda candidate: False
+
+
+def _compile_elements(filters: Dict[str, Any]) -> Optional[Predicate]:
+    "Mirrors `EventManager.filter_by_element`."
+    from .event import Selector
+
+    parts = Selector(filters["selector"]).parts if filters.get("selector") else []
+    conditions: Dict[str, set] = {}
+    for key in ["tag_name", "text", "href"]:
+        values = filters.get(key)
+        if not values:
+            continue
+        values = values if isinstance(values, list) else [values]
+        if len(values) == 0:
+            continue
+        conditions[key] = set(values)
+
+    if not parts and not conditions:
+        return None
+
+    def matches(context: MatchContext) -> bool:
+        elements = context.elements
+        if conditions and not any(
+            all(getattr(element, key) in values for key, values in conditions.items()) for element in elements
+        ):
+            return False
+        return _matches_selector(parts, elements)
+
+    return matches
+
+
+def _matches_selector(parts: List[Any], elements: Sequence[ElementLike]) -> bool:
+    # Each part matches the `unique_order`th matching element, counting from the clicked one. Ancestors come after
+    # the elements nested in them, right after if the part is a direct descendant
+    previous_order = -1
+    for index, part in enumerate(parts):
+        orders = sorted(
+            _element_order(element, position)
+            for position, element in enumerate(elements)
+            if _matches_selector_part(part.data, element)
+        )
+        if len(orders) <= part.unique_order:
+            return False
+        order = orders[part.unique_order]
+        if index > 0 and (order != previous_order + 1 if part.direct_descendant else order <= previous_order):
+            return False
+        previous_order = order
+    return True
+
+
+def _matches_selector_part(data: Dict[str, Any], element: ElementLike) -> bool:
+    for key, value in data.items():
+        if "attr__" in key:
+            attribute = (element.attributes or {}).get(f"attr__{key.split('attr__')[1]}")
+            if attribute is None or _text(attribute) != value:
+                return False
+        elif key.endswith("__contains"):
+            classes = getattr(element, key[: -len("__contains")])
+            if classes is None or not set(value).issubset(classes):
+                return False
+        else:
+            field = getattr(element, key)
+            if field is None or str(field) != str(value):
+                return False
+    return True
+
+
+def _element_order(element: ElementLike, position: int) -> int:
+    return element.order if element.order is not None else position
+
+
+def _like_to_regex(pattern: str) -> "re.Pattern":
+    regex = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            regex.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            regex.append(".*")
+        elif char == "_":
+            regex.append(".")
+        else:
+            regex.append(re.escape(char))
+    return re.compile(f"^{''.join(regex)}$", re.DOTALL)
+
+
+def _search(pattern: "re.Pattern", value: Any) -> bool:
+    return value is not None and pattern.search(_text(value) or "") is not None
+
+
+def _text(value: Any) -> Optional[str]:
+    "A JSON value as text, like `->>` in Postgres."
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    return a == b
+
+
+# Postgres orders JSON values of different types as object > array > boolean > number > string > null
+_JSONB_TYPE_ORDER: List[Tuple[type, int]] = [
+    (type(None), 0),
+    (str, 1),
+    (bool, 3),
+    (int, 2),
+    (float, 2),
+    (list, 4),
+    (dict, 5),
+]
+
+
+def _jsonb_sort_key(value: Any) -> Tuple[int, Any]:
+    rank = next((rank for json_type, rank in _JSONB_TYPE_ORDER if isinstance(value, json_type)), 0)
+    if rank in (0, 4, 5):
+        return rank, json.dumps(value, sort_keys=True)
+    return rank, value
@@ -33,6 +33,9 @@ class ActionStep(models.Model):
 
 @receiver(post_save, sender=ActionStep)
 def action_step_saved(sender, instance: ActionStep, created, **kwargs):
+    from .action_matcher import bump_team_actions_version
+
+    bump_team_actions_version(instance.action.team_id)
     get_client().publish(
         "reload-action", json.dumps({"teamId": instance.action.team_id, "actionId": instance.action.id})
     )
@@ -40,6 +43,9 @@ def action_step_saved(sender, instance: ActionStep, created, **kwargs):
 
 @receiver(post_delete, sender=ActionStep)
 def action_step_deleted(sender, instance: ActionStep, **kwargs):
+    from .action_matcher import bump_team_actions_version
+
+    bump_team_actions_version(instance.action.team_id)
     get_client().publish(
         "reload-action", json.dumps({"teamId": instance.action.team_id, "actionId": instance.action.id})
     )
@@ -1,11 +1,17 @@
+import copy
+import csv
+import io
+import itertools
+import logging
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.exceptions import EmptyResultSet
 from django.db import connection, models, transaction
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.db.models.expressions import F
 from django.utils import timezone
 from sentry_sdk import capture_exception
@@ -18,8 +24,42 @@ from .event import Event
 from .filters import Filter
 from .person import Person
 
-DELETE_QUERY = """
-DELETE FROM "posthog_cohortpeople" WHERE "cohort_id" = {cohort_id};
+logger = logging.getLogger(__name__)
+
+# People added to or removed from a cohort at once when it's calculated
+CALCULATION_BATCH_SIZE = 10_000
+
+# Uploaded distinct_ids copied into Postgres at once, and added to the cohort at once
+STAGING_BATCH_SIZE = 100_000
+INSERT_STAGED_BATCH_SIZE = 50_000
+
+STAGE_QUERY = """
+COPY "posthog_staticcohortuploaditem" ("cohort_id", "value") FROM STDIN WITH (FORMAT csv)
+"""
+
+# Takes a batch of staged rows off, and inserts the people they match that aren't in the cohort yet
+INSERT_STAGED_QUERY = """
+WITH staged AS (
+    DELETE FROM "posthog_staticcohortuploaditem"
+    WHERE "id" IN (
+        SELECT "id" FROM "posthog_staticcohortuploaditem"
+        WHERE "cohort_id" = %(cohort_id)s
+        ORDER BY "id"
+        LIMIT %(batch_size)s
+    )
+    RETURNING "value"
+), inserted AS (
+    INSERT INTO "posthog_cohortpeople" ("person_id", "cohort_id")
+    SELECT DISTINCT pdi."person_id", %(cohort_id)s
+    FROM staged
+    INNER JOIN "posthog_persondistinctid" pdi ON pdi."distinct_id" = staged."value" AND pdi."team_id" = %(team_id)s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "posthog_cohortpeople" cp
+        WHERE cp."cohort_id" = %(cohort_id)s AND cp."person_id" = pdi."person_id"
+    )
+    RETURNING "person_id"
+)
+SELECT "person_id" FROM inserted
 """
 
 UPDATE_QUERY = """
@@ -79,11 +119,31 @@ class Cohort(models.Model):
     is_calculating: models.BooleanField = models.BooleanField(default=False)
     last_calculation: models.DateTimeField = models.DateTimeField(blank=True, null=True)
     errors_calculating: models.IntegerField = models.IntegerField(default=0)
+    # How long the last calculation took, to budget calculations by
+    last_calculation_duration_ms: models.IntegerField = models.IntegerField(blank=True, null=True)
+
+    # Bumped whenever `groups` change. Membership precalculated in ClickHouse is only used while it was calculated for
+    # the current version
+    version: models.IntegerField = models.IntegerField(default=0)
+    precalculated_version: models.IntegerField = models.IntegerField(blank=True, null=True)
+    precalculated_at: models.DateTimeField = models.DateTimeField(blank=True, null=True)
 
     is_static: models.BooleanField = models.BooleanField(default=False)
+    # Uploaded distinct_ids of a static cohort still waiting to be added to it by `insert_staged_users`
+    staged_upload_count: models.IntegerField = models.IntegerField(default=0)
 
     objects = CohortManager()
 
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._saved_groups = copy.deepcopy(self.__dict__.get("groups"))
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        if self.pk is not None and self._saved_groups is not None and self.__dict__.get("groups") != self._saved_groups:
+            self.version += 1
+        super().save(*args, **kwargs)
+        self._saved_groups = copy.deepcopy(self.__dict__.get("groups"))
+
     def get_analytics_metadata(self):
         action_groups_count: int = 0
         properties_groups_count: int = 0
@@ -103,39 +163,68 @@ class Cohort(models.Model):
     def calculate_people(self, use_clickhouse=is_clickhouse_enabled()):
         if self.is_static:
             return
+        start_time = time.time()
         try:
             if not use_clickhouse:
                 self.is_calculating = True
-                self.save()
+                self.save(update_fields=["is_calculating"])
 
             persons_query = self._clickhouse_persons_query() if use_clickhouse else self._postgres_persons_query()
-            try:
-                sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
-            except EmptyResultSet:
-                query = DELETE_QUERY.format(cohort_id=self.pk)
-                params = {}
-            else:
-                query = "{}{}".format(DELETE_QUERY, UPDATE_QUERY).format(
-                    cohort_id=self.pk,
-                    values_query=sql.replace('FROM "posthog_person"', ', {} FROM "posthog_person"'.format(self.pk), 1,),
-                )
-
-            cursor = connection.cursor()
-            with transaction.atomic():
-                cursor.execute(query, params)
+            self._update_people(persons_query)
 
-                self.is_calculating = False
-                self.last_calculation = timezone.now()
-                self.errors_calculating = 0
-                self.save()
+            self.is_calculating = False
+            self.last_calculation = timezone.now()
+            self.last_calculation_duration_ms = int((time.time() - start_time) * 1000)
+            self.errors_calculating = 0
+            self.save(
+                update_fields=[
+                    "is_calculating",
+                    "last_calculation",
+                    "last_calculation_duration_ms",
+                    "errors_calculating",
+                ]
+            )
         except Exception as err:
             if settings.DEBUG:
                 raise err
             self.is_calculating = False
             self.errors_calculating = F("errors_calculating") + 1
-            self.save()
+            self.save(update_fields=["is_calculating", "errors_calculating"])
             capture_exception(err)
 
+    def _update_people(self, persons_query: QuerySet) -> None:
+        """
+        Remove the people that no longer match and add the ones that newly do, a range of the team's person ids at a
+        time, with the difference taken in the database.
+        """
+        cursor = connection.cursor()
+        for id_range in self._person_id_ranges():
+            batch = persons_query.filter(**id_range).order_by()
+            CohortPeople.objects.filter(
+                cohort_id=self.pk, **{f"person_{lookup}": value for lookup, value in id_range.items()}
+            ).exclude(person_id__in=batch.values("pk")).delete()
+            try:
+                sql, params = batch.exclude(cohort__id=self.pk).distinct("pk").only("pk").query.sql_with_params()
+            except EmptyResultSet:
+                continue
+            query = UPDATE_QUERY.format(
+                cohort_id=self.pk,
+                values_query=sql.replace('FROM "posthog_person"', ', {} FROM "posthog_person"'.format(self.pk), 1,),
+            )
+            cursor.execute(query, params)
+
+    def _person_id_ranges(self) -> Iterator[Dict[str, int]]:
+        "Filters of consecutive ranges of CALCULATION_BATCH_SIZE person ids of the team, the first and last unbounded."
+        person_ids = Person.objects.filter(team_id=self.team_id).order_by("id").values_list("id", flat=True)
+        lower: Dict[str, int] = {}
+        while True:
+            upper = next(iter(person_ids.filter(**lower)[CALCULATION_BATCH_SIZE : CALCULATION_BATCH_SIZE + 1]), None)
+            if upper is None:
+                yield lower
+                return
+            yield {**lower, "id__lt": upper}
+            lower = {"id__gte": upper}
+
     def calculate_people_ch(self):
         if is_clickhouse_enabled():
             from ee.clickhouse.models.cohort import recalculate_cohortpeople
@@ -146,27 +235,60 @@ class Cohort(models.Model):
         """
         Items can be distinct_id or email
         """
-        batchsize = 1000
-        use_clickhouse = is_clickhouse_enabled()
-        if use_clickhouse:
-            from ee.clickhouse.models.cohort import insert_static_cohort
+        self.stage_users(items)
+        self.insert_staged_users()
+
+    def stage_users(self, items: Iterable[str]) -> int:
+        """
+        Stage distinct_ids to be added to this static cohort by `insert_staged_users`, streaming them into Postgres with
+        COPY so that large uploads neither sit in memory nor in task arguments. Returns how many were staged.
+        """
+        items = iter(items)
+        staged = 0
+        with connection.cursor() as cursor:
+            while True:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                batch_size = 0
+                for item in itertools.islice(items, STAGING_BATCH_SIZE):
+                    writer.writerow([self.pk, item])
+                    batch_size += 1
+                if batch_size == 0:
+                    self._update_staged_upload_count()
+                    return staged
+                buffer.seek(0)
+                cursor.copy_expert(STAGE_QUERY, buffer)
+                staged += batch_size
+
+    def insert_staged_users(self) -> None:
+        """
+        Add the people with staged distinct_ids to this static cohort, a batch of staged rows per transaction, then
+        add all of its people to ClickHouse in one insert. Rows are removed once inserted and the ClickHouse insert can
+        be repeated, so this can be rerun to resume after a failure. `staged_upload_count` tracks the progress.
+        """
         try:
-            cursor = connection.cursor()
-            for i in range(0, len(items), batchsize):
-                batch = items[i : i + batchsize]
-                persons_query = (
-                    Person.objects.filter(team_id=self.team_id)
-                    .filter(Q(persondistinctid__team_id=self.team_id, persondistinctid__distinct_id__in=batch))
-                    .exclude(cohort__id=self.id)
+            remaining = self._update_staged_upload_count()
+            while remaining > 0:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            INSERT_STAGED_QUERY,
+                            {"cohort_id": self.pk, "team_id": self.team_id, "batch_size": INSERT_STAGED_BATCH_SIZE},
+                        )
+                        inserted = cursor.rowcount
+                    remaining = self._update_staged_upload_count()
+                logger.info(
+                    "Inserted {} people into static cohort {}, {} staged rows left".format(inserted, self.pk, remaining)
                 )
-                if use_clickhouse:
-                    insert_static_cohort([p for p in persons_query.values_list("uuid", flat=True)], self.pk, self.team)
-                sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
-                query = UPDATE_QUERY.format(
-                    cohort_id=self.pk,
-                    values_query=sql.replace('FROM "posthog_person"', ', {} FROM "posthog_person"'.format(self.pk), 1,),
+
+            if is_clickhouse_enabled():
+                from ee.clickhouse.models.cohort import insert_static_cohort
+
+                insert_static_cohort(
+                    Person.objects.filter(cohort__id=self.pk).values_list("uuid", flat=True).iterator(),
+                    self.pk,
+                    self.team,
                 )
-                cursor.execute(query, params)
             self.is_calculating = False
             self.last_calculation = timezone.now()
             self.errors_calculating = 0
@@ -179,6 +301,11 @@ class Cohort(models.Model):
             self.save()
             capture_exception(err)
 
+    def _update_staged_upload_count(self) -> int:
+        self.staged_upload_count = StaticCohortUploadItem.objects.filter(cohort_id=self.pk).count()
+        Cohort.objects.filter(pk=self.pk).update(staged_upload_count=self.staged_upload_count)
+        return self.staged_upload_count
+
     def insert_users_list_by_uuid(self, items: List[str]) -> None:
         batchsize = 1000
         try:
@@ -235,7 +362,7 @@ class Cohort(models.Model):
                             if group.get("days")
                             else {}
                         ),
-                        **(extra_filter if extra_filter else {})
+                        **(extra_filter if extra_filter else {}),
                     )
                     .order_by("distinct_id")
                     .distinct("distinct_id")
@@ -260,3 +387,15 @@ class CohortPeople(models.Model):
         indexes = [
             models.Index(fields=["cohort_id", "person_id"]),
         ]
+
+
+class StaticCohortUploadItem(models.Model):
+    "A distinct_id uploaded to a static cohort, waiting to be added to it."
+    id: models.BigAutoField = models.BigAutoField(primary_key=True)
+    cohort: models.ForeignKey = models.ForeignKey("Cohort", on_delete=models.CASCADE)
+    value: models.TextField = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cohort_id", "id"]),
+        ]
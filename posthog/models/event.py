@@ -1,31 +1,25 @@
 import copy
-import datetime
 import re
-from collections import defaultdict
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 from dateutil.relativedelta import relativedelta
-from django.db import connection, models, transaction
-from django.db.models import Exists, F, OuterRef, Prefetch, Q, QuerySet, Subquery
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Subquery
 from django.forms.models import model_to_dict
 from django.utils import timezone
 
 from .action import Action
+from .action_matcher import MatchContext, get_team_action_matcher
 from .action_step import ActionStep
 from .element import Element
 from .element_group import ElementGroup
 from .filters import Filter
 from .person import Person, PersonDistinctId
 from .team import Team
-from .utils import namedtuplefetchall
 
 SELECTOR_ATTRIBUTE_REGEX = r"([a-zA-Z]*)\[(.*)=[\'|\"](.*)[\'|\"]\]"
 
 
-LAST_UPDATED_TEAM_ACTION: Dict[int, datetime.datetime] = {}
-TEAM_EVENT_ACTION_QUERY_CACHE: Dict[int, Dict[str, tuple]] = defaultdict(dict)
-# TEAM_EVENT_ACTION_QUERY_CACHE looks like team_id -> event ex('$pageview') -> query
-TEAM_ACTION_QUERY_CACHE: Dict[int, str] = {}
 DEFAULT_EARLIEST_TIME_DELTA = relativedelta(weeks=1)
 
 
@@ -290,96 +284,28 @@ class Event(models.Model):
             # models.Index(fields=["created_at"]),
         ]
 
-    def _can_use_cached_query(self, last_updated_action_ts):
-        if not self.team_id in LAST_UPDATED_TEAM_ACTION:
-            return False
-
-        if not self.team_id in TEAM_EVENT_ACTION_QUERY_CACHE:
-            return False
-
-        if not self.event in TEAM_EVENT_ACTION_QUERY_CACHE[self.team_id]:
-            return False
-
-        if not self.team_id in TEAM_ACTION_QUERY_CACHE:
-            return False
-
-        # Cache is expired because actions were updated
-        if last_updated_action_ts > LAST_UPDATED_TEAM_ACTION[self.team_id]:
-            return False
-        return True
-
     @property
     def person(self):
         return Person.objects.get(
             team_id=self.team_id, persondistinctid__team_id=self.team_id, persondistinctid__distinct_id=self.distinct_id
         )
 
-    # This (ab)uses query_db_by_action to find which actions match this event
-    # We can't use filter_by_action here, as we use this function when we create an event so
-    # the event won't be in the Action-Event relationship yet.
-    # We use query caching to reduce the time spent on generating redundant queries
+    # Matched in memory, as we use this function when we create an event, so the event won't be in the
+    # Action-Event relationship yet
     @property
     def actions(self) -> List:
-        last_updated_action_ts = Action.objects.filter(team_id=self.team_id).aggregate(models.Max("updated_at"))[
-            "updated_at__max"
-        ]
-
-        actions = (
-            Action.objects.filter(
-                team_id=self.team_id, steps__event=self.event, deleted=False,  # filter by event name to narrow down
+        context = MatchContext(
+            team_id=self.team_id,
+            event=self.event,
+            distinct_id=self.distinct_id,
+            properties=self.properties,
+            get_elements=lambda: list(
+                Element.objects.filter(group__team_id=self.team_id, group__hash=self.elements_hash).order_by("order")
             )
-            .distinct("id")
-            .prefetch_related(Prefetch("steps", queryset=ActionStep.objects.order_by("id")))
+            if self.elements_hash
+            else [],
         )
-        if not self._can_use_cached_query(last_updated_action_ts):
-            TEAM_ACTION_QUERY_CACHE[self.team_id], _ = actions.query.sql_with_params()
-            if len(actions) == 0:
-                return []
-            events: models.QuerySet[Any] = Event.objects.filter(pk=self.pk)
-            for action in actions:
-                events = events.annotate(
-                    **{
-                        f"action_{action.pk}": Event.objects.filter(pk=self.pk)
-                        .query_db_by_action(action)
-                        .values("id")[:1]
-                    }
-                )
-            # This block is a little cryptic so bear with me
-            # We grab the query and the params from the ORM here
-            q, p = events.query.sql_with_params()
-
-            # We then take the parameters and replace the event id's with a placeholder
-            # We use this later to sub back in future event id's
-            # The rest of the parameters are shared between action types
-            qp = tuple(["%s" if i == self.pk else i for i in p])
-
-            # Create a cache item and add it to the cache keyed on team_id and event id
-            qcache = {self.event: (q, qp)}
-            TEAM_EVENT_ACTION_QUERY_CACHE[self.team_id].update(qcache)
-
-            # Update the last updated team action timestamp for future reference
-            LAST_UPDATED_TEAM_ACTION[self.team_id] = last_updated_action_ts
-        else:
-
-            # If we have reached this block we are about to use the sql query cache
-            # Grab the actions using the cached action query
-            actions.raw(TEAM_ACTION_QUERY_CACHE[self.team_id])
-
-            # Grab the cached query and query params, we will need to replace some params
-            q, p = TEAM_EVENT_ACTION_QUERY_CACHE[self.team_id][self.event]
-
-            # Replace the query param placeholders with the event id (opposite of what we did above)
-            qp = tuple([self.pk if i == "%s" else i for i in p])
-
-            with connection.cursor() as cursor:
-                # Format and execute the cached query using the mostly cached params
-                qstring = cursor.mogrify(q, qp)
-                cursor.execute(qstring)
-                events = namedtuplefetchall(cursor)
-
-        event = [event for event in events][0]
-        filtered_actions = [action for action in actions if getattr(event, f"action_{action.pk}", None)]
-        return filtered_actions
+        return get_team_action_matcher(self.team_id).match(context)
 
     created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     objects: EventManager = EventManager.as_manager()  # type: ignore
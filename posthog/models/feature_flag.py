@@ -1,13 +1,17 @@
 import hashlib
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from django.conf import settings
 from django.db import models
 from django.db.models.expressions import ExpressionWrapper, RawSQL
 from django.db.models.fields import BooleanField
 from django.db.models.query import QuerySet
+from django.dispatch.dispatcher import receiver
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
+from statshog.defaults.django import statsd
 
+from posthog.helpers.cache import TwoTierCache, dump_model, load_model
 from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.team import Team
 from posthog.queries.base import properties_to_Q
@@ -17,6 +21,17 @@ from .person import Person
 
 __LONG_SCALE__ = float(0xFFFFFFFFFFFFFFF)
 
+# Team ID -> active feature flag definitions, so that /decide doesn't need to load them on every call
+feature_flags_cache = TwoTierCache(
+    "active_feature_flags",
+    max_size=settings.FEATURE_FLAGS_CACHE_MAX_SIZE,
+    local_ttl=settings.FEATURE_FLAGS_CACHE_LOCAL_TTL,
+    ttl=settings.FEATURE_FLAGS_CACHE_TTL,
+    negative_ttl=settings.FEATURE_FLAGS_CACHE_LOCAL_TTL,
+    dump=lambda flags: [dump_model(flag) for flag in flags],
+    load=lambda data: [load_model(FeatureFlag, flag) for flag in data],
+)
+
 
 class FeatureFlag(models.Model):
     class Meta:
@@ -67,10 +82,21 @@ class FeatureFlag(models.Model):
             }
 
 
+@receiver(models.signals.post_save, sender=FeatureFlag)
+@receiver(models.signals.post_delete, sender=FeatureFlag)
+def feature_flags_cache_invalidate(sender, instance, **kwargs):
+    feature_flags_cache.invalidate(str(instance.team_id))
+
+
 class FeatureFlagMatcher:
-    def __init__(self, distinct_id: str, feature_flag: FeatureFlag):
+    def __init__(self, distinct_id: str, feature_flag: FeatureFlag, group_matches: Optional[List[bool]] = None):
+        """
+        `group_matches` can hold the already evaluated property match of each of the flag's groups (see
+        `get_active_feature_flags`), in which case no query is made for this flag.
+        """
         self.distinct_id = distinct_id
         self.feature_flag = feature_flag
+        self.group_matches = group_matches
 
     def is_match(self):
         return any(self.is_group_match(group, index) for index, group in enumerate(self.feature_flag.groups))
@@ -89,6 +115,8 @@ class FeatureFlagMatcher:
         return True
 
     def _match_distinct_id(self, group_index: int) -> bool:
+        if self.group_matches is not None:
+            return self.group_matches[group_index]
         return len(self.query_groups) > 0 and self.query_groups[0][group_index]
 
     @cached_property
@@ -126,16 +154,78 @@ class FeatureFlagMatcher:
         return hash_val / __LONG_SCALE__
 
 
+def get_feature_flags_for_team(team_id: int) -> List[FeatureFlag]:
+    return feature_flags_cache.get_or_fetch(
+        str(team_id),
+        lambda: list(
+            FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
+                "id", "team_id", "filters", "key", "rollout_percentage",
+            )
+        ),
+    )
+
+
+def get_group_matches(team_id: int, distinct_id: str, feature_flags: List[FeatureFlag]) -> Dict[int, List[bool]]:
+    """
+    Evaluate the property groups of all given flags for a person in a single query, annotating the person with one
+    boolean per flag group. Returns the match of each group by flag ID. Flags that can't be evaluated this way are
+    left out, so that they get matched (and their errors captured) one by one.
+    """
+    annotations: Dict[str, Any] = {}
+    keys_by_flag: Dict[int, List[Optional[str]]] = {}
+    for feature_flag in feature_flags:
+        if not any(len(group.get("properties", [])) > 0 for group in feature_flag.groups):
+            continue
+        try:
+            flag_annotations: Dict[str, Any] = {}
+            keys: List[Optional[str]] = []
+            for index, group in enumerate(feature_flag.groups):
+                if len(group.get("properties", [])) > 0:
+                    key = f"flag_{feature_flag.pk}_group_{index}"
+                    expr = properties_to_Q(Filter(data=group).properties, team_id=team_id, is_person_query=True)
+                    flag_annotations[key] = ExpressionWrapper(expr, output_field=BooleanField())
+                    keys.append(key)
+                else:
+                    keys.append(None)
+        except Exception as err:
+            capture_exception(err)
+            continue
+        annotations.update(flag_annotations)
+        keys_by_flag[feature_flag.pk] = keys
+
+    if not annotations:
+        return {}
+
+    try:
+        row = (
+            Person.objects.filter(
+                team_id=team_id, persondistinctid__distinct_id=distinct_id, persondistinctid__team_id=team_id,
+            )
+            .annotate(**annotations)
+            .values(*annotations.keys())
+            .first()
+        )
+    except Exception as err:
+        capture_exception(err)
+        return {}
+
+    return {
+        flag_id: [bool(row and row[key]) if key else True for key in keys] for flag_id, keys in keys_by_flag.items()
+    }
+
+
 def get_active_feature_flags(team: Team, distinct_id: str) -> List[str]:
+    timer = statsd.timer("posthog_cloud_feature_flags_evaluation").start()
     flags_enabled = []
-    feature_flags = FeatureFlag.objects.filter(team=team, active=True, deleted=False).only(
-        "id", "team_id", "filters", "key", "rollout_percentage",
-    )
+    feature_flags = get_feature_flags_for_team(team.pk)
+    group_matches = get_group_matches(team.pk, distinct_id, feature_flags)
     for feature_flag in feature_flags:
         try:
             # distinct_id will always be a string, but data can have non-string values ("Any")
-            if feature_flag.distinct_id_matches(distinct_id):
+            if FeatureFlagMatcher(distinct_id, feature_flag, group_matches.get(feature_flag.pk)).is_match():
                 flags_enabled.append(feature_flag.key)
         except Exception as err:
             capture_exception(err)
+    timer.stop()
+    statsd.gauge("posthog_cloud_feature_flags_evaluated", len(feature_flags))
     return flags_enabled
@@ -1,8 +1,29 @@
+from django.apps import apps
+from django.conf import settings
 from django.db import models
+from django.dispatch.dispatcher import receiver
 from django.utils import timezone
 
+from posthog.helpers.cache import LRUTTLCache, TwoTierCache, dump_model, load_model
+
 from .utils import generate_random_token, generate_random_token_personal
 
+# Personal API key value -> User, used by ingestion and /decide when a personal API key is sent
+personal_api_key_cache = TwoTierCache(
+    "user_from_personal_api_key",
+    max_size=settings.API_TOKEN_CACHE_MAX_SIZE,
+    local_ttl=settings.API_TOKEN_CACHE_LOCAL_TTL,
+    ttl=settings.API_TOKEN_CACHE_TTL,
+    negative_ttl=settings.API_TOKEN_CACHE_NEGATIVE_TTL,
+    dump=dump_model,
+    load=lambda data: load_model(apps.get_model("posthog", "User"), data),
+)
+
+# Keys whose `last_used_at` this process bumped recently, so that it's written at most once per key and interval
+personal_api_key_last_used_bumped: LRUTTLCache[bool] = LRUTTLCache(
+    max_size=settings.API_TOKEN_CACHE_MAX_SIZE, ttl=settings.PERSONAL_API_KEY_LAST_USED_INTERVAL
+)
+
 
 class PersonalAPIKey(models.Model):
     id: models.CharField = models.CharField(primary_key=True, max_length=50, default=generate_random_token)
@@ -12,9 +33,18 @@ class PersonalAPIKey(models.Model):
         unique=True, max_length=50, default=generate_random_token_personal, editable=False
     )
     created_at: models.DateTimeField = models.DateTimeField(default=timezone.now)
+    # Bumped at most every PERSONAL_API_KEY_LAST_USED_INTERVAL seconds per process, so it can lag by that much
     last_used_at: models.DateTimeField = models.DateTimeField(null=True, blank=True)
 
     # DEPRECATED: personal API keys are now specifically personal, without team affiliation
     team = models.ForeignKey(
         "posthog.Team", on_delete=models.SET_NULL, related_name="personal_api_keys+", null=True, blank=True
     )
+
+
+@receiver(models.signals.post_save, sender=PersonalAPIKey)
+@receiver(models.signals.post_delete, sender=PersonalAPIKey)
+def personal_api_key_cache_invalidate(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_used_at"}:
+        return
+    personal_api_key_cache.invalidate(instance.value)
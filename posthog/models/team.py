@@ -2,11 +2,13 @@ import re
 from typing import Any, Dict, List, Optional
 
 import pytz
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinLengthValidator
 from django.db import models
 from django.dispatch.dispatcher import receiver
 
+from posthog.helpers.cache import TwoTierCache, dump_model, load_model
 from posthog.helpers.dashboard_templates import create_dashboard_from_template
 from posthog.utils import GenericEmails
 
@@ -15,6 +17,17 @@ from .utils import UUIDClassicModel, generate_random_token_project, sane_repr
 
 TEAM_CACHE: Dict[str, "Team"] = {}
 
+# Project API token -> Team, used by ingestion and /decide on every request
+team_token_cache = TwoTierCache(
+    "team_from_token",
+    max_size=settings.API_TOKEN_CACHE_MAX_SIZE,
+    local_ttl=settings.API_TOKEN_CACHE_LOCAL_TTL,
+    ttl=settings.API_TOKEN_CACHE_TTL,
+    negative_ttl=settings.API_TOKEN_CACHE_NEGATIVE_TTL,
+    dump=dump_model,
+    load=lambda data: load_model(Team, data),
+)
+
 TIMEZONES = [(tz, tz) for tz in pytz.common_timezones]
 
 # TODO: DEPRECATED; delete when these attributes can be fully removed from `Team` model
@@ -70,6 +83,10 @@ class TeamManager(models.Manager):
     def get_team_from_token(self, token: Optional[str]) -> Optional["Team"]:
         if not token:
             return None
+        api_token: str = token
+        return team_token_cache.get_or_fetch(api_token, lambda: self._get_team_from_token_uncached(api_token))
+
+    def _get_team_from_token_uncached(self, token: str) -> Optional["Team"]:
         try:
             return Team.objects.defer(*DEPRECATED_ATTRS).get(api_token=token)
         except Team.DoesNotExist:
@@ -138,6 +155,21 @@ class Team(UUIDClassicModel):
     __repr__ = sane_repr("uuid", "name", "api_token")
 
 
+@receiver(models.signals.pre_save, sender=Team)
+def team_token_cache_invalidate_previous_token(sender, instance, **kwargs):
+    # The token may be about to change (e.g. reset), so the old one has to stop resolving to this team
+    if instance.pk is not None:
+        previous_token = Team.objects.filter(pk=instance.pk).values_list("api_token", flat=True).first()
+        if previous_token and previous_token != instance.api_token:
+            team_token_cache.invalidate(previous_token)
+
+
+@receiver(models.signals.post_save, sender=Team)
+@receiver(models.signals.post_delete, sender=Team)
+def team_token_cache_invalidate(sender, instance, **kwargs):
+    team_token_cache.invalidate(instance.api_token)
+
+
 @receiver(models.signals.pre_delete, sender=Team)
 def team_deleted(sender, instance, **kwargs):
     instance.event_set.all().delete()
@@ -3,6 +3,7 @@ from typing import Any, Callable, Dict, List, Optional, Tuple
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models, transaction
+from django.dispatch.dispatcher import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
@@ -10,7 +11,7 @@ from rest_framework.exceptions import ValidationError
 from posthog.utils import get_instance_realm
 
 from .organization import Organization, OrganizationMembership
-from .personal_api_key import PersonalAPIKey
+from .personal_api_key import PersonalAPIKey, personal_api_key_cache, personal_api_key_last_used_bumped
 from .team import Team
 from .utils import UUIDClassicModel, generate_random_token, sane_repr
 
@@ -73,6 +74,15 @@ class UserManager(BaseUserManager):
             return user
 
     def get_from_personal_api_key(self, key_value: str) -> Optional["User"]:
+        user = personal_api_key_cache.get_or_fetch(
+            key_value, lambda: self._get_from_personal_api_key_uncached(key_value)
+        )
+        if user is not None and personal_api_key_last_used_bumped.get(key_value) is None:
+            personal_api_key_last_used_bumped.set(key_value, True)
+            PersonalAPIKey.objects.filter(value=key_value).update(last_used_at=timezone.now())
+        return user
+
+    def _get_from_personal_api_key_uncached(self, key_value: str) -> Optional["User"]:
         try:
             personal_api_key: PersonalAPIKey = (
                 PersonalAPIKey.objects.select_related("user").filter(user__is_active=True).get(value=key_value)
@@ -80,8 +90,6 @@ class UserManager(BaseUserManager):
         except PersonalAPIKey.DoesNotExist:
             return None
         else:
-            personal_api_key.last_used_at = timezone.now()
-            personal_api_key.save()
             return personal_api_key.user
 
 
@@ -204,3 +212,11 @@ class User(AbstractUser, UUIDClassicModel):
         }
 
     __repr__ = sane_repr("email", "first_name", "distinct_id")
+
+
+@receiver(models.signals.post_save, sender=User)
+def user_personal_api_key_cache_invalidate(sender, instance, update_fields=None, **kwargs):
+    # Deactivated users must not keep authenticating through cached personal API keys
+    if update_fields is None or "is_active" in update_fields:
+        for key_value in instance.personal_api_keys.values_list("value", flat=True):
+            personal_api_key_cache.invalidate(key_value)
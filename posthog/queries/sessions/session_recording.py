@@ -1,4 +1,6 @@
 import datetime
+from bisect import bisect_right
+from collections import defaultdict
 from typing import (
     Any,
     Callable,
@@ -20,6 +22,8 @@ from posthog.models.utils import namedtuplefetchall
 
 DistinctId = str
 Snapshots = List[Any]
+# Recordings by distinct id, as (start times, recordings) sorted by start time
+RecordingsIndex = Dict[DistinctId, Tuple[List[datetime.datetime], List[Any]]]
 
 
 OPERATORS = {"gt": ">", "lt": "<"}
@@ -51,32 +55,72 @@ SESSIONS_IN_RANGE_QUERY = """
 
 class SessionRecording:
     def query_recording_snapshots(
-        self, team: Team, session_id: str
+        self,
+        team: Team,
+        session_id: str,
+        after: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
     ) -> Tuple[Optional[DistinctId], Optional[datetime.datetime], Snapshots]:
         events = SessionRecordingEvent.objects.filter(team=team, session_id=session_id).order_by("timestamp")
+        if after is not None:
+            events = events.filter(timestamp__gt=after)
+        if until is not None:
+            events = events.filter(timestamp__lte=until)
 
         if len(events) == 0:
             return None, None, []
 
         return events[0].distinct_id, events[0].timestamp, [e.snapshot_data for e in events]
 
-    def run(self, team: Team, session_recording_id: str, *args, **kwargs) -> Dict[str, Any]:
+    def query_window_end(
+        self, team: Team, session_id: str, after: Optional[datetime.datetime], limit: int
+    ) -> Optional[datetime.datetime]:
+        """Timestamp of the `limit`th snapshot after `after`, or None if there are fewer snapshots left than that."""
+        events = SessionRecordingEvent.objects.filter(team=team, session_id=session_id)
+        if after is not None:
+            events = events.filter(timestamp__gt=after)
+        return events.order_by("timestamp").values_list("timestamp", flat=True)[limit - 1 : limit].first()
+
+    def query_recording_start(self, team: Team, session_id: str) -> Optional[datetime.datetime]:
+        return self.query_window_end(team, session_id, None, 1)
+
+    def run(
+        self,
+        team: Team,
+        session_recording_id: str,
+        *args,
+        limit: Optional[int] = None,
+        after: Optional[datetime.datetime] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Load a recording's snapshots. Given a `limit`, only the window of roughly that many snapshots right after
+        `after` is loaded, and `next` is the cursor to pass as `after` for the following window. Windows end on a
+        timestamp boundary, which keeps the chunks of a compressed snapshot batch (they share a timestamp) together.
+        The person is the same for every window, so it's only looked up for the first one and is None for the others.
+        """
         from posthog.api.person import PersonSerializer
 
-        distinct_id, start_time, snapshots = self.query_recording_snapshots(team, session_recording_id)
+        until = self.query_window_end(team, session_recording_id, after, limit) if limit is not None else None
+        distinct_id, start_time, snapshots = self.query_recording_snapshots(
+            team, session_recording_id, after=after, until=until
+        )
         snapshots = list(decompress_chunked_snapshot_data(team.pk, session_recording_id, snapshots))
 
-        person = (
-            PersonSerializer(Person.objects.get(team=team, persondistinctid__distinct_id=distinct_id)).data
-            if distinct_id
-            else None
-        )
+        person = None
+        if after is not None:
+            start_time = self.query_recording_start(team, session_recording_id)
+        elif distinct_id:
+            person = PersonSerializer(Person.objects.get(team=team, persondistinctid__distinct_id=distinct_id)).data
 
-        return {
+        result = {
             "snapshots": snapshots,
             "person": person,
             "start_time": start_time,
         }
+        if limit is not None:
+            result["next"] = until
+        return result
 
 
 def query_sessions_in_range(
@@ -116,9 +160,12 @@ def join_with_session_recordings(
         SessionRecordingViewed.objects.filter(team=team, user_id=filter.user_id).values_list("session_id", flat=True)
     )
 
+    recordings_index = index_recordings(session_recordings)
     for session in sessions_results:
         session["session_recordings"] = list(
-            collect_matching_recordings(session, session_recordings, filter, viewed_session_recordings)
+            collect_matching_recordings(
+                session, overlapping_recordings(recordings_index, session), filter, viewed_session_recordings
+            )
         )
 
     if filter.limit_by_recordings:
@@ -126,6 +173,28 @@ def join_with_session_recordings(
     return sessions_results
 
 
+def index_recordings(session_recordings: List[Any]) -> RecordingsIndex:
+    """Group recordings by distinct id, sorted by start time, for `overlapping_recordings` to look them up."""
+    recordings_by_distinct_id: Dict[DistinctId, List[Any]] = defaultdict(list)
+    for recording in session_recordings:
+        recordings_by_distinct_id[recording["distinct_id"]].append(recording)
+
+    index: RecordingsIndex = {}
+    for distinct_id, recordings in recordings_by_distinct_id.items():
+        recordings.sort(key=lambda recording: recording["start_time"])
+        index[distinct_id] = ([recording["start_time"] for recording in recordings], recordings)
+    return index
+
+
+def overlapping_recordings(index: RecordingsIndex, session: Any) -> List[Any]:
+    """Recordings of the session's user that overlap with the session, in order of start time."""
+    if session["distinct_id"] not in index:
+        return []
+    start_times, recordings = index[session["distinct_id"]]
+    started_before_session_end = recordings[: bisect_right(start_times, session["end_time"])]
+    return [recording for recording in started_before_session_end if recording["end_time"] >= session["start_time"]]
+
+
 def collect_matching_recordings(
     session: Any, session_recordings: List[Any], filter: SessionsFilter, viewed: Set[str]
 ) -> Generator[Dict, None, None]:
@@ -1,11 +1,17 @@
 from dateutil.relativedelta import relativedelta
+from django.test import TestCase
 from django.utils.timezone import now
 from freezegun import freeze_time
 
 from posthog.models import Person, User
 from posthog.models.filters.sessions_filter import SessionsFilter
 from posthog.models.session_recording_event import SessionRecordingEvent, SessionRecordingViewed
-from posthog.queries.sessions.session_recording import SessionRecording, join_with_session_recordings
+from posthog.queries.sessions.session_recording import (
+    SessionRecording,
+    index_recordings,
+    join_with_session_recordings,
+    overlapping_recordings,
+)
 from posthog.test.base import BaseTest
 
 
@@ -32,6 +38,45 @@ def session_recording_test_factory(session_recording, filter_sessions, event_fac
                 self.assertEqual(session["person"]["properties"], {"$some_prop": "something"})
                 self.assertEqual(session["start_time"], now())
 
+        def test_query_run_in_windows(self):
+            with freeze_time("2020-09-13T12:26:40.000Z"):
+                Person.objects.create(team=self.team, distinct_ids=["user"], properties={"$some_prop": "something"})
+
+                self.create_snapshot("user", "1", now())
+                self.create_snapshot("user", "1", now() + relativedelta(seconds=10))
+                self.create_snapshot("user", "1", now() + relativedelta(seconds=10), type=3)
+                self.create_snapshot("user", "1", now() + relativedelta(seconds=20))
+                self.create_snapshot("user", "1", now() + relativedelta(seconds=30))
+
+                first = session_recording().run(team=self.team, session_recording_id="1", limit=2)
+                # Snapshots with the same timestamp end up in the same window
+                self.assertEqual(
+                    sorted(first["snapshots"], key=lambda snapshot: (snapshot["timestamp"], snapshot["type"])),
+                    [
+                        {"timestamp": 1_600_000_000, "type": 2},
+                        {"timestamp": 1_600_000_010, "type": 2},
+                        {"timestamp": 1_600_000_010, "type": 3},
+                    ],
+                )
+                self.assertEqual(first["person"]["properties"], {"$some_prop": "something"})
+                self.assertEqual(first["start_time"], now())
+                self.assertEqual(first["next"], now() + relativedelta(seconds=10))
+
+                second = session_recording().run(team=self.team, session_recording_id="1", limit=2, after=first["next"])
+                self.assertEqual(
+                    second["snapshots"],
+                    [{"timestamp": 1_600_000_020, "type": 2}, {"timestamp": 1_600_000_030, "type": 2}],
+                )
+                self.assertEqual(second["next"], now() + relativedelta(seconds=30))
+                # Later windows still start where the recording starts, and don't look up the person again
+                self.assertEqual(second["start_time"], now())
+                self.assertIsNone(second["person"])
+
+                last = session_recording().run(team=self.team, session_recording_id="1", limit=2, after=second["next"])
+                self.assertEqual(last["snapshots"], [])
+                self.assertEqual(last["start_time"], now())
+                self.assertIsNone(last["next"])
+
         def test_query_run_with_no_such_session(self):
             session = session_recording().run(team=self.team, session_recording_id="xxx")
             self.assertEqual(session, {"snapshots": [], "person": None, "start_time": None})
@@ -160,3 +205,26 @@ class DjangoSessionRecordingTest(
     session_recording_test_factory(SessionRecording, join_with_session_recordings, SessionRecordingEvent.objects.create)  # type: ignore
 ):
     pass
+
+
+class TestRecordingsIndex(TestCase):
+    def test_overlapping_recordings(self):
+        with freeze_time("2020-09-13T12:26:40.000Z"):
+            recordings = [
+                {"session_id": "late", "distinct_id": "user", "start_time": now() + relativedelta(seconds=50)},
+                {"session_id": "before", "distinct_id": "user", "start_time": now() - relativedelta(seconds=30)},
+                {"session_id": "spanning", "distinct_id": "user", "start_time": now() - relativedelta(seconds=10)},
+                {"session_id": "inside", "distinct_id": "user", "start_time": now() + relativedelta(seconds=5)},
+                {"session_id": "other_user", "distinct_id": "user2", "start_time": now()},
+            ]
+            for recording in recordings:
+                recording["end_time"] = recording["start_time"] + relativedelta(seconds=20)
+
+            index = index_recordings(recordings)
+            session = {"distinct_id": "user", "start_time": now(), "end_time": now() + relativedelta(seconds=30)}
+
+            self.assertEqual(
+                [recording["session_id"] for recording in overlapping_recordings(index, session)],
+                ["spanning", "inside"],
+            )
+            self.assertEqual(overlapping_recordings(index, {**session, "distinct_id": "unknown"}), [])
@@ -66,6 +66,8 @@ if E2E_TESTING:
 SELF_CAPTURE = get_from_env("SELF_CAPTURE", DEBUG, type_cast=str_to_bool)
 SHELL_PLUS_PRINT_SQL = get_from_env("PRINT_SQL", False, type_cast=str_to_bool)
 USE_PRECALCULATED_CH_COHORT_PEOPLE = not TEST
+# Cohorts matching on person properties only re-evaluate persons updated since their last calculation, less this
+COHORT_INCREMENTAL_LOOKBACK_MINUTES = get_from_env("COHORT_INCREMENTAL_LOOKBACK_MINUTES", 60, type_cast=int)
 
 SITE_URL = os.getenv("SITE_URL", "http://localhost:8000").rstrip("/")
 
@@ -163,6 +165,16 @@ CLICKHOUSE_ASYNC = get_from_env("CLICKHOUSE_ASYNC", False, type_cast=str_to_bool
 CLICKHOUSE_CONN_POOL_MIN = get_from_env("CLICKHOUSE_CONN_POOL_MIN", 20, type_cast=int)
 CLICKHOUSE_CONN_POOL_MAX = get_from_env("CLICKHOUSE_CONN_POOL_MAX", 1000, type_cast=int)
 
+# How cache_sync_execute stores results in Redis: "columnar" (typed, compressed) or "json"
+CLICKHOUSE_RESULT_CACHE_CODEC = os.getenv("CLICKHOUSE_RESULT_CACHE_CODEC", "columnar")
+# Encoded results larger than this aren't cached at all
+CLICKHOUSE_RESULT_CACHE_MAX_BYTES = get_from_env("CLICKHOUSE_RESULT_CACHE_MAX_BYTES", 8 * 1024 * 1024, type_cast=int)
+# Results of sync_execute(..., use_query_cache=True), invalidated by new data for the team rather than by this TTL
+CLICKHOUSE_QUERY_CACHE_ENABLED = get_from_env("CLICKHOUSE_QUERY_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+CLICKHOUSE_QUERY_CACHE_TTL = get_from_env("CLICKHOUSE_QUERY_CACHE_TTL", 24 * 60 * 60, type_cast=int)
+# How long a team's ingestion watermark is reused, i.e. how long new data can go unnoticed by cached queries
+CLICKHOUSE_QUERY_CACHE_WATERMARK_TTL = get_from_env("CLICKHOUSE_QUERY_CACHE_WATERMARK_TTL", 30, type_cast=int)
+
 _clickhouse_http_protocol = "http://"
 _clickhouse_http_port = "8123"
 if CLICKHOUSE_SECURE:
@@ -178,6 +190,10 @@ KAFKA_URL = os.getenv("KAFKA_URL", "kafka://kafka")
 KAFKA_HOSTS_LIST = [urlparse(host).netloc for host in KAFKA_URL.split(",")]
 KAFKA_HOSTS = ",".join(KAFKA_HOSTS_LIST)
 KAFKA_BASE64_KEYS = get_from_env("KAFKA_BASE64_KEYS", False, type_cast=str_to_bool)
+# Producer batching - see https://kafka-python.readthedocs.io/en/master/apidoc/KafkaProducer.html
+KAFKA_PRODUCER_LINGER_MS = get_from_env("KAFKA_PRODUCER_LINGER_MS", 20, type_cast=int)
+KAFKA_PRODUCER_BATCH_SIZE = get_from_env("KAFKA_PRODUCER_BATCH_SIZE", 256 * 1024, type_cast=int)  # bytes
+KAFKA_PRODUCER_COMPRESSION_TYPE: Optional[str] = os.getenv("KAFKA_PRODUCER_COMPRESSION_TYPE", "gzip") or None
 
 _primary_db = os.getenv("PRIMARY_DB", "postgres")
 PRIMARY_DB: RDBMS
@@ -198,6 +214,22 @@ EVENT_PROPERTY_USAGE_INTERVAL_SECONDS = get_from_env(
 UPDATE_CACHED_DASHBOARD_ITEMS_INTERVAL_SECONDS = get_from_env(
     "UPDATE_CACHED_DASHBOARD_ITEMS_INTERVAL_SECONDS", 90, type_cast=int
 )
+# Seconds of query time worth of dashboard items refreshed per tick
+DASHBOARD_REFRESH_TIME_BUDGET_SECONDS = get_from_env("DASHBOARD_REFRESH_TIME_BUDGET_SECONDS", 120, type_cast=int)
+# Assumed cost of items that haven't been calculated by the scheduler yet
+DASHBOARD_REFRESH_DEFAULT_COST_SECONDS = get_from_env("DASHBOARD_REFRESH_DEFAULT_COST_SECONDS", 5, type_cast=int)
+DASHBOARD_REFRESH_MIN_INTERVAL_SECONDS = get_from_env("DASHBOARD_REFRESH_MIN_INTERVAL_SECONDS", 5 * 60, type_cast=int)
+# Items timing out are skipped for this long, doubling with each consecutive timeout
+DASHBOARD_REFRESH_BACKOFF_SECONDS = get_from_env("DASHBOARD_REFRESH_BACKOFF_SECONDS", 15 * 60, type_cast=int)
+DASHBOARD_REFRESH_MAX_BACKOFF_SECONDS = get_from_env(
+    "DASHBOARD_REFRESH_MAX_BACKOFF_SECONDS", 24 * 60 * 60, type_cast=int
+)
+# How many items of a single dashboard are calculated at once when it's loaded with ?refresh. Tests run serially, as
+# other threads can't see data created inside test transactions
+DASHBOARD_REFRESH_CONCURRENCY = get_from_env("DASHBOARD_REFRESH_CONCURRENCY", 1 if TEST else 4, type_cast=int)
+
+# Format new session recording chunks are compressed in, see posthog/helpers/session_recording.py
+SESSION_RECORDING_COMPRESSION = os.getenv("SESSION_RECORDING_COMPRESSION", "zlib-utf8-base64")
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -219,6 +251,13 @@ STATSD_SEPARATOR = "_"
 
 # Whether to capture internal metrics
 CAPTURE_INTERNAL_METRICS = get_from_env("CAPTURE_INTERNAL_METRICS", False, type_cast=str_to_bool)
+# Internal metrics are aggregated per metric and tags in each process and captured as one summary event per series
+# every this many seconds
+INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS = get_from_env("INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS", 60, type_cast=int)
+# Series aggregated at once per process. Values of further series are dropped until the next flush
+INTERNAL_METRICS_MAX_SERIES = get_from_env("INTERNAL_METRICS_MAX_SERIES", 2000, type_cast=int)
+# Timings sampled per series for percentiles
+INTERNAL_METRICS_MAX_SAMPLES = get_from_env("INTERNAL_METRICS_MAX_SAMPLES", 500, type_cast=int)
 
 # django-axes settings to lockout after too many attempts
 AXES_ENABLED = get_from_env("AXES_ENABLED", not TEST, type_cast=str_to_bool)
@@ -469,7 +508,30 @@ CELERY_RESULT_EXPIRES = timedelta(days=4)  # expire tasks after 4 days instead o
 REDBEAT_LOCK_TIMEOUT = 45  # keep distributed beat lock for 45sec
 
 CACHED_RESULTS_TTL = 7 * 24 * 60 * 60  # how long to keep cached results for
+
+# Caching of project API token -> team and personal API key -> user lookups
+API_TOKEN_CACHE_MAX_SIZE = get_from_env("API_TOKEN_CACHE_MAX_SIZE", 10_000, type_cast=int)  # per process
+API_TOKEN_CACHE_LOCAL_TTL = get_from_env("API_TOKEN_CACHE_LOCAL_TTL", 30, type_cast=int)  # in-process, seconds
+API_TOKEN_CACHE_TTL = get_from_env("API_TOKEN_CACHE_TTL", 60 * 60, type_cast=int)  # Redis, seconds
+API_TOKEN_CACHE_NEGATIVE_TTL = get_from_env("API_TOKEN_CACHE_NEGATIVE_TTL", 60, type_cast=int)  # invalid tokens
+PERSONAL_API_KEY_LAST_USED_INTERVAL = get_from_env("PERSONAL_API_KEY_LAST_USED_INTERVAL", 60, type_cast=int)  # seconds
+
+# Caching of each team's active feature flag definitions for /decide
+FEATURE_FLAGS_CACHE_MAX_SIZE = get_from_env("FEATURE_FLAGS_CACHE_MAX_SIZE", 1_000, type_cast=int)  # per process
+FEATURE_FLAGS_CACHE_LOCAL_TTL = get_from_env("FEATURE_FLAGS_CACHE_LOCAL_TTL", 10, type_cast=int)  # in-process
+FEATURE_FLAGS_CACHE_TTL = get_from_env("FEATURE_FLAGS_CACHE_TTL", 60 * 60, type_cast=int)  # Redis, seconds
+# Caching of the person summaries shown next to events, sessions and recordings. Short, as persons get updated
+PERSON_SUMMARY_CACHE_TTL = get_from_env("PERSON_SUMMARY_CACHE_TTL", 60, type_cast=int)  # Redis, seconds
 TEMP_CACHE_RESULTS_TTL = 24 * 60 * 60  # how long to keep non dashboard cached results for
+# cached results older than this are still served, but get refreshed in the background
+INSIGHT_CACHE_STALE_SECONDS = get_from_env("INSIGHT_CACHE_STALE_SECONDS", 60 * 60, type_cast=int)
+# how long a calculation can hold the lock for its cache key, and how long others wait for its result
+INSIGHT_CACHE_LOCK_TIMEOUT = get_from_env("INSIGHT_CACHE_LOCK_TIMEOUT", 180, type_cast=int)
+INSIGHT_CACHE_LOCK_WAIT = get_from_env("INSIGHT_CACHE_LOCK_WAIT", 60, type_cast=int)
+# Insights requested with ?async=true are calculated by workers, see posthog/tasks/async_query.py
+INSIGHT_ASYNC_QUERY_TEAM_CONCURRENCY = get_from_env("INSIGHT_ASYNC_QUERY_TEAM_CONCURRENCY", 5, type_cast=int)
+INSIGHT_ASYNC_QUERY_TIMEOUT = get_from_env("INSIGHT_ASYNC_QUERY_TIMEOUT", 10 * 60, type_cast=int)
+INSIGHT_ASYNC_QUERY_STATE_TTL = get_from_env("INSIGHT_ASYNC_QUERY_STATE_TTL", 60 * 60, type_cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -0,0 +1,146 @@
+"""
+Asynchronous insight queries: instead of calculating an insight in the request, `submit_query` queues the calculation
+and returns a query id to poll. Results land in the regular insight cache under the filter's cache key, so once a
+query is complete its result is also what `cached_function` serves.
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from posthog.ee import is_clickhouse_enabled
+from posthog.redis import get_client
+from posthog.types import FilterType
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETE = "complete"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+def submit_query(team_id: int, cache_key: str, filter: FilterType) -> str:
+    """
+    Queue calculating the filter's result and return the query id. Submitting a query that's already queued or running
+    returns the id of that query instead.
+    """
+    from posthog.tasks.update_cache import get_cache_type
+
+    client = get_client()
+    in_flight_id = client.get(f"insight_query_for_key:{cache_key}")
+    if in_flight_id is not None:
+        in_flight = get_query_state(team_id, in_flight_id.decode("utf-8"))
+        if in_flight is not None and in_flight["status"] in (QUEUED, RUNNING):
+            return in_flight["id"]
+
+    query_id = str(uuid4())
+    running_key = f"insight_queries_running:{team_id}"
+    pipeline = client.pipeline()
+    # Queries whose worker died never get removed, so entries expire after the longest a query can run
+    pipeline.zremrangebyscore(running_key, "-inf", time.time())
+    pipeline.zadd(running_key, {query_id: time.time() + settings.INSIGHT_ASYNC_QUERY_TIMEOUT})
+    pipeline.expire(running_key, settings.INSIGHT_ASYNC_QUERY_TIMEOUT)
+    pipeline.zcard(running_key)
+    running = pipeline.execute()[-1]
+    if running > settings.INSIGHT_ASYNC_QUERY_TEAM_CONCURRENCY:
+        client.zrem(running_key, query_id)
+        raise Throttled(detail="Too many queries are running for this project at once, try again later.")
+
+    _save_query_state(
+        {
+            "id": query_id,
+            "team_id": team_id,
+            "status": QUEUED,
+            "cache_key": cache_key,
+            "cache_type": get_cache_type(filter),
+            "filter": filter.toJSON(),
+            "error": None,
+            "created_at": timezone.now().isoformat(),
+        }
+    )
+    client.set(f"insight_query_for_key:{cache_key}", query_id, ex=settings.INSIGHT_ASYNC_QUERY_TIMEOUT)
+    run_async_query.apply_async(args=[query_id], task_id=query_id)
+    return query_id
+
+
+def get_query_state(team_id: int, query_id: str) -> Optional[Dict[str, Any]]:
+    state = _load_query_state(query_id)
+    # Query ids are only visible to the team that submitted them
+    return state if state is not None and state["team_id"] == team_id else None
+
+
+def cancel_query(team_id: int, query_id: str) -> Optional[Dict[str, Any]]:
+    from posthog.celery import app
+
+    state = get_query_state(team_id, query_id)
+    if state is None or state["status"] not in (QUEUED, RUNNING):
+        return state
+
+    state = _update_query_state(state, status=CANCELLED)
+    app.control.revoke(query_id)
+    if is_clickhouse_enabled():
+        from ee.clickhouse.client import kill_queries
+
+        kill_queries(query_id)
+    _release_slot(state)
+    return state
+
+
+@shared_task(ignore_result=True)
+def run_async_query(query_id: str) -> None:
+    from posthog.tasks.update_cache import update_cache_item
+
+    state = _load_query_state(query_id)
+    if state is None or state["status"] != QUEUED:
+        return  # Cancelled before a worker got to it
+
+    state = _update_query_state(state, status=RUNNING)
+    payload = {"filter": state["filter"], "team_id": state["team_id"]}
+    status, error = COMPLETE, None
+    try:
+        if is_clickhouse_enabled():
+            from ee.clickhouse.client import query_id_prefix
+
+            with query_id_prefix(query_id):
+                update_cache_item(state["cache_key"], state["cache_type"], payload)
+        else:
+            update_cache_item(state["cache_key"], state["cache_type"], payload)
+    except Exception as err:
+        logger.exception("Async insight query %s failed", query_id)
+        status, error = ERROR, str(err)
+    finally:
+        # A cancelled query stays cancelled, even though killing its queries makes it fail or finish early
+        current = _load_query_state(query_id)
+        if current is not None and current["status"] != CANCELLED:
+            _update_query_state(current, status=status, error=error)
+        _release_slot(state)
+
+
+def _load_query_state(query_id: str) -> Optional[Dict[str, Any]]:
+    state = get_client().get(f"insight_query:{query_id}")
+    return json.loads(state) if state is not None else None
+
+
+def _save_query_state(state: Dict[str, Any]) -> None:
+    get_client().set(f"insight_query:{state['id']}", json.dumps(state), ex=settings.INSIGHT_ASYNC_QUERY_STATE_TTL)
+
+
+def _update_query_state(state: Dict[str, Any], **changes: Any) -> Dict[str, Any]:
+    state = {**state, **changes}
+    _save_query_state(state)
+    return state
+
+
+def _release_slot(state: Dict[str, Any]) -> None:
+    client = get_client()
+    client.zrem(f"insight_queries_running:{state['team_id']}", state["id"])
+    if client.get(f"insight_query_for_key:{state['cache_key']}") == state["id"].encode("utf-8"):
+        client.delete(f"insight_query_for_key:{state['cache_key']}")
@@ -1,39 +1,147 @@
+import json
 import logging
 import os
 import time
-from typing import Any, Dict, List
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Set
 
 from celery import shared_task
 from dateutil.relativedelta import relativedelta
-from django.db.models import F
+from django.db.models import F, Min
 from django.utils import timezone
 
 from posthog.constants import INSIGHT_STICKINESS
 from posthog.ee import is_clickhouse_enabled
-from posthog.models import Cohort
+from posthog.internal_metrics import gauge
+from posthog.models import Cohort, DashboardItem, FeatureFlag
 
 logger = logging.getLogger(__name__)
 
 MAX_AGE_MINUTES = 15
-PARALLEL_COHORTS = int(os.environ.get("PARALLEL_COHORTS", 2))
+# At most this many cohorts are calculated per run, within the calculation budget
+PARALLEL_COHORTS = int(os.environ.get("PARALLEL_COHORTS", 10))
+# Seconds of calculation scheduled per run, estimated from how long each cohort took the last time
+CALCULATION_BUDGET_SECONDS = int(os.environ.get("COHORT_CALCULATION_BUDGET_SECONDS", 60))
+# Assumed for cohorts that haven't been calculated yet
+DEFAULT_CALCULATION_SECONDS = 10
+# A flag using a cohort is evaluated on every decide request, so it counts as much as this many insights
+FLAG_USAGE_WEIGHT = 10
 
 
 def calculate_cohorts() -> None:
     # This task will be run every minute
-    # Every minute, grab a few cohorts off the list and execute them
-    for cohort in (
+    # Every minute, grab the most pressing cohorts that fit in the calculation budget and execute them
+    for cohort in get_cohorts_to_calculate():
+        calculate_cohort.delay(cohort.id)
+        if is_clickhouse_enabled():
+            calculate_cohort_ch.delay(cohort.id)
+
+    if is_clickhouse_enabled():
+        report_precalculation_staleness()
+
+
+def get_cohorts_to_calculate() -> List[Cohort]:
+    """
+    Cohorts due for calculation, the stalest and most used first, for as many as fit in CALCULATION_BUDGET_SECONDS.
+    The first one is always included, so that a single slow cohort can't block all calculations.
+    """
+    now = timezone.now()
+    cohorts = list(
         Cohort.objects.filter(
             deleted=False,
             is_calculating=False,
-            last_calculation__lte=timezone.now() - relativedelta(minutes=MAX_AGE_MINUTES),
+            last_calculation__lte=now - relativedelta(minutes=MAX_AGE_MINUTES),
             errors_calculating__lte=20,
         )
         .exclude(is_static=True)
-        .order_by(F("last_calculation").asc(nulls_first=True))[0:PARALLEL_COHORTS]
-    ):
-        calculate_cohort.delay(cohort.id)
-        if is_clickhouse_enabled():
-            calculate_cohort_ch.delay(cohort.id)
+        .only("id", "team_id", "last_calculation", "last_calculation_duration_ms")
+    )
+    usage = get_cohort_usage(cohorts)
+
+    def priority(cohort: Cohort) -> float:
+        staleness_minutes = (now - cohort.last_calculation).total_seconds() / 60
+        return staleness_minutes * (1 + usage[cohort.pk])
+
+    to_calculate: List[Cohort] = []
+    budget = CALCULATION_BUDGET_SECONDS
+    for cohort in sorted(cohorts, key=priority, reverse=True):
+        cost = (
+            cohort.last_calculation_duration_ms / 1000
+            if cohort.last_calculation_duration_ms is not None
+            else DEFAULT_CALCULATION_SECONDS
+        )
+        if to_calculate and cost > budget:
+            continue
+        to_calculate.append(cohort)
+        budget -= cost
+        if len(to_calculate) >= PARALLEL_COHORTS:
+            break
+    return to_calculate
+
+
+def get_cohort_usage(cohorts: Iterable[Cohort]) -> Counter:
+    "How much each of the cohorts is used, by insights and (weighted by FLAG_USAGE_WEIGHT) feature flags."
+    cohort_ids = {cohort.pk for cohort in cohorts}
+    team_ids = {cohort.team_id for cohort in cohorts}
+    usage: Counter = Counter()
+    if not cohort_ids:
+        return usage
+
+    for filters in DashboardItem.objects.filter(
+        team_id__in=team_ids, deleted=False, filters__icontains='"cohort"'
+    ).values_list("filters", flat=True):
+        for cohort_id in _cohort_ids_in_filters(filters) & cohort_ids:
+            usage[cohort_id] += 1
+
+    for flag in FeatureFlag.objects.filter(team_id__in=team_ids, active=True, deleted=False).only("id", "filters"):
+        for cohort_id in (
+            _cohort_ids_in_properties(prop for group in flag.groups for prop in group.get("properties") or [])
+            & cohort_ids
+        ):
+            usage[cohort_id] += FLAG_USAGE_WEIGHT
+    return usage
+
+
+def _cohort_ids_in_filters(filters: Dict[str, Any]) -> Set[int]:
+    properties = list(filters.get("properties") or [])
+    for entity in (filters.get("events") or []) + (filters.get("actions") or []):
+        properties.extend(entity.get("properties") or [])
+    cohort_ids = _cohort_ids_in_properties(properties)
+
+    if filters.get("breakdown_type") == "cohort":
+        breakdown = filters.get("breakdown")
+        if isinstance(breakdown, str):
+            try:
+                breakdown = json.loads(breakdown)
+            except ValueError:
+                breakdown = None
+        for value in breakdown if isinstance(breakdown, list) else [breakdown]:
+            if isinstance(value, int):
+                cohort_ids.add(value)
+    return cohort_ids
+
+
+def _cohort_ids_in_properties(properties: Iterable[Any]) -> Set[int]:
+    cohort_ids: Set[int] = set()
+    for prop in properties:
+        if isinstance(prop, dict) and prop.get("type") == "cohort":
+            try:
+                cohort_ids.add(int(prop["value"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return cohort_ids
+
+
+def report_precalculation_staleness() -> None:
+    """How far behind the precalculated members of the stalest cohort are, and how many cohorts can't use them."""
+    cohorts = Cohort.objects.filter(deleted=False, is_static=False)
+    oldest = cohorts.filter(precalculated_at__isnull=False).aggregate(oldest=Min("precalculated_at"))["oldest"]
+    if oldest is not None:
+        gauge("cohort_precalculation_staleness_seconds", (timezone.now() - oldest).total_seconds())
+    gauge(
+        "cohort_precalculation_outdated_count",
+        cohorts.exclude(precalculated_version=F("version"), precalculated_at__isnull=False).count(),
+    )
 
 
 @shared_task(ignore_result=True, max_retries=1)
@@ -61,6 +169,17 @@ def calculate_cohort_from_list(cohort_id: int, items: List[str]) -> None:
     logger.info("Calculating cohort {} from CSV took {:.2f} seconds".format(cohort.pk, (time.time() - start_time)))
 
 
+@shared_task(ignore_result=True, max_retries=1)
+def calculate_cohort_from_staged_list(cohort_id: int) -> None:
+    start_time = time.time()
+    cohort = Cohort.objects.get(pk=cohort_id)
+
+    cohort.insert_staged_users()
+    logger.info(
+        "Calculating cohort {} from staged list took {:.2f} seconds".format(cohort.pk, (time.time() - start_time))
+    )
+
+
 @shared_task(ignore_result=True, max_retries=1)
 def insert_cohort_from_query(
     cohort_id: int, insight_type: str, filter_data: Dict[str, Any], entity_data: Dict[str, Any]
@@ -1,67 +1,106 @@
-from datetime import timedelta
-from typing import List, Tuple
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 
 from celery.app import shared_task
+from django.db import connection
 from django.db.models import Count
 from django.utils.timezone import now
 
 from posthog.ee import is_clickhouse_enabled
+from posthog.internal_metrics import incr, timing
 from posthog.models import Team
-from posthog.models.dashboard_item import DashboardItem
 from posthog.models.event import Event
 from posthog.models.event_definition import EventDefinition
 from posthog.models.property_definition import PropertyDefinition
 
+# Teams whose usage is calculated together, with one query per kind of usage
+TEAMS_PER_TASK = 100
+UPDATE_BATCH_SIZE = 1_000
+
+# How many insights of the last 30 days use each event or property key, per team. Malformed filters are skipped
+INSIGHT_USAGE_SQL = """
+SELECT team_id, entity ->> %(name_key)s AS name, count(*)
+FROM posthog_dashboarditem,
+LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(filters -> %(filters_key)s) = 'array' THEN filters -> %(filters_key)s ELSE '[]' END
+) AS entity
+WHERE team_id = ANY(%(team_ids)s) AND created_at > %(since)s AND jsonb_typeof(entity) = 'object'
+GROUP BY 1, 2
+"""
+
+Usage = Dict[Tuple[int, str], int]
+
 
 def calculate_event_property_usage() -> None:
-    for team in Team.objects.all():
-        calculate_event_property_usage_for_team(team_id=team.pk)
+    team_ids = list(Team.objects.order_by("id").values_list("id", flat=True))
+    for index in range(0, len(team_ids), TEAMS_PER_TASK):
+        calculate_event_property_usage_for_teams.delay(team_ids[index : index + TEAMS_PER_TASK])
 
 
 @shared_task(ignore_result=True, max_retries=1)
 def calculate_event_property_usage_for_team(team_id: int) -> None:
-    team = Team.objects.get(pk=team_id)
-    event_names = {event.name: 0 for event in EventDefinition.objects.filter(team_id=team_id)}
+    calculate_event_property_usage_for_teams(team_ids=[team_id])
 
-    event_properties = {key.name: 0 for key in PropertyDefinition.objects.filter(team_id=team_id)}
 
-    for item in DashboardItem.objects.filter(team=team, created_at__gt=now() - timedelta(days=30)):
-        for event in item.filters.get("events", []):
-            if event["id"] in event_names:
-                event_names[event["id"]] += 1
-
-        for prop in item.filters.get("properties", []):
-            if isinstance(prop, dict) and prop.get("key") in event_properties:
-                event_properties[prop["key"]] += 1
+@shared_task(ignore_result=True, max_retries=1)
+def calculate_event_property_usage_for_teams(team_ids: List[int]) -> None:
+    started_at = time.time()
+    since = now() - timedelta(days=30)
+
+    events_volume = _get_events_volume(team_ids, since)
+    events_usage = _get_insight_usage(team_ids, since, filters_key="events", name_key="id")
+    properties_usage = _get_insight_usage(team_ids, since, filters_key="properties", name_key="key")
+
+    # Only definitions whose numbers changed are written
+    event_definitions = []
+    for definition in EventDefinition.objects.filter(team_id__in=team_ids).only(
+        "id", "team_id", "name", "volume_30_day", "query_usage_30_day"
+    ):
+        volume = events_volume.get((definition.team_id, definition.name), 0)
+        usage = events_usage.get((definition.team_id, definition.name), 0)
+        if (definition.volume_30_day, definition.query_usage_30_day) != (volume, usage):
+            definition.volume_30_day, definition.query_usage_30_day = volume, usage
+            event_definitions.append(definition)
+    EventDefinition.objects.bulk_update(
+        event_definitions, ["volume_30_day", "query_usage_30_day"], batch_size=UPDATE_BATCH_SIZE
+    )
 
-    events_volume = _get_events_volume(team)
-    for event, value in event_names.items():
-        volume = _extract_count(events_volume, event)
-        EventDefinition.objects.filter(name=event, team_id=team_id).update(
-            volume_30_day=volume, query_usage_30_day=value
-        )
+    property_definitions = []
+    for definition in PropertyDefinition.objects.filter(team_id__in=team_ids).only(
+        "id", "team_id", "name", "query_usage_30_day"
+    ):
+        usage = properties_usage.get((definition.team_id, definition.name), 0)
+        if definition.query_usage_30_day != usage:
+            definition.query_usage_30_day = usage
+            property_definitions.append(definition)
+    PropertyDefinition.objects.bulk_update(property_definitions, ["query_usage_30_day"], batch_size=UPDATE_BATCH_SIZE)
 
-    for key, value in event_properties.items():
-        PropertyDefinition.objects.filter(name=key, team_id=team_id).update(query_usage_30_day=value)
+    duration_ms = (time.time() - started_at) * 1000
+    timing("calculate_event_property_usage_time", duration_ms)
+    timing("calculate_event_property_usage_time_per_team", duration_ms / len(team_ids))
+    incr("calculate_event_property_usage_definitions_updated", len(event_definitions) + len(property_definitions))
 
 
-def _get_events_volume(team: Team) -> List[Tuple[str, int]]:
-    timestamp = now() - timedelta(days=30)
+def _get_events_volume(team_ids: List[int], since: datetime) -> Usage:
     if is_clickhouse_enabled():
         from ee.clickhouse.client import sync_execute
         from ee.clickhouse.sql.events import GET_EVENTS_VOLUME
 
-        return sync_execute(GET_EVENTS_VOLUME, {"team_id": team.pk, "timestamp": timestamp},)
-    return (
-        Event.objects.filter(team=team, timestamp__gt=timestamp)
-        .values("event")
-        .annotate(count=Count("id"))
-        .values_list("event", "count")
-    )
+        rows = sync_execute(GET_EVENTS_VOLUME, {"team_ids": team_ids, "timestamp": since})
+    else:
+        rows = (
+            Event.objects.filter(team_id__in=team_ids, timestamp__gt=since)
+            .values("team_id", "event")
+            .annotate(count=Count("id"))
+            .values_list("team_id", "event", "count")
+        )
+    return {(team_id, event): count for team_id, event, count in rows}
 
 
-def _extract_count(events_volume: List[Tuple[str, int]], event: str) -> int:
-    try:
-        return [count[1] for count in events_volume if count[0] == event][0]
-    except IndexError:
-        return 0
+def _get_insight_usage(team_ids: List[int], since: datetime, filters_key: str, name_key: str) -> Usage:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            INSIGHT_USAGE_SQL, {"team_ids": team_ids, "since": since, "filters_key": filters_key, "name_key": name_key},
+        )
+        return {(team_id, name): count for team_id, name, count in cursor.fetchall()}
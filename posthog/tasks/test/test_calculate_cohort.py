@@ -1,13 +1,16 @@
-from typing import Callable
+from typing import Any, Callable, Optional
 from unittest.mock import MagicMock, patch
 
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
 from freezegun import freeze_time
 
+from posthog.models import DashboardItem, FeatureFlag
 from posthog.models.cohort import Cohort
 from posthog.models.event import Event
 from posthog.models.person import Person
-from posthog.tasks.calculate_cohort import calculate_cohort_from_list
-from posthog.test.base import APIBaseTest
+from posthog.tasks.calculate_cohort import calculate_cohort_from_list, get_cohorts_to_calculate
+from posthog.test.base import APIBaseTest, BaseTest
 
 
 def calculate_cohort_test_factory(event_factory: Callable, person_factory: Callable):  # type: ignore
@@ -71,3 +74,57 @@ def calculate_cohort_test_factory(event_factory: Callable, person_factory: Calla
 
 class TestDjangoCalculateCohort(calculate_cohort_test_factory(Event.objects.create, Person.objects.create)):  # type: ignore
     pass
+
+
+class TestGetCohortsToCalculate(BaseTest):
+    def _create_cohort(
+        self, minutes_since_calculation: int, duration_ms: Optional[int] = None, **kwargs: Any
+    ) -> Cohort:
+        return Cohort.objects.create(
+            team=self.team,
+            groups=[{"properties": {"$some_prop": "something"}}],
+            last_calculation=timezone.now() - relativedelta(minutes=minutes_since_calculation),
+            last_calculation_duration_ms=duration_ms,
+            **kwargs,
+        )
+
+    def test_used_and_stale_cohorts_first(self) -> None:
+        unused = self._create_cohort(60)
+        in_insight = self._create_cohort(40)
+        in_flag = self._create_cohort(20)
+        self._create_cohort(5)  # Calculated recently
+        self._create_cohort(60, deleted=True)
+        self._create_cohort(60, is_calculating=True)
+
+        DashboardItem.objects.create(
+            team=self.team,
+            filters={"events": [{"id": "$pageview"}], "breakdown_type": "cohort", "breakdown": [in_insight.pk]},
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="beta",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "id", "value": in_flag.pk, "type": "cohort"}]}]},
+        )
+
+        self.assertEqual(get_cohorts_to_calculate(), [in_flag, in_insight, unused])
+
+    @patch("posthog.tasks.calculate_cohort.CALCULATION_BUDGET_SECONDS", 30)
+    def test_cohorts_fit_in_calculation_budget(self) -> None:
+        slow = self._create_cohort(60, duration_ms=25_000)
+        too_slow_for_the_rest = self._create_cohort(50, duration_ms=10_000)
+        fast = self._create_cohort(40, duration_ms=2_000)
+        never_measured = self._create_cohort(30)  # Assumed to take DEFAULT_CALCULATION_SECONDS
+
+        self.assertEqual(get_cohorts_to_calculate(), [slow, fast])
+
+        too_slow_for_the_rest.last_calculation = timezone.now() - relativedelta(minutes=70)
+        too_slow_for_the_rest.save()
+        self.assertEqual(get_cohorts_to_calculate(), [too_slow_for_the_rest, fast, never_measured])
+
+    @patch("posthog.tasks.calculate_cohort.CALCULATION_BUDGET_SECONDS", 30)
+    def test_always_calculates_most_pressing_cohort(self) -> None:
+        slowest = self._create_cohort(60, duration_ms=120_000)
+        self._create_cohort(50, duration_ms=1_000)
+
+        self.assertEqual(get_cohorts_to_calculate()[0], slowest)
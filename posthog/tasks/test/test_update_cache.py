@@ -1,16 +1,27 @@
+import threading
+from contextlib import contextmanager
 from datetime import timedelta
+from typing import Any, Dict, Generator, List, Optional, Tuple
 from unittest.mock import MagicMock, patch
 
+from django.core.cache import cache
 from django.utils.timezone import now
 from freezegun import freeze_time
 
 from posthog.constants import ENTITY_ID, ENTITY_TYPE, INSIGHT_STICKINESS
 from posthog.decorators import CacheType
+from posthog.exceptions import EstimatedQueryExecutionTimeTooLong
 from posthog.models import Dashboard, DashboardItem, Event, Filter
 from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.queries.trends import Trends
-from posthog.tasks.update_cache import update_cache_item, update_cached_items
+from posthog.redis import get_client
+from posthog.tasks.update_cache import (
+    iter_update_dashboard_items_cache,
+    record_dashboard_view,
+    update_cache_item,
+    update_cached_items,
+)
 from posthog.test.base import APIBaseTest
 from posthog.types import FilterType
 from posthog.utils import generate_cache_key, get_safe_cache
@@ -120,6 +131,102 @@ class TestUpdateCache(APIBaseTest):
         self.assertEqual(updated_dashboard_item.refreshing, False)
         self.assertEqual(updated_dashboard_item.last_refresh, now())
 
+    def test_update_cache_item_uses_result_cached_while_trying_the_lock(self) -> None:
+        filter = Filter(data={"insight": "TRENDS", "events": [{"id": "$pageview"}]})
+        key = generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk))
+
+        @contextmanager
+        def lock_held_by_someone_finishing(key: str, timeout: int) -> Generator[bool, None, None]:
+            # The holder caches its result and releases the lock right as we fail to take it
+            cache.set(key, {"result": [{"count": 1}], "last_refresh": now()})
+            yield False
+
+        with patch("posthog.tasks.update_cache.redis_lock", lock_held_by_someone_finishing):
+            with patch.object(Trends, "run") as patch_run, self.settings(EE_AVAILABLE=False):
+                update_cache_item(key, CacheType.TRENDS, {"filter": filter.toJSON(), "team_id": self.team.pk})
+
+        patch_run.assert_not_called()
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_refresh_prioritizes_viewed_and_cheap_items(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        viewed_item = self._create_dashboard(Filter(data={"events": [{"id": "viewed"}]}))
+        expensive_item = self._create_dashboard(Filter(data={"events": [{"id": "expensive"}]}))
+        other_item = self._create_dashboard(Filter(data={"events": [{"id": "other"}]}))
+        for _ in range(10):
+            record_dashboard_view(viewed_item.dashboard_id)
+        get_client().set(f"dashboard_item_cost:{expensive_item.filters_hash}", 100)
+
+        with self.settings(DASHBOARD_REFRESH_TIME_BUDGET_SECONDS=10, DASHBOARD_REFRESH_DEFAULT_COST_SECONDS=5):
+            update_cached_items()
+
+        refreshed_keys = [call_item[0][0] for call_item in patch_update_cache_item.call_args_list]
+        self.assertEqual(refreshed_keys, [viewed_item.filters_hash, other_item.filters_hash])
+        self.assertNotIn(expensive_item.filters_hash, refreshed_keys)
+
+    @patch("posthog.tasks.update_cache.group.apply_async")
+    @patch("posthog.celery.update_cache_item_task.s")
+    def test_refresh_backs_off_items_timing_out(
+        self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock
+    ) -> None:
+        filter = Filter(data={"insight": "TRENDS", "events": [{"id": "slow"}]})
+        item = self._create_dashboard(filter)
+
+        with patch.object(Trends, "run", side_effect=EstimatedQueryExecutionTimeTooLong()):
+            with self.assertRaises(EstimatedQueryExecutionTimeTooLong), self.settings(EE_AVAILABLE=False):
+                update_cache_item(
+                    item.filters_hash, CacheType.TRENDS, {"filter": filter.toJSON(), "team_id": self.team.pk}
+                )
+
+        self.assertEqual(DashboardItem.objects.get(pk=item.pk).refreshing, False)
+        self.assertGreater(get_client().ttl(f"dashboard_item_backoff:{item.filters_hash}"), 0)
+
+        update_cached_items()
+        refreshed_keys = [call_item[0][0] for call_item in patch_update_cache_item.call_args_list]
+        self.assertNotIn(item.filters_hash, refreshed_keys)
+
+    def test_refresh_dashboard_items_concurrently(self) -> None:
+        dashboard = Dashboard.objects.create(team=self.team)
+        items = [
+            DashboardItem.objects.create(
+                dashboard=dashboard, filters=Filter(data={"events": [{"id": event}]}).to_dict(), team=self.team
+            )
+            for event in ["$pageview", "sign up", "purchase"]
+        ]
+        failing_item = items[1]
+        tagged = threading.local()
+        calls: List[Tuple[int, Optional[Dict[str, Any]], int]] = []
+
+        @contextmanager
+        def tag_queries(query_tags: Optional[Dict[str, Any]]) -> Generator[None, None, None]:
+            tagged.tags = query_tags
+            try:
+                yield
+            finally:
+                tagged.tags = None
+
+        def update_item(item: DashboardItem, _dashboard: Dashboard) -> None:
+            calls.append((item.pk, getattr(tagged, "tags", None), threading.get_ident()))
+            if item.pk == failing_item.pk:
+                raise EstimatedQueryExecutionTimeTooLong()
+
+        query_tags = {"query_id_prefix": "refresh"}
+        with self.settings(DASHBOARD_REFRESH_CONCURRENCY=2):
+            with patch("posthog.tasks.update_cache._get_query_tags", return_value=query_tags):
+                with patch("posthog.tasks.update_cache._tag_queries", tag_queries):
+                    with patch("posthog.tasks.update_cache.update_dashboard_item_cache", side_effect=update_item):
+                        refreshed = {item.pk: error for item, error in iter_update_dashboard_items_cache(dashboard)}
+
+        self.assertEqual(set(refreshed), {item.pk for item in items})
+        self.assertIsInstance(refreshed[failing_item.pk], EstimatedQueryExecutionTimeTooLong)
+        self.assertCountEqual([pk for pk, error in refreshed.items() if error is None], [items[0].pk, items[2].pk])
+        self.assertEqual(len(calls), 3)
+        for _, tags, thread_id in calls:
+            self.assertEqual(tags, query_tags)
+            self.assertNotEqual(thread_id, threading.get_ident())
+
     def _test_refresh_dashboard_cache_types(
         self, filter: FilterType, cache_type: CacheType, patch_update_cache_item: MagicMock,
     ) -> None:
@@ -1,14 +1,31 @@
-import importlib
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from celery import group
 from dateutil.relativedelta import relativedelta
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
 from django.db.models import Prefetch, Q
-from django.db.models.expressions import F, Subquery
+from django.db.models.expressions import Subquery
 from django.utils import timezone
 
 from posthog.celery import update_cache_item_task
@@ -21,18 +38,26 @@ from posthog.constants import (
     INSIGHT_TRENDS,
     TRENDS_LINEAR,
     TRENDS_STICKINESS,
+    FunnelOrderType,
     FunnelVizType,
 )
-from posthog.decorators import CacheType
+from posthog.decorators import CacheType, get_fresh_cached_result
 from posthog.ee import is_clickhouse_enabled
+from posthog.exceptions import EstimatedQueryExecutionTimeTooLong
+from posthog.helpers.single_flight import is_locked, redis_lock, wait_for
+from posthog.internal_metrics import gauge
 from posthog.models import Dashboard, DashboardItem, Filter, Team
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.utils import get_filter
+from posthog.redis import get_client
 from posthog.settings import CACHED_RESULTS_TTL
 from posthog.types import FilterType
 from posthog.utils import generate_cache_key
 
+# Upper bound on items refreshed per tick, whatever is left of the time budget
 PARALLEL_DASHBOARD_ITEM_CACHE = int(os.environ.get("PARALLEL_DASHBOARD_ITEM_CACHE", 5))
+# Dashboard views older than this don't count towards refresh priority
+DASHBOARD_VIEWS_WINDOW_DAYS = 7
 
 logger = logging.getLogger(__name__)
 
@@ -40,9 +65,14 @@ if is_clickhouse_enabled():
     from ee.clickhouse.queries.clickhouse_paths import ClickhousePaths
     from ee.clickhouse.queries.clickhouse_retention import ClickhouseRetention
     from ee.clickhouse.queries.clickhouse_stickiness import ClickhouseStickiness
-    from ee.clickhouse.queries.funnels.funnel import ClickhouseFunnel
-    from ee.clickhouse.queries.funnels.funnel_time_to_convert import ClickhouseFunnelTimeToConvert
-    from ee.clickhouse.queries.funnels.funnel_trends import ClickhouseFunnelTrends
+    from ee.clickhouse.queries.funnels import (
+        ClickhouseFunnel,
+        ClickhouseFunnelBase,
+        ClickhouseFunnelStrict,
+        ClickhouseFunnelTimeToConvert,
+        ClickhouseFunnelTrends,
+        ClickhouseFunnelUnordered,
+    )
     from ee.clickhouse.queries.sessions.clickhouse_sessions import ClickhouseSessions
     from ee.clickhouse.queries.trends.clickhouse_trends import ClickhouseTrends
 
@@ -71,23 +101,113 @@ else:
 
 
 def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> None:
+    # Taken before trying the lock, as the holder may cache its result before we start waiting
+    wait_start = timezone.now()
+    with redis_lock(key, settings.INSIGHT_CACHE_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            # Someone else is working on this exact result already (see `cached_function`), so wait for them and
+            # only calculate if they didn't end up caching a result
+            wait_for(lambda: None if is_locked(key) else True, settings.INSIGHT_CACHE_LOCK_WAIT)
+            if get_fresh_cached_result(key, since=wait_start) is not None:
+                return
+
+        result: Optional[Union[List, Dict]] = None
+        filter_dict = json.loads(payload["filter"])
+        team_id = int(payload["team_id"])
+        filter = get_filter(data=filter_dict, team=Team(pk=team_id))
+        start_time = time.monotonic()
+        try:
+            if cache_type == CacheType.FUNNEL:
+                result = _calculate_funnel(filter, key, team_id)
+            else:
+                result = _calculate_by_filter(filter, key, team_id, cache_type)
+        except EstimatedQueryExecutionTimeTooLong:
+            DashboardItem.objects.filter(team_id=team_id, filters_hash=key).update(refreshing=False)
+            _back_off_refresh(key)
+            raise
+        _record_refresh_cost(key, time.monotonic() - start_time)
+
+        if result:
+            cache.set(key, {"result": result, "type": cache_type, "last_refresh": timezone.now()}, CACHED_RESULTS_TTL)
+        get_client().delete(f"refresh_queued:{key}")
 
-    result: Optional[Union[List, Dict]] = None
-    filter_dict = json.loads(payload["filter"])
-    team_id = int(payload["team_id"])
-    filter = get_filter(data=filter_dict, team=Team(pk=team_id))
-    if cache_type == CacheType.FUNNEL:
-        result = _calculate_funnel(filter, key, team_id)
-    else:
-        result = _calculate_by_filter(filter, key, team_id, cache_type)
 
-    if result:
-        cache.set(key, {"result": result, "type": cache_type, "last_refresh": timezone.now()}, CACHED_RESULTS_TTL)
+def update_dashboard_items_cache(dashboard: Dashboard) -> None:
+    errors = [error for _, error in iter_update_dashboard_items_cache(dashboard) if error is not None]
+    if errors:
+        raise errors[0]
+
+
+def iter_update_dashboard_items_cache(dashboard: Dashboard) -> Iterator[Tuple[DashboardItem, Optional[Exception]]]:
+    """
+    Refresh the dashboard's items, up to `DASHBOARD_REFRESH_CONCURRENCY` at a time, yielding each item as soon as its
+    result is cached, along with the error refreshing it if it failed.
+    """
+    # Taken right away, since a streamed response consumes the items after the request's query tags have been reset
+    return _iter_update_dashboard_items_cache(dashboard, _get_query_tags())
+
+
+def _iter_update_dashboard_items_cache(
+    dashboard: Dashboard, query_tags: Optional[Dict[str, Any]]
+) -> Iterator[Tuple[DashboardItem, Optional[Exception]]]:
+    items = list(
+        DashboardItem.objects.filter(dashboard=dashboard, filters__isnull=False)
+        .exclude(filters={})
+        .select_related("team")
+    )
+    concurrency = min(settings.DASHBOARD_REFRESH_CONCURRENCY, len(items))
+    if concurrency <= 1:
+        for item in items:
+            with _tag_queries(query_tags):
+                error = _try_update_dashboard_item_cache(item, dashboard)
+            yield item, error
+        return
 
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_update_dashboard_item_cache_in_thread, item, dashboard, query_tags): item for item in items
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def _update_dashboard_item_cache_in_thread(
+    dashboard_item: DashboardItem, dashboard: Dashboard, query_tags: Optional[Dict[str, Any]]
+) -> Optional[Exception]:
+    try:
+        with _tag_queries(query_tags):
+            return _try_update_dashboard_item_cache(dashboard_item, dashboard)
+    finally:
+        # Django opens a database connection per thread, which would otherwise be left open
+        connections.close_all()
+
+
+def _try_update_dashboard_item_cache(dashboard_item: DashboardItem, dashboard: Dashboard) -> Optional[Exception]:
+    try:
+        update_dashboard_item_cache(dashboard_item, dashboard)
+    except Exception as err:
+        logger.exception("Failed to refresh dashboard item %s", dashboard_item.pk)
+        return err
+    return None
+
+
+def _get_query_tags() -> Optional[Dict[str, Any]]:
+    if not is_clickhouse_enabled():
+        return None
+    from ee.clickhouse.client import get_query_tags
+
+    return get_query_tags()
 
-def update_dashboard_items_cache(dashboard: Dashboard) -> None:
-    for item in DashboardItem.objects.filter(dashboard=dashboard, filters__isnull=False).exclude(filters={}):
-        update_dashboard_item_cache(item, dashboard)
+
+@contextmanager
+def _tag_queries(query_tags: Optional[Dict[str, Any]]) -> Generator[None, None, None]:
+    if query_tags is None:
+        yield
+        return
+    from ee.clickhouse.client import tag_queries
+
+    with tag_queries(query_tags):
+        yield
 
 
 def update_dashboard_item_cache(dashboard_item: DashboardItem, dashboard: Optional[Dashboard]) -> None:
@@ -115,8 +235,11 @@ def get_cache_type(filter: FilterType) -> CacheType:
 
 
 def update_cached_items() -> None:
-
-    tasks = []
+    """
+    Refresh the dashboard items that most need it, within a budget of query time per tick. Items are prioritized by
+    how stale their result is, how often their dashboard is viewed and how expensive they were to calculate last time.
+    Items that keep timing out are backed off exponentially.
+    """
     items = (
         DashboardItem.objects.filter(
             Q(Q(dashboard__is_shared=True) | Q(dashboard__last_accessed_at__gt=timezone.now() - relativedelta(days=7)))
@@ -126,18 +249,116 @@ def update_cached_items() -> None:
         .exclude(deleted=True)
         .distinct("filters_hash")
     )
+    candidates = list(
+        DashboardItem.objects.filter(
+            pk__in=Subquery(items.filter(filters__isnull=False).exclude(filters={}).distinct("filters").values("pk"))
+        )
+        .exclude(last_refresh__gt=timezone.now() - timedelta(seconds=settings.DASHBOARD_REFRESH_MIN_INTERVAL_SECONDS))
+        .values_list("pk", "filters_hash", "dashboard_id", "last_refresh")
+    )
 
-    for item in DashboardItem.objects.filter(
-        pk__in=Subquery(items.filter(filters__isnull=False).exclude(filters={}).distinct("filters").values("pk"))
-    ).order_by(F("last_refresh").asc(nulls_first=True))[0:PARALLEL_DASHBOARD_ITEM_CACHE]:
-        cache_key, cache_type, payload = dashboard_item_update_task_params(item)
+    selected = _select_items_to_refresh(candidates)
+    items_by_pk = DashboardItem.objects.select_related("dashboard", "team").in_bulk(pk for pk, _ in selected)
+    tasks = []
+    for pk, _ in selected:
+        cache_key, cache_type, payload = dashboard_item_update_task_params(items_by_pk[pk])
         tasks.append(update_cache_item_task.s(cache_key, cache_type, payload))
 
-    logger.info("Found {} items to refresh".format(len(tasks)))
+    logger.info("Found {} items to refresh out of {} candidates".format(len(tasks), len(candidates)))
+    gauge("dashboard_refresh_candidates", len(candidates))
+    gauge("dashboard_refresh_scheduled", len(tasks))
+    gauge("dashboard_refresh_scheduled_cost", sum(cost for _, cost in selected))
     taskset = group(tasks)
     taskset.apply_async()
 
 
+def _select_items_to_refresh(candidates: List[Tuple[int, str, int, Any]]) -> List[Tuple[int, float]]:
+    """Pick (pk, expected cost) of the candidates with the highest priority that fit in the per-tick time budget."""
+    if not candidates:
+        return []
+
+    client = get_client()
+    keys = [filters_hash for _, filters_hash, _, _ in candidates]
+    pipeline = client.pipeline()
+    pipeline.mget([f"dashboard_item_cost:{key}" for key in keys])
+    pipeline.mget([f"dashboard_item_backoff:{key}" for key in keys])
+    # Already being calculated or queued for a refresh by a request serving a stale result
+    pipeline.mget([f"lock:{key}" for key in keys])
+    pipeline.mget([f"refresh_queued:{key}" for key in keys])
+    costs, backoffs, locks, queued = pipeline.execute()
+    views = _get_dashboard_views({dashboard_id for _, _, dashboard_id, _ in candidates})
+
+    now = timezone.now()
+    prioritized = []
+    for (pk, _, dashboard_id, last_refresh), cost, backoff, lock, queue in zip(
+        candidates, costs, backoffs, locks, queued
+    ):
+        if backoff is not None or lock is not None or queue is not None:
+            continue
+        expected_cost = float(cost) if cost is not None else settings.DASHBOARD_REFRESH_DEFAULT_COST_SECONDS
+        staleness = (now - last_refresh).total_seconds() if last_refresh else settings.CACHED_RESULTS_TTL
+        priority = staleness * (1 + views[dashboard_id]) / max(expected_cost, 0.1)
+        prioritized.append((priority, pk, expected_cost))
+    prioritized.sort(reverse=True)
+
+    budget = settings.DASHBOARD_REFRESH_TIME_BUDGET_SECONDS
+    selected: List[Tuple[int, float]] = []
+    for _, pk, expected_cost in prioritized:
+        if len(selected) >= PARALLEL_DASHBOARD_ITEM_CACHE:
+            break
+        # Always refresh the top item, even if it alone is more expensive than the budget
+        if selected and expected_cost > budget:
+            continue
+        selected.append((pk, expected_cost))
+        budget -= expected_cost
+    return selected
+
+
+def record_dashboard_view(dashboard_id: int) -> None:
+    key = f"dashboard_views:{timezone.now().date().isoformat()}"
+    pipeline = get_client().pipeline()
+    pipeline.hincrby(key, str(dashboard_id), 1)
+    pipeline.expire(key, (DASHBOARD_VIEWS_WINDOW_DAYS + 1) * 24 * 60 * 60)
+    pipeline.execute()
+
+
+def _get_dashboard_views(dashboard_ids: Iterable[int]) -> Dict[int, int]:
+    dashboard_ids = list(dashboard_ids)
+    views: Dict[int, int] = defaultdict(int)
+    if not dashboard_ids:
+        return views
+
+    today = timezone.now().date()
+    pipeline = get_client().pipeline()
+    for days_ago in range(DASHBOARD_VIEWS_WINDOW_DAYS):
+        day = (today - timedelta(days=days_ago)).isoformat()
+        pipeline.hmget(f"dashboard_views:{day}", [str(dashboard_id) for dashboard_id in dashboard_ids])
+    for counts in pipeline.execute():
+        for dashboard_id, count in zip(dashboard_ids, counts):
+            if count is not None:
+                views[dashboard_id] += int(count)
+    return views
+
+
+def _record_refresh_cost(key: str, seconds: float) -> None:
+    # Exponentially weighted, so that a single slow or fast run doesn't throw the estimate off
+    client = get_client()
+    previous = client.get(f"dashboard_item_cost:{key}")
+    cost = seconds if previous is None else 0.7 * float(previous) + 0.3 * seconds
+    client.set(f"dashboard_item_cost:{key}", cost, ex=CACHED_RESULTS_TTL)
+    client.delete(f"dashboard_item_timeouts:{key}")
+
+
+def _back_off_refresh(key: str) -> None:
+    client = get_client()
+    timeouts = client.incr(f"dashboard_item_timeouts:{key}")
+    client.expire(f"dashboard_item_timeouts:{key}", CACHED_RESULTS_TTL)
+    backoff = min(
+        settings.DASHBOARD_REFRESH_BACKOFF_SECONDS * 2 ** (timeouts - 1), settings.DASHBOARD_REFRESH_MAX_BACKOFF_SECONDS
+    )
+    client.set(f"dashboard_item_backoff:{key}", timeouts, ex=backoff)
+
+
 def dashboard_item_update_task_params(
     item: DashboardItem, dashboard: Optional[Dashboard] = None
 ) -> Tuple[str, CacheType, Dict]:
@@ -165,17 +386,24 @@ def _calculate_funnel(filter: Filter, key: str, team_id: int) -> List[Dict[str,
     dashboard_items = DashboardItem.objects.filter(team_id=team_id, filters_hash=key)
     dashboard_items.update(refreshing=True)
 
-    insight_class: Union[Type[Funnel]]
     if is_clickhouse_enabled():
+        funnel_order_class: Type[ClickhouseFunnelBase] = ClickhouseFunnel
+        if filter.funnel_order_type == FunnelOrderType.UNORDERED:
+            funnel_order_class = ClickhouseFunnelUnordered
+        elif filter.funnel_order_type == FunnelOrderType.STRICT:
+            funnel_order_class = ClickhouseFunnelStrict
+
         if filter.funnel_viz_type == FunnelVizType.TRENDS:
-            insight_class = ClickhouseFunnelTrends
+            result = ClickhouseFunnelTrends(
+                team=Team(pk=team_id), filter=filter, funnel_order_class=funnel_order_class
+            ).run()
         elif filter.funnel_viz_type == FunnelVizType.TIME_TO_CONVERT:
-            insight_class = ClickhouseFunnelTimeToConvert
+            result = ClickhouseFunnelTimeToConvert(
+                team=Team(pk=team_id), filter=filter, funnel_order_class=funnel_order_class
+            ).run()
         else:
-            insight_class = ClickhouseFunnel
+            result = funnel_order_class(team=Team(pk=team_id), filter=filter).run()
     else:
-        insight_class = Funnel
-
-    result = insight_class(filter=filter, team=Team(pk=team_id)).run()
+        result = Funnel(filter=filter, team=Team(pk=team_id)).run()
     dashboard_items.update(last_refresh=timezone.now(), refreshing=False)
     return result
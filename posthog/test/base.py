@@ -1,10 +1,13 @@
 from typing import Dict, Optional
 
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework.test import APITestCase as DRFTestCase
 
 from posthog.models import Organization, Team, User
 from posthog.models.organization import OrganizationMembership
+from posthog.models.personal_api_key import personal_api_key_cache, personal_api_key_last_used_bumped
+from posthog.models.team import team_token_cache
 
 
 def _setup_test_data(klass):
@@ -103,6 +106,11 @@ class TestMixin:
             _setup_test_data(cls)
 
     def setUp(self):
+        # Cached token lookups may still point at rows rolled back after a previous test
+        cache.clear()
+        team_token_cache.clear_local()
+        personal_api_key_cache.clear_local()
+        personal_api_key_last_used_bumped.clear()
         if not self.CLASS_DATA_LEVEL_SETUP:
             _setup_test_data(self)
 
@@ -0,0 +1,113 @@
+from unittest.mock import patch
+
+from posthog.models import Action, ActionStep, Cohort, Element, Event, Person
+from posthog.models.action_matcher import MatchContext, get_team_action_matcher
+from posthog.test.base import BaseTest
+
+
+class TestActionMatcher(BaseTest):
+    def _create_action(self, **step) -> Action:
+        action = Action.objects.create(team=self.team, name=str(step))
+        ActionStep.objects.create(action=action, **step)
+        return action
+
+    def test_matches_like_the_database(self):
+        Person.objects.create(team=self.team, distinct_ids=["paying"], properties={"plan": "paid", "seats": 5})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"plan": "paid"}}])
+        cohort.calculate_people()
+
+        actions = [
+            self._create_action(event="$pageview"),
+            self._create_action(event="$pageview", url="/pricing"),
+            self._create_action(event="$pageview", url="https://posthog.com/pricing", url_matching="exact"),
+            self._create_action(event="$pageview", url=r"/docs/\w+$", url_matching="regex"),
+            self._create_action(event="$pageview", url="posthog.com/_ricing"),
+            self._create_action(event="$autocapture", selector="div > a.cta"),
+            self._create_action(event="$autocapture", selector="body a[data-attr='signup']"),
+            self._create_action(event="$autocapture", selector="a:nth-child(2)", text="Sign up"),
+            self._create_action(event="$autocapture", tag_name="button", text="Sign up"),
+            self._create_action(properties=[{"key": "$browser", "value": "Chrome"}]),
+            self._create_action(properties=[{"key": "$browser", "value": ["Chrome", "Firefox"], "operator": "is_not"}]),
+            self._create_action(properties=[{"key": "count", "value": "3"}]),
+            self._create_action(properties=[{"key": "count", "value": 2, "operator": "gt"}]),
+            self._create_action(properties=[{"key": "$browser", "value": "chr", "operator": "icontains"}]),
+            self._create_action(properties=[{"key": "$browser", "value": "^Fire", "operator": "not_regex"}]),
+            self._create_action(properties=[{"key": "$browser", "operator": "is_not_set", "value": None}]),
+            self._create_action(properties=[{"key": "plan", "value": "paid", "type": "person"}]),
+            self._create_action(properties=[{"key": "seats", "value": 10, "operator": "lt", "type": "person"}]),
+            self._create_action(properties=[{"key": "id", "value": cohort.pk, "type": "cohort"}]),
+            self._create_action(event="$autocapture", properties=[{"key": "text", "value": "Buy", "type": "element"}]),
+        ]
+
+        elements = [
+            Element(
+                tag_name="a", attr_class=["cta"], text="Sign up", nth_child=2, attributes={"attr__data-attr": "signup"}
+            ),
+            Element(tag_name="div", nth_child=1),
+            Element(tag_name="body"),
+        ]
+        events = [
+            Event.objects.create(
+                team=self.team,
+                event="$pageview",
+                distinct_id="paying",
+                properties={"$current_url": "https://posthog.com/pricing", "$browser": "Chrome", "count": 3},
+            ),
+            Event.objects.create(
+                team=self.team,
+                event="$pageview",
+                distinct_id="anonymous",
+                properties={"$current_url": "https://posthog.com/docs/actions", "$browser": "Firefox", "count": "3"},
+            ),
+            Event.objects.create(
+                team=self.team, event="$autocapture", distinct_id="paying", properties={}, elements=elements
+            ),
+            Event.objects.create(
+                team=self.team,
+                event="$autocapture",
+                distinct_id="anonymous",
+                properties={"$browser": "Safari"},
+                elements=[Element(tag_name="button", text="Buy"), Element(tag_name="body")],
+            ),
+        ]
+
+        for event in events:
+            expected = [
+                action for action in actions if Event.objects.filter(pk=event.pk).query_db_by_action(action).exists()
+            ]
+            self.assertEqual(event.actions, expected, event.properties)
+
+    def test_matcher_compiled_again_only_when_actions_change(self):
+        action = self._create_action(event="$pageview")
+        event = Event.objects.create(team=self.team, event="$pageview", distinct_id="1")
+        self.assertEqual(event.actions, [action])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(event.actions, [action])
+
+        step = action.steps.get()
+        step.event = "$autocapture"
+        step.save()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(event.actions, [])
+
+        action.deleted = True
+        action.save()
+        context = MatchContext(self.team.pk, "$autocapture", "1", {}, lambda: [])
+        self.assertEqual(get_team_action_matcher(self.team.pk).match(context), [])
+
+    def test_step_that_cannot_be_compiled_does_not_match(self):
+        self._create_action(event="$pageview", url="/pricing")
+        working = self._create_action(event="$pageview")
+        event = Event.objects.create(
+            team=self.team, event="$pageview", distinct_id="1", properties={"$current_url": "/pricing"}
+        )
+
+        with patch("posthog.models.action_matcher._compile_url", side_effect=[ValueError("broken"), None]):
+            self.assertEqual(event.actions, [working])
+
+    def test_regex_that_looks_like_a_number(self):
+        action = self._create_action(properties=[{"key": "order", "value": "123", "operator": "regex"}])
+        context = MatchContext(self.team.pk, "$pageview", "1", {"order": "A-1234"}, lambda: [])
+        self.assertEqual(get_team_action_matcher(self.team.pk).match(context), [action])
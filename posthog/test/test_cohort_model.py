@@ -2,7 +2,16 @@ from unittest.mock import patch
 
 import pytest
 
-from posthog.models import Action, ActionStep, Cohort, Event, Person, Team
+from posthog.models import (
+    Action,
+    ActionStep,
+    Cohort,
+    CohortPeople,
+    Event,
+    Person,
+    StaticCohortUploadItem,
+    Team,
+)
 from posthog.test.base import BaseTest
 
 
@@ -63,6 +72,23 @@ class TestCohort(BaseTest):
         self.assertEqual(cohort.people.count(), 2)
         self.assertEqual(cohort.is_calculating, False)
 
+    @patch("posthog.models.cohort.INSERT_STAGED_BATCH_SIZE", 2)
+    @patch("posthog.models.cohort.STAGING_BATCH_SIZE", 2)
+    def test_insert_staged_users_in_batches(self):
+        people = [Person.objects.create(team=self.team, distinct_ids=[str(i), f"other {i}"]) for i in range(4)]
+        cohort = Cohort.objects.create(team=self.team, groups=[], is_static=True)
+
+        staged = cohort.stage_users(iter(["0", "1", "other 1", "2", "3", "unknown"]))
+        self.assertEqual(staged, 6)
+        self.assertEqual(StaticCohortUploadItem.objects.filter(cohort=cohort).count(), 6)
+        self.assertEqual(Cohort.objects.get(pk=cohort.pk).staged_upload_count, 6)
+
+        cohort.insert_staged_users()
+        self.assertCountEqual(cohort.people.all(), people)
+        self.assertEqual(CohortPeople.objects.filter(cohort=cohort).count(), 4)
+        self.assertFalse(StaticCohortUploadItem.objects.filter(cohort=cohort).exists())
+        self.assertEqual(Cohort.objects.get(pk=cohort.pk).staged_upload_count, 0)
+
     @pytest.mark.ee
     @patch("ee.clickhouse.models.cohort.get_person_ids_by_cohort_id")
     def test_calculating_cohort_clickhouse(self, get_person_ids_by_cohort_id):
@@ -110,3 +136,24 @@ class TestCohort(BaseTest):
             cohort2.calculate_people()
         self.assertFalse(Cohort.objects.get().is_calculating)
         self.assertEqual(Cohort.objects.get().errors_calculating, 1)
+
+    @patch("posthog.models.cohort.CALCULATION_BATCH_SIZE", 1)
+    def test_recalculating_cohort_only_changes_membership_that_changed(self):
+        staying = Person.objects.create(distinct_ids=["staying"], team_id=self.team.pk, properties={"$some_prop": "x"})
+        leaving = Person.objects.create(distinct_ids=["leaving"], team_id=self.team.pk, properties={"$some_prop": "x"})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "x"}}], name="cohort1")
+        cohort.calculate_people(use_clickhouse=False)
+        staying_row = CohortPeople.objects.get(cohort_id=cohort.pk, person=staying)
+
+        leaving.properties = {"$some_prop": "y"}
+        leaving.save()
+        joining = Person.objects.create(distinct_ids=["joining"], team_id=self.team.pk, properties={"$some_prop": "x"})
+        cohort.calculate_people(use_clickhouse=False)
+
+        self.assertCountEqual(
+            CohortPeople.objects.filter(cohort_id=cohort.pk).values_list("person_id", flat=True),
+            [staying.pk, joining.pk],
+        )
+        self.assertEqual(CohortPeople.objects.get(cohort_id=cohort.pk, person=staying).pk, staying_row.pk)
+        cohort.refresh_from_db()
+        self.assertIsNotNone(cohort.last_calculation_duration_ms)
@@ -1,4 +1,5 @@
 from posthog.models import Cohort, FeatureFlag, Person
+from posthog.models.feature_flag import get_active_feature_flags
 from posthog.test.base import BaseTest
 
 
@@ -130,6 +131,31 @@ class TestFeatureFlag(BaseTest):
         self.assertTrue(feature_flag.distinct_id_matches("example_id"))
         self.assertFalse(feature_flag.distinct_id_matches("another_id"))
 
+    def test_active_feature_flags_evaluated_in_one_query(self):
+        Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="tim",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]}]},
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            key="example",
+            created_by=self.user,
+            filters={"groups": [{"properties": [{"key": "email", "value": "example@example.com", "type": "person"}]}]},
+        )
+        FeatureFlag.objects.create(team=self.team, key="everyone", created_by=self.user)
+        FeatureFlag.objects.create(team=self.team, key="inactive", created_by=self.user, active=False)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(sorted(get_active_feature_flags(self.team, "example_id")), ["everyone", "tim"])
+        with self.assertNumQueries(1):  # Flag definitions are cached
+            self.assertEqual(get_active_feature_flags(self.team, "another_id"), ["everyone"])
+
+        FeatureFlag.objects.filter(key="tim").get().delete()
+        self.assertEqual(get_active_feature_flags(self.team, "example_id"), ["everyone"])
+
     def create_feature_flag(self, **kwargs):
         return FeatureFlag.objects.create(
             team=self.team, name="Beta feature", key="beta-feature", created_by=self.user, **kwargs
@@ -2,14 +2,44 @@ import random
 from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
 
 from posthog.models import EventDefinition, Organization, PluginConfig, PropertyDefinition, Team, User
+from posthog.models.team import team_token_cache
 from posthog.plugins.test.mock import mocked_plugin_requests_get
 
 from .base import BaseTest
 
 
 class TestTeam(BaseTest):
+    def test_get_team_from_token_is_cached_and_invalidated(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Team.objects.get_team_from_token(self.team.api_token), self.team)
+        with self.assertNumQueries(0):
+            self.assertEqual(Team.objects.get_team_from_token(self.team.api_token), self.team)
+
+        old_token = self.team.api_token
+        self.team.api_token = "new_token_for_cache_test"
+        self.team.save()
+
+        self.assertIsNone(Team.objects.get_team_from_token(old_token))
+        with self.assertNumQueries(0):
+            self.assertIsNone(Team.objects.get_team_from_token(old_token))
+        self.assertEqual(Team.objects.get_team_from_token("new_token_for_cache_test"), self.team)
+
+    def test_get_team_from_token_caches_field_values_in_redis(self):
+        Team.objects.get_team_from_token(self.team.api_token)
+        team_token_cache.clear_local()
+
+        cached = cache.get(f"team_from_token:{self.team.api_token}")
+        self.assertEqual(cached["name"], self.team.name)
+        # Values of fields that don't exist (anymore) are ignored
+        cache.set(f"team_from_token:{self.team.api_token}", {**cached, "removed_field": 1})
+
+        with self.assertNumQueries(0):
+            team = Team.objects.get_team_from_token(self.team.api_token)
+        self.assertEqual((team.pk, team.name, team.api_token), (self.team.pk, self.team.name, self.team.api_token))
+
     def test_team_has_expected_defaults(self):
         team: Team = Team.objects.create(name="New Team", organization=self.organization)
         self.assertEqual(team.timezone, "UTC")
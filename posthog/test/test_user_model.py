@@ -1,4 +1,6 @@
-from posthog.models import OrganizationMembership, Team, User
+from unittest.mock import patch
+
+from posthog.models import OrganizationMembership, PersonalAPIKey, Team, User
 from posthog.test.base import BaseTest
 
 
@@ -73,3 +75,20 @@ class TestUser(BaseTest):
                     "social_providers": [],
                 },
             )
+
+    def test_personal_api_key_last_used_at_bumped_on_cached_lookups(self):
+        key = PersonalAPIKey.objects.create(user=self.user, label="test")
+        self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+        key.refresh_from_db()
+        first_used_at = key.last_used_at
+        self.assertIsNotNone(first_used_at)
+
+        # Within the interval, cached lookups don't write
+        with self.assertNumQueries(0):
+            self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+
+        with patch("posthog.models.personal_api_key.personal_api_key_last_used_bumped.get", return_value=None):
+            with self.assertNumQueries(1):
+                self.assertEqual(User.objects.get_from_personal_api_key(key.value), self.user)
+        key.refresh_from_db()
+        self.assertGreater(key.last_used_at, first_used_at)